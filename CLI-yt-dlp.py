@@ -0,0 +1,592 @@
+"""headless batch mode, runs the GUI's download engine without tkinter
+
+    python CLI-yt-dlp.py urls.txt -o ~/Videos -j 4
+    cat urls.txt | python CLI-yt-dlp.py -t audio -f opus
+
+Progress is written to stdout as one JSON object per line.
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+from ytdlp_core import (
+    ARCHIVE_FILE,
+    AUDIO_FORMATS,
+    AUDIO_QUALITIES,
+    BACKENDS,
+    CUSTOM_PRESET,
+    DISK_MIN_FREE,
+    DOWNLOADERS,
+    HISTORY_FILE,
+    METRICS_INTERVAL,
+    POST_WORKERS,
+    SIDECAR_OPTIONS,
+    SUB_LANGS,
+    VIDEO_FORMATS,
+    VIDEO_QUALITIES,
+    BandwidthPolicy,
+    DiskPolicy,
+    DownloadArchive,
+    DownloadManager,
+    DownloadPreset,
+    Instrumentation,
+    JobHistory,
+    MetricsCsv,
+    MetricsServer,
+    PresetLibrary,
+    RetryPolicy,
+    SidecarCache,
+    archive_key,
+    archive_key_from_url,
+    cached_ytdlp,
+    describe_engine,
+    entry_url,
+    fetch_playlist,
+    find_ytdlp,
+    ingest_urls,
+    is_playlist_url,
+    load_settings,
+    resolve_engine,
+    write_catalogue,
+)
+
+# minimum seconds between two progress events of the same job
+PROGRESS_INTERVAL = 0.5
+# how often time-of-day bandwidth profiles are re-checked
+BANDWIDTH_CHECK_INTERVAL = 60
+# seconds to wait for stopped processes to exit on Ctrl+C
+SHUTDOWN_TIMEOUT = 5
+
+
+def read_urls(stream):
+    """URLs found in a list file, # comment lines are ignored
+
+    Variants of the same video (youtu.be, tracking parameters, ...) are
+    returned once, in canonical form.
+    """
+    lines = [line for line in stream if not line.lstrip().startswith("#")]
+    urls, _ = ingest_urls("".join(lines))
+    return [url for url, _ in urls]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Download a list of URLs with yt-dlp without a display."
+    )
+    parser.add_argument(
+        "url_file",
+        nargs="?",
+        default="-",
+        help="file with one URL per line, '-' or omitted reads stdin",
+    )
+    parser.add_argument("--ytdlp", help="path of the yt-dlp executable")
+    parser.add_argument(
+        "-o",
+        "--output",
+        default=os.path.join(os.path.expanduser("~"), "Downloads"),
+        help="download directory (default: ~/Downloads)",
+    )
+    parser.add_argument(
+        "-t",
+        "--type",
+        default="video",
+        choices=["video", "audio"],
+        help="download type (default: video)",
+    )
+    parser.add_argument(
+        "-q",
+        "--quality",
+        default="Auto (Best Quality)",
+        help="quality label as shown in the GUI, see --list-qualities",
+    )
+    parser.add_argument(
+        "-f", "--format", help="output container/codec (default: mp4 or mp3)"
+    )
+    parser.add_argument(
+        "-p",
+        "--preset",
+        help="named preset instead of -t/-q/-f, or 'auto' for the preset of each "
+        "URL's site with -t/-q/-f for other sites, see --list-presets",
+    )
+    parser.add_argument(
+        "-j", "--workers", type=int, default=3, help="parallel downloads (default: 3)"
+    )
+    parser.add_argument(
+        "--post-workers",
+        type=int,
+        default=POST_WORKERS,
+        help=f"parallel ffmpeg conversions (default: {POST_WORKERS}, one per core)",
+    )
+    parser.add_argument(
+        "--playlist",
+        action="store_true",
+        help="expand playlist/channel URLs into one job per entry",
+    )
+    parser.add_argument(
+        "--no-archive",
+        action="store_true",
+        help="do not skip or record videos in the download archive",
+    )
+    parser.add_argument(
+        "--history",
+        default=HISTORY_FILE,
+        help="SQLite file that records every finished job "
+        "(default: ~/.yt-dlp-gui/history.sqlite3)",
+    )
+    parser.add_argument(
+        "--no-history", action="store_true", help="do not record the job history"
+    )
+    parser.add_argument(
+        "--scratch-dir",
+        default="",
+        help="write unfinished downloads here, finished files are moved to "
+        "the download directory",
+    )
+    parser.add_argument(
+        "--min-free",
+        default=DISK_MIN_FREE,
+        help="disk space jobs must leave free before they start, 0 turns the "
+        f"check off (default: {DISK_MIN_FREE})",
+    )
+    parser.add_argument(
+        "--limit-rate",
+        default="",
+        help="total bandwidth shared by all downloads, e.g. 4M",
+    )
+    parser.add_argument(
+        "--job-limit-rate", default="", help="bandwidth limit of each download"
+    )
+    parser.add_argument(
+        "--rate-schedule",
+        default="",
+        help="time-of-day total limits, e.g. '00:00-07:00=0,09:00-18:00=2M'",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=3,
+        help="automatic retries of temporary failures (default: 3)",
+    )
+    parser.add_argument(
+        "--retry-delay",
+        type=float,
+        default=5,
+        help="seconds before the first retry, doubled each time (default: 5)",
+    )
+    parser.add_argument(
+        "--retry-max-delay",
+        type=float,
+        default=300,
+        help="upper bound of the retry delay in seconds (default: 300)",
+    )
+    parser.add_argument(
+        "--retry-on",
+        default="transient",
+        help="comma separated failure classes to retry: transient, auth, geo, "
+        "unavailable, unknown (default: transient)",
+    )
+    parser.add_argument(
+        "--max-per-host",
+        type=int,
+        default=0,
+        help="running downloads per site, 0 = unlimited (default: 0)",
+    )
+    parser.add_argument(
+        "-N",
+        "--concurrent-fragments",
+        default="auto",
+        help="fragments downloaded in parallel (default: auto per site)",
+    )
+    parser.add_argument(
+        "--http-chunk-size",
+        default="auto",
+        help="chunk size of HTTP downloads, e.g. 10M (default: auto per site)",
+    )
+    parser.add_argument(
+        "--downloader",
+        default="native",
+        choices=DOWNLOADERS,
+        help="external downloader (default: native)",
+    )
+    parser.add_argument(
+        "--connections",
+        type=int,
+        default=8,
+        help="connections per download for aria2c (default: 8)",
+    )
+    parser.add_argument(
+        "--backend",
+        default="executable",
+        choices=BACKENDS,
+        help="'python' runs downloads in warm worker processes with the yt_dlp "
+        "package, falling back to the executable (default: executable)",
+    )
+    parser.add_argument(
+        "--subtitles",
+        action="store_true",
+        help="fetch subtitles in batched side-car jobs ahead of the media",
+    )
+    parser.add_argument(
+        "--thumbnail", action="store_true", help="fetch thumbnails as side-cars"
+    )
+    parser.add_argument(
+        "--info-json", action="store_true", help="fetch .info.json files as side-cars"
+    )
+    parser.add_argument(
+        "--sub-langs",
+        default=SUB_LANGS,
+        help=f"subtitle languages, as yt-dlp's --sub-langs (default: {SUB_LANGS})",
+    )
+    parser.add_argument(
+        "--sidecars-only",
+        action="store_true",
+        help="fetch the side-cars and skip the media downloads",
+    )
+    parser.add_argument(
+        "--catalogue",
+        metavar="FILE",
+        help="write the metadata of all videos of the run to a CSV file",
+    )
+    parser.add_argument(
+        "--metrics-csv",
+        help="append queue, speed and per-process CPU/memory samples to a CSV file",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help="serve Prometheus metrics on http://127.0.0.1:PORT/metrics",
+    )
+    parser.add_argument(
+        "--log-dir", help="write the full yt-dlp output of each job to this directory"
+    )
+    parser.add_argument(
+        "-v", "--verbose", action="store_true", help="echo yt-dlp output to stderr"
+    )
+    parser.add_argument(
+        "--list-qualities",
+        action="store_true",
+        help="print the quality labels and formats and exit",
+    )
+    parser.add_argument(
+        "--list-presets",
+        action="store_true",
+        help="print the built-in and saved presets and exit",
+    )
+    args = parser.parse_args(argv)
+    if args.workers < 1 or args.post_workers < 1:
+        parser.error("--workers and --post-workers must be at least 1")
+    args.type = args.type.capitalize()
+    flags = {
+        "subtitles": args.subtitles,
+        "thumbnail": args.thumbnail,
+        "info": args.info_json,
+    }
+    args.sidecars = [kind for kind in SIDECAR_OPTIONS if flags[kind]]
+    # a catalogue needs the metadata of every video
+    if (args.catalogue or args.sidecars_only) and not args.sidecars:
+        args.sidecars = ["info"]
+    return args
+
+
+def retry_policy(args):
+    return RetryPolicy(
+        args.retries,
+        args.retry_delay,
+        args.retry_max_delay,
+        host_limit=args.max_per_host,
+        retry_on=args.retry_on,
+    )
+
+
+def download_presets(args):
+    """(preset library, preset of URLs without a site preset)
+
+    Raises ValueError for unknown presets, qualities and formats.
+    """
+    presets = PresetLibrary(load_settings().get("presets"))
+    preset = DownloadPreset(CUSTOM_PRESET, args.type, args.quality, args.format)
+    if args.preset and args.preset.lower() != "auto":
+        preset = presets.get(args.preset)
+        if preset is None:
+            raise ValueError(f"unknown preset: {args.preset}")
+        presets = None
+    return presets, preset
+
+
+def engine_settings(args):
+    return {
+        "concurrent_fragments": args.concurrent_fragments,
+        "http_chunk_size": args.http_chunk_size,
+        "downloader": args.downloader,
+        "connections": args.connections,
+        "backend": args.backend,
+    }
+
+
+class HeadlessRunner:
+    def __init__(self, args):
+        self.args = args
+        self.ytdlp = args.ytdlp or (cached_ytdlp() or {}).get("path")
+        self.ytdlp = self.ytdlp or find_ytdlp() or "yt-dlp"
+        self.archive = None if args.no_archive else DownloadArchive(ARCHIVE_FILE)
+        self.history = None if args.no_history else JobHistory(args.history)
+        self.sidecars = SidecarCache() if args.sidecars else None
+        self.manager = DownloadManager(
+            self.on_event,
+            args.workers,
+            self.archive,
+            log_dir=args.log_dir,
+            post_workers=args.post_workers,
+            history=self.history,
+            sidecars=self.sidecars,
+        )
+        self.manager.bandwidth = BandwidthPolicy(
+            args.limit_rate, args.job_limit_rate, args.rate_schedule
+        )
+        self.manager.retry = retry_policy(args)
+        self.manager.disk = DiskPolicy(args.scratch_dir, args.min_free)
+        self.presets, self.preset = download_presets(args)
+        self.output_lock = threading.Lock()
+        self.last_progress = {}
+        self.metrics = Instrumentation(self.manager)
+        self.metrics_csv = MetricsCsv(args.metrics_csv) if args.metrics_csv else None
+        self.metrics_server = None
+        if args.metrics_port:
+            self.metrics_server = MetricsServer(self.metrics, args.metrics_port)
+
+    def emit(self, event):
+        with self.output_lock:
+            sys.stdout.write(json.dumps(event) + "\n")
+            sys.stdout.flush()
+
+    def on_event(self, kind, job, payload):
+        """called from the manager's event loop thread"""
+        if kind == "log":
+            if self.args.verbose:
+                with self.output_lock:
+                    sys.stderr.write(f"[{job.id}] {payload}\n")
+            return
+        if kind == "progress":
+            now = time.monotonic()
+            if now - self.last_progress.get(job.id, 0) < PROGRESS_INTERVAL:
+                return
+            self.last_progress[job.id] = now
+        self.emit(
+            {
+                "event": kind,
+                "job": job.id,
+                "kind": job.kind,
+                "url": job.url,
+                "status": job.status,
+                "stage": job.stage,
+                "progress": round(job.progress, 1),
+                "downloaded_bytes": job.downloaded_bytes,
+                "total_bytes": job.total_bytes,
+                "speed": job.speed,
+                "rate_limit": job.rate_limit,
+                "eta": job.eta,
+                "average_speed": job.average_speed,
+                "engine": job.engine,
+                "output_path": job.output_path,
+                "message": job.status_text,
+                "failure_class": job.failure_category,
+                "attempts": job.attempts,
+            }
+        )
+
+    def sample_metrics(self):
+        if self.metrics_csv is None and self.metrics_server is None:
+            return
+        snapshot = self.metrics.sample()
+        if self.metrics_csv is not None:
+            self.metrics_csv.write(snapshot)
+
+    def close_metrics(self):
+        if self.metrics_csv is not None:
+            self.metrics_csv.close()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+
+    def expand(self, urls):
+        """(url, archive key, batch) for every download"""
+        for url in urls:
+            if self.args.playlist and is_playlist_url(url):
+                try:
+                    title, entries = fetch_playlist(self.ytdlp, url)
+                except Exception as e:
+                    self.emit({"event": "error", "url": url, "message": str(e)})
+                    continue
+                for entry in entries:
+                    link = entry_url(entry)
+                    key = archive_key(entry.get("ie_key"), entry.get("id"))
+                    yield link, key or archive_key_from_url(link), title
+            else:
+                yield url, archive_key_from_url(url), ""
+
+    def preset_for(self, url):
+        """compiled preset of a download, by site with --preset auto"""
+        if self.presets is not None:
+            return self.presets.for_url(url) or self.preset
+        return self.preset
+
+    def run(self, urls):
+        args = self.args
+        os.makedirs(args.output, exist_ok=True)
+        if self.archive is not None:
+            os.makedirs(os.path.dirname(ARCHIVE_FILE), exist_ok=True)
+
+        seen = set()
+        downloads = []
+        for url, key, batch in self.expand(urls):
+            # playlists may contain videos that are also listed on their own
+            if key and key in seen:
+                self.emit({"event": "duplicate", "url": url, "archive_key": key})
+                continue
+            seen.add(key)
+            downloads.append((url, key, batch))
+
+        # side-cars go first, also of videos already in the archive
+        if self.sidecars is not None:
+            batches = {}
+            for url, key, batch in downloads:
+                batches.setdefault(batch, []).append(url)
+            keys = {url: key for url, key, _ in downloads if key}
+            for batch, batch_urls in batches.items():
+                self.manager.add_sidecars(
+                    self.ytdlp,
+                    batch_urls,
+                    args.output,
+                    args.sidecars,
+                    args.sub_langs,
+                    batch,
+                    start=False,
+                    keys=keys,
+                )
+            self.manager.schedule()
+
+        for url, key, batch in downloads:
+            if args.sidecars_only:
+                continue
+            if self.archive is not None and key in self.archive:
+                self.emit({"event": "skipped", "url": url, "archive_key": key})
+                continue
+            engine = resolve_engine(engine_settings(args), url)
+            preset = self.preset_for(url)
+            cmd = preset.command(
+                self.ytdlp,
+                url,
+                args.output,
+                use_archive=self.archive is not None,
+                engine=engine,
+                scratch_dir=self.manager.disk.scratch_dir or None,
+            )
+            self.manager.add_job(
+                url,
+                cmd,
+                args.output,
+                preset.quality,
+                preset.output_format,
+                batch,
+                header=[
+                    f"Preset: {preset.name}",
+                    f"Engine: {describe_engine(engine)}",
+                    f"Command: {' '.join(cmd)}",
+                ],
+                key=key,
+                engine=engine,
+                postprocess=preset.plan,
+                scratch_dir=self.manager.disk.scratch_dir or None,
+            )
+
+        if self.metrics_server is not None:
+            self.metrics_server.start()
+        last_check = last_sample = time.monotonic()
+        while not self.manager.is_idle():
+            time.sleep(0.2)
+            if time.monotonic() - last_check > BANDWIDTH_CHECK_INTERVAL:
+                last_check = time.monotonic()
+                self.manager.rebalance()
+            if time.monotonic() - last_sample >= METRICS_INTERVAL:
+                last_sample = time.monotonic()
+                self.sample_metrics()
+        self.sample_metrics()
+        self.close_metrics()
+        if args.catalogue:
+            # other sites have no key in the url, it is known once fetched
+            fetched = {}
+            for job in self.manager.jobs.values():
+                fetched.update(job.sidecar_keys)
+            keys = [fetched.get(url) or key for url, key, _ in downloads]
+            rows = self.sidecars.catalogue([key for key in keys if key])
+            try:
+                write_catalogue(args.catalogue, rows)
+                self.emit(
+                    {"event": "catalogue", "path": args.catalogue, "videos": len(rows)}
+                )
+            except OSError as e:
+                self.emit({"event": "error", "url": None, "message": str(e)})
+
+        failed = [job for job in self.manager.jobs.values() if job.status == "failed"]
+        self.emit(
+            {
+                "event": "finished",
+                "jobs": len(self.manager.jobs),
+                "failed": len(failed),
+            }
+        )
+        return 1 if failed else 0
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.list_qualities:
+        print("Video qualities: " + ", ".join(VIDEO_QUALITIES))
+        print("Video formats:   " + ", ".join(VIDEO_FORMATS))
+        print("Audio qualities: " + ", ".join(AUDIO_QUALITIES))
+        print("Audio formats:   " + ", ".join(AUDIO_FORMATS))
+        return 0
+    if args.list_presets:
+        presets = PresetLibrary(load_settings().get("presets"))
+        for name, preset in presets.presets.items():
+            text = f"{name}: {preset.download_type}, {preset.quality}"
+            text += f", {preset.output_format or 'original format'}"
+            if preset.sites:
+                text += f" (auto for {', '.join(preset.sites)})"
+            print(text)
+        return 0
+    try:
+        download_presets(args)
+        BandwidthPolicy(args.limit_rate, args.job_limit_rate, args.rate_schedule)
+        DiskPolicy(args.scratch_dir, args.min_free).check_save_dir(args.output)
+        resolve_engine(engine_settings(args), "")
+        retry_policy(args)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+    if args.url_file == "-":
+        urls = read_urls(sys.stdin)
+    else:
+        with open(args.url_file, "r", encoding="utf-8") as f:
+            urls = read_urls(f)
+
+    try:
+        runner = HeadlessRunner(args)
+    except OSError as e:
+        print(e, file=sys.stderr)
+        return 2
+    try:
+        return runner.run(urls)
+    except KeyboardInterrupt:
+        runner.manager.stop_all()
+        runner.manager.join(SHUTDOWN_TIMEOUT)
+        runner.close_metrics()
+        return 130
+
+
+if __name__ == "__main__":
+    sys.exit(main())
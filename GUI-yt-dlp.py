@@ -1,610 +1,2122 @@
-import tkinter as tk
-from tkinter import ttk, filedialog, scrolledtext, messagebox
-import subprocess
-import threading
-import re
-import os
-import sys
-import signal
-
-
-class YtDlpGUI:
-    def __init__(self, root):
-        self.root = root
-        self.root.title("yt-dlp GUI")
-        self.root.geometry("800x600")
-        self.root.minsize(800, 600)
-
-        self.style = ttk.Style()
-        self.style.configure("TButton", padding=5)
-        self.style.configure("TLabel", padding=5)
-
-        self.process = None
-        self.is_downloading = False
-        self.stop_requested = False
-        self.current_filename = None
-
-        self.create_widgets()
-
-    def create_widgets(self):
-        main_frame = ttk.Frame(self.root, padding="10")
-        main_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
-
-        self.root.columnconfigure(0, weight=1)
-        self.root.rowconfigure(0, weight=1)
-        main_frame.columnconfigure(1, weight=1)
-
-        # 1. yt-dlp path
-        row = 0
-        ttk.Label(main_frame, text="yt-dlp Path:").grid(
-            row=row, column=0, sticky=tk.W, pady=5
-        )
-        self.ytdlp_path = ttk.Entry(main_frame)
-        self.ytdlp_path.grid(row=row, column=1, sticky=(tk.W, tk.E), padx=5)
-        self.auto_detect_ytdlp()
-        ttk.Button(main_frame, text="Browse...", command=self.browse_ytdlp).grid(
-            row=row, column=2, padx=5
-        )
-
-        # 2. download path
-        row += 1
-        ttk.Label(main_frame, text="Download Path:").grid(
-            row=row, column=0, sticky=tk.W, pady=5
-        )
-        self.save_path = ttk.Entry(main_frame)
-        self.save_path.grid(row=row, column=1, sticky=(tk.W, tk.E), padx=5)
-        default_download = os.path.join(
-            os.environ.get("USERPROFILE", os.environ.get("HOME", "")), "Downloads"
-        )
-        self.save_path.insert(0, default_download)
-        ttk.Button(main_frame, text="Browse...", command=self.browse_save_path).grid(
-            row=row, column=2, padx=5
-        )
-
-        # 3. download type
-        row += 1
-        ttk.Label(main_frame, text="Download Type:").grid(
-            row=row, column=0, sticky=tk.W, pady=5
-        )
-        self.download_type = ttk.Combobox(
-            main_frame, values=["Video", "Audio"], state="readonly"
-        )
-        self.download_type.grid(row=row, column=1, sticky=(tk.W, tk.E), padx=5, pady=5)
-        self.download_type.set("Video")
-        self.download_type.bind("<<ComboboxSelected>>", self.on_download_type_change)
-
-        # 4. quality/format
-        row += 1
-        ttk.Label(main_frame, text="Quality/Format:").grid(
-            row=row, column=0, sticky=tk.W, pady=5
-        )
-
-        # 2 dropdown lists side by side
-        quality_frame = ttk.Frame(main_frame)
-        quality_frame.grid(row=row, column=1, sticky=(tk.W, tk.E), padx=5, pady=5)
-        quality_frame.columnconfigure(0, weight=3)  # quality
-        quality_frame.columnconfigure(1, weight=1)  # format
-        quality_frame.columnconfigure(2, weight=0)  # fixed label
-
-        # quality dropdown
-        self.quality_combo = ttk.Combobox(quality_frame, state="readonly")
-        self.quality_combo.grid(row=0, column=0, sticky=(tk.W, tk.E), padx=(0, 5))
-
-        # format dropdown
-        self.format_combo = ttk.Combobox(quality_frame, width=10, state="readonly")
-        self.format_combo.grid(row=0, column=1, sticky=tk.W)
-
-        ttk.Label(quality_frame, text="(Quality | Format)").grid(
-            row=0, column=2, sticky=tk.W, padx=(5, 0)
-        )
-
-        # initialise options
-        self.update_quality_options()
-        self.update_format_options()
-
-        # URL
-        row += 1
-        ttk.Label(main_frame, text="Video URL:").grid(
-            row=row, column=0, sticky=tk.W, pady=5
-        )
-        self.url_entry = ttk.Entry(main_frame)
-        self.url_entry.grid(
-            row=row, column=1, columnspan=2, sticky=(tk.W, tk.E), padx=5, pady=5
-        )
-        self.url_entry.insert(0, "https://www.youtube.com/watch?v=...")
-        self.url_entry.bind("<FocusOut>", self.check_url_type)
-        self.url_entry.bind("<KeyRelease>", self.check_url_type)
-
-        self.url_type_label = ttk.Label(main_frame, text="", foreground="blue")
-        self.url_type_label.grid(
-            row=row + 1, column=1, columnspan=2, sticky=tk.W, padx=5
-        )
-
-        # 5. download button
-        row += 2
-        button_frame = ttk.Frame(main_frame)
-        button_frame.grid(row=row, column=0, columnspan=3, pady=20)
-        self.download_btn = ttk.Button(
-            button_frame,
-            text="▶ Start download",
-            command=self.start_download,
-            width=20,
-        )
-        self.download_btn.pack()
-
-        # progress bar
-        row += 1
-        self.progress_var = tk.DoubleVar(value=0)
-        self.progress_bar = ttk.Progressbar(
-            main_frame,
-            variable=self.progress_var,
-            maximum=100,
-            mode="determinate",
-            length=400,
-        )
-        self.progress_bar.grid(
-            row=row, column=0, columnspan=3, sticky=(tk.W, tk.E), padx=5, pady=5
-        )
-        self.progress_label = ttk.Label(main_frame, text="Ready", foreground="gray")
-        self.progress_label.grid(row=row + 1, column=0, columnspan=3, pady=2)
-
-        # log detail
-        row += 2
-        ttk.Label(main_frame, text="Download Log:").grid(
-            row=row, column=0, sticky=tk.W, pady=5
-        )
-        self.log_text = scrolledtext.ScrolledText(
-            main_frame,
-            wrap=tk.WORD,
-            height=20,
-            font=("Consolas", 10),
-            bg="#f5f5f5",
-            fg="#333333",
-        )
-        self.log_text.grid(
-            row=row + 1,
-            column=0,
-            columnspan=3,
-            sticky=(tk.W, tk.E, tk.N, tk.S),
-            padx=5,
-            pady=5,
-        )
-        main_frame.rowconfigure(row + 1, weight=1)
-        ttk.Button(main_frame, text="Clear Log", command=self.clear_log).grid(
-            row=row, column=2, sticky=tk.E, pady=5
-        )
-
-    def check_url_type(self, event=None):
-        url = self.url_entry.get().strip()
-        if not url or "..." in url:
-            self.url_type_label.config(text="")
-            return
-        if self.is_playlist_url(url):
-            self.url_type_label.config(
-                text="⚠️ Detected playlist, will only download current video",
-                foreground="orange",
-            )
-        else:
-            self.url_type_label.config(text="✓ Single video link", foreground="green")
-
-    def is_playlist_url(self, url):
-        if "list=" in url and "youtube.com" in url:
-            return True
-        if "music.youtube.com" in url and "list=" in url:
-            return True
-        if "bilibili.com" in url and "plist=" in url:
-            return True
-        playlist_indicators = ["playlist", "list=", "album=", "page="]
-        return any(indicator in url.lower() for indicator in playlist_indicators)
-
-    def auto_detect_ytdlp(self):
-        possible_paths = [
-            "yt-dlp.exe",
-            "yt-dlp",
-            os.path.expanduser("~/yt-dlp.exe"),
-            os.path.expanduser("~/yt-dlp"),
-            "/usr/local/bin/yt-dlp",
-            "/usr/bin/yt-dlp",
-            "C:/yt-dlp/yt-dlp.exe",
-        ]
-        for path in possible_paths:
-            if os.path.exists(path) or self.command_exists(path):
-                self.ytdlp_path.insert(0, path)
-                return
-        self.ytdlp_path.insert(0, "yt-dlp.exe")
-
-    def command_exists(self, cmd):
-        try:
-            subprocess.run([cmd, "--version"], capture_output=True, check=True)
-            return True
-        except:
-            return False
-
-    def browse_ytdlp(self):
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        filename = filedialog.askopenfilename(
-            title="Choose yt-dlp executable",
-            initialdir=script_dir,
-            filetypes=[("Executable", "*.exe"), ("All Files", "*.*")],
-        )
-        if filename:
-            self.ytdlp_path.delete(0, tk.END)
-            self.ytdlp_path.insert(0, filename)
-
-    def browse_save_path(self):
-        directory = filedialog.askdirectory(title="Choose download path")
-        if directory:
-            self.save_path.delete(0, tk.END)
-            self.save_path.insert(0, directory)
-
-    def on_download_type_change(self, event=None):
-        """update quality and format options when download type changes"""
-        self.update_quality_options()
-        self.update_format_options()
-
-    def update_quality_options(self):
-        """update quality dropdown based on download type"""
-        download_type = self.download_type.get()
-
-        if download_type == "Video":
-            qualities = [
-                "Auto (Best Quality)",
-                "Best Quality (best)",
-                "1080p",
-                "720p",
-                "480p",
-                "360p",
-                "Only Video (No Audio)",
-                "Only Audio Extraction",
-            ]
-        else:  # Audio
-            qualities = [
-                "Auto (Best Quality)",
-                "Best Quality (320k)",
-                "High Quality (256k)",
-                "Standard Quality (192k)",
-                "Medium Quality (128k)",
-                "Low Quality (96k)",
-            ]
-
-        self.quality_combo["values"] = qualities
-        self.quality_combo.set(qualities[0])
-
-    def update_format_options(self):
-        """update format dropdown based on download type"""
-        download_type = self.download_type.get()
-
-        if download_type == "Video":
-            # video format, default mp4
-            formats = ["mp4", "webm", "mkv", "mov", "avi"]
-            self.format_combo["values"] = formats
-            self.format_combo.set("mp4")
-        else:
-            # audio format, default mp3
-            formats = ["mp3", "m4a", "wav", "flac", "opus"]
-            self.format_combo["values"] = formats
-            self.format_combo.set("mp3")
-
-    def get_quality_option(self):
-        """get quality parameter for yt-dlp based on selection"""
-        download_type = self.download_type.get()
-        quality = self.quality_combo.get()
-
-        if download_type == "Video":
-            quality_map = {
-                "Auto (Best Quality)": "",
-                "Best Quality (best)": "-f best",
-                "1080p": '-f "bestvideo[height<=1080]+bestaudio/best[height<=1080]"',
-                "720p": '-f "bestvideo[height<=720]+bestaudio/best[height<=720]"',
-                "480p": '-f "bestvideo[height<=480]+bestaudio/best[height<=480]"',
-                "360p": '-f "bestvideo[height<=360]+bestaudio/best[height<=360]"',
-                "Only Video (No Audio)": "-f bestvideo",
-                "Only Audio Extraction": "-f bestaudio",
-            }
-        else:
-            quality_map = {
-                "Auto (Best Quality)": "--audio-quality 0",
-                "Best Quality (320k)": "--audio-quality 0",
-                "High Quality (256k)": "--audio-quality 2",
-                "Standard Quality (192k)": "--audio-quality 3",
-                "Medium Quality (128k)": "--audio-quality 5",
-                "Low Quality (96k)": "--audio-quality 7",
-            }
-
-        return quality_map.get(quality, "")
-
-    def get_format_option(self):
-        """get output format parameter"""
-        download_type = self.download_type.get()
-        output_format = self.format_combo.get()
-
-        if download_type == "Video":
-            # video: use --remux-video or --merge-output-format to ensure output format
-            if output_format:
-                return f"--merge-output-format {output_format}"
-            return ""
-        else:
-            # Audio: use --audio-format
-            if output_format:
-                return f"--extract-audio --audio-format {output_format}"
-            return "--extract-audio"
-
-    def log(self, message):
-        self.root.after(0, lambda: self._append_log(message))
-
-    def _append_log(self, message):
-        self.log_text.insert(tk.END, message + "\n")
-        self.log_text.see(tk.END)
-
-    def update_progress(self, percent, status_text=""):
-        self.root.after(0, lambda: self._set_progress(percent, status_text))
-
-    def _set_progress(self, percent, status_text):
-        self.progress_var.set(percent)
-        if status_text:
-            self.progress_label.config(text=status_text, foreground="#2196F3")
-        if percent >= 100:
-            self.progress_label.config(text="Download Complete!", foreground="green")
-
-    def parse_progress(self, line):
-        patterns = [
-            r"\[download\]\s+(\d+\.?\d*)%",
-            r"(\d+\.?\d*)%",
-            r"\[download\].*?(\d+)%",
-        ]
-        for pattern in patterns:
-            match = re.search(pattern, line)
-            if match:
-                try:
-                    return float(match.group(1))
-                except:
-                    pass
-        if "[download] 100%" in line:
-            return 100
-        return None
-
-    def extract_filename(self, line):
-        """Extract filename from yt-dlp output line"""
-        match = re.search(r"\[download\]\s+Destination:\s+(.+)", line)
-        if match:
-            return match.group(1).strip()
-        match = re.search(r"\[ExtractAudio\]\s+Destination:\s+(.+)", line)
-        if match:
-            return match.group(1).strip()
-        match = re.search(r"\[Fixup\w*\]\s+(.+)", line)
-        if match:
-            return match.group(1).strip()
-        match = re.search(r"Already downloaded:\s+(.+)", line)
-        if match:
-            return match.group(1).strip()
-        return None
-
-    def start_download(self):
-        if self.is_downloading:
-            messagebox.showwarning("Alert", "Download is already in progress!")
-            return
-
-        ytdlp = self.ytdlp_path.get().strip()
-        save_dir = self.save_path.get().strip()
-        url = self.url_entry.get().strip()
-
-        if not ytdlp:
-            messagebox.showerror("Error", "Please specify the yt-dlp path!")
-            return
-        if not save_dir:
-            messagebox.showerror("Error", "Please specify the save path!")
-            return
-        if not url or "..." in url or not url.startswith("http"):
-            messagebox.showerror("Error", "Please enter a valid video URL!")
-            return
-
-        os.makedirs(save_dir, exist_ok=True)
-        self.stop_requested = False
-        self.current_filename = None
-
-        # command line string
-        cmd = [ytdlp]
-
-        # add quality option
-        quality_opt = self.get_quality_option()
-        if quality_opt:
-            if '"' in quality_opt:
-                parts = quality_opt.split('"')
-                for i, part in enumerate(parts):
-                    if i % 2 == 0:
-                        if part.strip():
-                            cmd.extend(part.strip().split())
-                    else:
-                        cmd.append(part)
-            else:
-                cmd.extend(quality_opt.split())
-
-        # add format option
-        format_opt = self.get_format_option()
-        if format_opt:
-            cmd.extend(format_opt.split())
-
-        # playlist handling
-        if self.is_playlist_url(url):
-            cmd.extend(["--no-playlist"])
-
-        # output template (use Video ID to make sure the filename is valid)
-        cmd.extend(["-o", os.path.join(save_dir, "%(title)s [%(id)s].%(ext)s")])
-
-        # other options
-        cmd.extend(["--newline", "--progress"])
-
-        # add remux option for video format conversion
-        if self.download_type.get() == "Video" and self.format_combo.get():
-            # make sure ffmpeg can handle format conversion
-            pass  # --merge-output-format has been added above
-
-        cmd.append(url)
-
-        self.log_text.delete(1.0, tk.END)
-        self.log("=" * 60)
-        self.log("Start download...")
-        self.log(f"Quality: {self.quality_combo.get()}")
-        self.log(f"Format: {self.format_combo.get()}")
-        self.log(f"Command: {' '.join(cmd)}")
-        self.log("=" * 60)
-
-        self.progress_var.set(0)
-        self.progress_label.config(text="Connecting...", foreground="orange")
-        self.is_downloading = True
-        self.download_btn.config(text="⏹ Stop Download", command=self.stop_download)
-
-        thread = threading.Thread(target=self.run_download, args=(cmd,))
-        thread.daemon = True
-        thread.start()
-
-    def run_download(self, cmd):
-        try:
-            if sys.platform == "win32":
-                self.process = subprocess.Popen(
-                    cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.STDOUT,
-                    universal_newlines=True,
-                    encoding="utf-8",
-                    errors="replace",
-                    bufsize=1,
-                    creationflags=subprocess.CREATE_NEW_PROCESS_GROUP,
-                )
-            else:
-                self.process = subprocess.Popen(
-                    cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.STDOUT,
-                    universal_newlines=True,
-                    encoding="utf-8",
-                    errors="replace",
-                    bufsize=1,
-                    preexec_fn=os.setsid,
-                )
-
-            for line in self.process.stdout:
-                if self.stop_requested:
-                    break
-                line = line.strip()
-                if line:
-                    self.log(line)
-                    filename = self.extract_filename(line)
-                    if filename:
-                        self.current_filename = filename
-                    progress = self.parse_progress(line)
-                    if progress is not None:
-                        self.update_progress(
-                            progress, f"Download progress: {progress:.1f}%"
-                        )
-
-            if self.stop_requested:
-                self._force_kill_process()
-                self.update_progress(0, "Download forcibly stopped")
-                self.log("=" * 60)
-                self.log("✗ Download forcibly stopped by user")
-                return
-
-            return_code = self.process.wait()
-
-            self.log("=" * 60)
-            if return_code == 0:
-                self.update_progress(100, "Download completed!")
-                if self.current_filename and os.path.exists(self.current_filename):
-                    self.log(f"✓ Download completed successfully!")
-                    self.log(f"File saved at: {self.current_filename}")
-                else:
-                    save_dir = self.save_path.get().strip()
-                    self.log(f"✓ Download completed successfully!")
-                    self.log(f"File saved to directory: {save_dir}")
-                    try:
-                        files = [
-                            f
-                            for f in os.listdir(save_dir)
-                            if os.path.isfile(os.path.join(save_dir, f))
-                        ]
-                        if files:
-                            files.sort(
-                                key=lambda x: os.path.getmtime(
-                                    os.path.join(save_dir, x)
-                                ),
-                                reverse=True,
-                            )
-                            self.log(f"Latest file might be: {files[0]}")
-                    except:
-                        pass
-            else:
-                self.update_progress(0, f"Download failed (Error code: {return_code})")
-                self.log(f"✗ Download failed, error code: {return_code}")
-
-        except Exception as e:
-            self.log(f"Error: {str(e)}")
-            self.update_progress(0, f"Error: {str(e)}")
-        finally:
-            self.is_downloading = False
-            self.process = None
-            self.stop_requested = False
-            self.current_filename = None
-            self.root.after(0, self.reset_ui)
-
-    def _force_kill_process(self):
-        if self.process is None:
-            return
-        try:
-            if sys.platform == "win32":
-                try:
-                    os.kill(self.process.pid, signal.CTRL_BREAK_EVENT)
-                    self.process.wait(timeout=2)
-                except:
-                    pass
-                if self.process.poll() is None:
-                    self.process.kill()
-                    self.process.wait()
-            else:
-                try:
-                    os.killpg(os.getpgid(self.process.pid), signal.SIGTERM)
-                    self.process.wait(timeout=2)
-                except:
-                    pass
-                if self.process.poll() is None:
-                    try:
-                        os.killpg(os.getpgid(self.process.pid), signal.SIGKILL)
-                    except:
-                        self.process.kill()
-        except Exception as e:
-            self.log(f"Error stopping process: {e}")
-
-    def reset_ui(self):
-        self.download_btn.config(text="▶ Start Download", command=self.start_download)
-        if (
-            not self.is_downloading
-            and self.progress_var.get() < 100
-            and self.progress_var.get() > 0
-        ):
-            self.progress_label.config(text="Stopped", foreground="red")
-
-    def stop_download(self):
-        if not self.is_downloading:
-            return
-        self.log("=" * 60)
-        self.log("User requested to stop download, forcibly terminating process...")
-        self.stop_requested = True
-        self._force_kill_process()
-        self.is_downloading = False
-        self.update_progress(0, "Stopped")
-        self.reset_ui()
-
-    def clear_log(self):
-        self.log_text.delete(1.0, tk.END)
-        self.progress_var.set(0)
-        self.progress_label.config(text="Ready", foreground="gray")
-
-
-def main():
-    root = tk.Tk()
-    app = YtDlpGUI(root)
-    root.mainloop()
-
-
-if __name__ == "__main__":
-    main()
+import tkinter as tk
+from tkinter import ttk, filedialog, scrolledtext, messagebox
+import subprocess
+import threading
+import os
+import sys
+import time
+import queue
+import collections
+import sqlite3
+
+# optional drag and drop of URL lists, plain Tk has no file drop support
+try:
+    import tkinterdnd2
+except ImportError:
+    tkinterdnd2 = None
+
+from ytdlp_core import (
+    APP_DIR,
+    QUEUE_FILE,
+    ARCHIVE_FILE,
+    HISTORY_FILE,
+    VIDEO_QUALITIES,
+    AUDIO_QUALITIES,
+    VIDEO_FORMATS,
+    AUDIO_FORMATS,
+    URL_RE,
+    BACKENDS,
+    DOWNLOADERS,
+    ENGINE_DEFAULTS,
+    FORMAT_SELECTION_OPTIONS,
+    SIDECAR_OPTIONS,
+    SUB_LANGS,
+    AUTO_PRESET,
+    CUSTOM_PRESET,
+    METRICS_INTERVAL,
+    METRICS_POINTS,
+    METRICS_PORT,
+    PROC_AVAILABLE,
+    BandwidthPolicy,
+    DiskPolicy,
+    RetryPolicy,
+    SidecarCache,
+    InfoCache,
+    DownloadArchive,
+    DownloadManager,
+    DownloadPreset,
+    Instrumentation,
+    JobHistory,
+    MetricsCsv,
+    MetricsServer,
+    PresetLibrary,
+    archive_key,
+    archive_key_from_url,
+    cached_ytdlp,
+    describe_engine,
+    entry_url,
+    expected_size,
+    fetch_info,
+    fetch_playlist,
+    find_ytdlp,
+    format_choices,
+    format_eta,
+    format_option,
+    format_rate,
+    format_size,
+    free_space,
+    ingest_urls,
+    is_channel_url,
+    is_playlist_url,
+    load_settings,
+    probe_ytdlp,
+    quality_option,
+    resolve_engine,
+    update_settings,
+    write_catalogue,
+)
+
+LOG_VIEW_LINES = 2000
+# how often worker events are drained into the widgets
+UI_REFRESH_MS = 75
+# delay after the last keystroke in the URL field before formats are fetched
+PREFETCH_DELAY_MS = 600
+# re-check time-of-day bandwidth profiles and fair shares
+BANDWIDTH_CHECK_MS = 60 * 1000
+# how often the clipboard is checked for new URLs while watching it
+CLIPBOARD_POLL_MS = 1000
+# seconds to wait for paused processes to exit when the window is closed
+SHUTDOWN_TIMEOUT = 5
+# samples for the instrumentation panel and the metrics export
+METRICS_MS = int(METRICS_INTERVAL * 1000)
+
+
+def draw_sparkline(canvas, values, x, y, width, height, color, peak=None):
+    """line of the last METRICS_POINTS values, right aligned in the box"""
+    peak = peak or max(values, default=0)
+    canvas.create_line(x, y + height, x + width, y + height, fill="#dddddd")
+    if len(values) < 2 or not peak:
+        return
+    step = width / (METRICS_POINTS - 1)
+    left = x + width - (len(values) - 1) * step
+    points = []
+    for index, value in enumerate(values):
+        points.extend([left + index * step, y + height - value * height / peak])
+    canvas.create_line(*points, fill=color)
+
+
+def open_with_system(path):
+    """open a file with the default application of the platform"""
+    if sys.platform == "win32":
+        os.startfile(path)
+    elif sys.platform == "darwin":
+        subprocess.Popen(["open", path])
+    else:
+        subprocess.Popen(["xdg-open", path])
+
+
+class YtDlpGUI:
+    def __init__(self, root):
+        self.root = root
+        self.root.title("yt-dlp GUI")
+        self.root.geometry("900x800")
+        self.root.minsize(800, 700)
+
+        self.style = ttk.Style()
+        self.style.configure("TButton", padding=5)
+        self.style.configure("TLabel", padding=5)
+
+        self.archive = DownloadArchive(ARCHIVE_FILE)
+        try:
+            self.history = JobHistory(HISTORY_FILE)
+        except (OSError, sqlite3.Error):
+            self.history = None
+        self.sidecars = SidecarCache()
+        self.manager = DownloadManager(
+            self.on_manager_event,
+            archive=self.archive,
+            history=self.history,
+            sidecars=self.sidecars,
+        )
+        self.manager.bandwidth = BandwidthPolicy.from_settings(
+            load_settings().get("bandwidth")
+        )
+        self.manager.retry = RetryPolicy.from_settings(load_settings().get("retry"))
+        self.manager.disk = DiskPolicy.from_settings(load_settings().get("disk"))
+        self.selected_job_id = None
+        self.log_shown = 0  # lines of the selected job already in the log view
+        self.log_filter = ""  # active search text, pauses the live log
+        self.info_cache = InfoCache()
+        self.current_info = None  # metadata of the URL in url_entry
+        self.dynamic_qualities = {}  # quality label -> option from real formats
+        self.presets = PresetLibrary(load_settings().get("presets"))
+        self.compiled_options = None  # (widget values, DownloadPreset of them)
+        self.prefetch_after = None
+        self.prefetching = set()
+        self.ui_queue = queue.Queue()
+        self.watch_clipboard = tk.BooleanVar(value=False)
+        self.last_clipboard = None
+        self.metrics = Instrumentation(self.manager)
+        self.metrics_csv = None  # MetricsCsv while exporting to a file
+        self.metrics_server = None  # MetricsServer while serving /metrics
+        self.metrics_dialog = None
+        self.metrics_view = None  # refresh function of the open metrics panel
+
+        self.create_widgets()
+
+        self.manager.load(QUEUE_FILE)
+        for job in self.manager.jobs.values():
+            self._refresh_job_row(job)
+        # nothing to start after a load, but the partial file sweeper starts
+        self.manager.schedule()
+        self.root.after(UI_REFRESH_MS, self.drain_ui_queue)
+        self.root.after(BANDWIDTH_CHECK_MS, self.check_bandwidth)
+        self.root.after(METRICS_MS, self.sample_metrics)
+
+    def create_widgets(self):
+        # option widgets start as they were left on the last close
+        options = load_settings().get("options") or {}
+        main_frame = ttk.Frame(self.root, padding="10")
+        main_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+
+        self.root.columnconfigure(0, weight=1)
+        self.root.rowconfigure(0, weight=1)
+        main_frame.columnconfigure(1, weight=1)
+
+        # 1. yt-dlp path
+        row = 0
+        ttk.Label(main_frame, text="yt-dlp Path:").grid(
+            row=row, column=0, sticky=tk.W, pady=5
+        )
+        self.ytdlp_path = ttk.Entry(main_frame)
+        self.ytdlp_path.grid(row=row, column=1, sticky=(tk.W, tk.E), padx=5)
+        self.auto_detect_ytdlp()
+        ttk.Button(main_frame, text="Browse...", command=self.browse_ytdlp).grid(
+            row=row, column=2, padx=5
+        )
+
+        # 2. download path
+        row += 1
+        ttk.Label(main_frame, text="Download Path:").grid(
+            row=row, column=0, sticky=tk.W, pady=5
+        )
+        self.save_path = ttk.Entry(main_frame)
+        self.save_path.grid(row=row, column=1, sticky=(tk.W, tk.E), padx=5)
+        default_download = os.path.join(
+            os.environ.get("USERPROFILE", os.environ.get("HOME", "")), "Downloads"
+        )
+        self.save_path.insert(0, options.get("save_dir") or default_download)
+        ttk.Button(main_frame, text="Browse...", command=self.browse_save_path).grid(
+            row=row, column=2, padx=5
+        )
+
+        # named presets of type, quality and format
+        row += 1
+        ttk.Label(main_frame, text="Preset:").grid(
+            row=row, column=0, sticky=tk.W, pady=5
+        )
+        self.preset_combo = ttk.Combobox(main_frame, state="readonly")
+        self.preset_combo.grid(row=row, column=1, sticky=(tk.W, tk.E), padx=5, pady=5)
+        self.preset_combo.bind("<<ComboboxSelected>>", self.on_preset_selected)
+        preset_buttons = ttk.Frame(main_frame)
+        preset_buttons.grid(row=row, column=2, padx=5)
+        ttk.Button(preset_buttons, text="Save...", command=self.save_preset).pack(
+            side=tk.LEFT
+        )
+        ttk.Button(preset_buttons, text="Delete", command=self.delete_preset).pack(
+            side=tk.LEFT, padx=(2, 0)
+        )
+        self.update_preset_options(options.get("preset", CUSTOM_PRESET))
+
+        # 3. download type
+        row += 1
+        ttk.Label(main_frame, text="Download Type:").grid(
+            row=row, column=0, sticky=tk.W, pady=5
+        )
+        self.download_type = ttk.Combobox(
+            main_frame, values=["Video", "Audio"], state="readonly"
+        )
+        self.download_type.grid(row=row, column=1, sticky=(tk.W, tk.E), padx=5, pady=5)
+        download_type = options.get("type")
+        self.download_type.set(download_type if download_type == "Audio" else "Video")
+        self.download_type.bind("<<ComboboxSelected>>", self.on_download_type_change)
+
+        # 4. quality/format
+        row += 1
+        ttk.Label(main_frame, text="Quality/Format:").grid(
+            row=row, column=0, sticky=tk.W, pady=5
+        )
+
+        # 2 dropdown lists side by side
+        quality_frame = ttk.Frame(main_frame)
+        quality_frame.grid(row=row, column=1, sticky=(tk.W, tk.E), padx=5, pady=5)
+        quality_frame.columnconfigure(0, weight=3)  # quality
+        quality_frame.columnconfigure(1, weight=1)  # format
+        quality_frame.columnconfigure(2, weight=0)  # fixed label
+
+        # quality dropdown
+        self.quality_combo = ttk.Combobox(quality_frame, state="readonly")
+        self.quality_combo.grid(row=0, column=0, sticky=(tk.W, tk.E), padx=(0, 5))
+
+        # format dropdown
+        self.format_combo = ttk.Combobox(quality_frame, width=10, state="readonly")
+        self.format_combo.grid(row=0, column=1, sticky=tk.W)
+
+        ttk.Label(quality_frame, text="(Quality | Format)").grid(
+            row=0, column=2, sticky=tk.W, padx=(5, 0)
+        )
+
+        # initialise options
+        self.update_quality_options()
+        self.update_format_options()
+        if options.get("quality") in self.quality_combo["values"]:
+            self.quality_combo.set(options["quality"])
+        if options.get("format") in self.format_combo["values"]:
+            self.format_combo.set(options["format"])
+        self.quality_combo.bind("<<ComboboxSelected>>", self.on_options_edited)
+        self.format_combo.bind("<<ComboboxSelected>>", self.on_options_edited)
+
+        # subtitles, thumbnail and info JSON, fetched by their own batch jobs
+        row += 1
+        ttk.Label(main_frame, text="Side-cars:").grid(
+            row=row, column=0, sticky=tk.W, pady=5
+        )
+        sidecar_frame = ttk.Frame(main_frame)
+        sidecar_frame.grid(row=row, column=1, sticky=tk.W, padx=5)
+        sidecars = load_settings().get("sidecars") or {}
+        labels = {
+            "subtitles": "Subtitles",
+            "thumbnail": "Thumbnail",
+            "info": "Info JSON",
+        }
+        self.sidecar_vars = {}
+        for kind in SIDECAR_OPTIONS:
+            var = tk.BooleanVar(value=kind in sidecars.get("kinds", []))
+            ttk.Checkbutton(sidecar_frame, text=labels[kind], variable=var).pack(
+                side=tk.LEFT, padx=(0, 8)
+            )
+            self.sidecar_vars[kind] = var
+        ttk.Label(sidecar_frame, text="Languages").pack(side=tk.LEFT)
+        self.sub_langs_entry = ttk.Entry(sidecar_frame, width=12)
+        self.sub_langs_entry.insert(0, sidecars.get("sub_langs") or SUB_LANGS)
+        self.sub_langs_entry.pack(side=tk.LEFT, padx=(2, 8))
+        self.skip_media = tk.BooleanVar(value=bool(sidecars.get("skip_media")))
+        ttk.Checkbutton(
+            sidecar_frame, text="Side-cars only", variable=self.skip_media
+        ).pack(side=tk.LEFT)
+        ttk.Button(
+            main_frame, text="Catalogue...", command=self.export_catalogue
+        ).grid(row=row, column=2, padx=5)
+
+        # bandwidth limits
+        row += 1
+        ttk.Label(main_frame, text="Bandwidth:").grid(
+            row=row, column=0, sticky=tk.W, pady=5
+        )
+        bandwidth_frame = ttk.Frame(main_frame)
+        bandwidth_frame.grid(row=row, column=1, sticky=(tk.W, tk.E), padx=5)
+        bandwidth_frame.columnconfigure(5, weight=1)
+        bandwidth = self.manager.bandwidth.settings
+        ttk.Label(bandwidth_frame, text="Total").grid(row=0, column=0)
+        self.global_rate_entry = ttk.Entry(bandwidth_frame, width=8)
+        self.global_rate_entry.insert(0, bandwidth["global_limit"])
+        self.global_rate_entry.grid(row=0, column=1, padx=(2, 8))
+        ttk.Label(bandwidth_frame, text="Per job").grid(row=0, column=2)
+        self.job_rate_entry = ttk.Entry(bandwidth_frame, width=8)
+        self.job_rate_entry.insert(0, bandwidth["job_limit"])
+        self.job_rate_entry.grid(row=0, column=3, padx=(2, 8))
+        ttk.Label(bandwidth_frame, text="Schedule").grid(row=0, column=4)
+        self.rate_profiles_entry = ttk.Entry(bandwidth_frame)
+        self.rate_profiles_entry.insert(0, bandwidth["profiles"])
+        self.rate_profiles_entry.grid(row=0, column=5, sticky=(tk.W, tk.E), padx=2)
+        ttk.Button(main_frame, text="Apply", command=self.apply_bandwidth).grid(
+            row=row, column=2, padx=5
+        )
+        row += 1
+        ttk.Label(
+            main_frame,
+            text="e.g. Total 4M, Per job 1M, Schedule 00:00-07:00=0 (0 = unlimited)",
+            foreground="gray",
+        ).grid(row=row, column=1, columnspan=2, sticky=tk.W, padx=5)
+
+        # automatic retries of temporary failures
+        row += 1
+        ttk.Label(main_frame, text="Auto Retry:").grid(
+            row=row, column=0, sticky=tk.W, pady=5
+        )
+        retry_frame = ttk.Frame(main_frame)
+        retry_frame.grid(row=row, column=1, sticky=tk.W, padx=5)
+        retry = self.manager.retry.settings
+        ttk.Label(retry_frame, text="Retries").pack(side=tk.LEFT)
+        self.max_retries_spin = ttk.Spinbox(retry_frame, from_=0, to=20, width=4)
+        self.max_retries_spin.set(retry["max_retries"])
+        self.max_retries_spin.pack(side=tk.LEFT, padx=(2, 8))
+        ttk.Label(retry_frame, text="First delay (s)").pack(side=tk.LEFT)
+        self.retry_delay_entry = ttk.Entry(retry_frame, width=6)
+        self.retry_delay_entry.insert(0, f"{retry['base_delay']:g}")
+        self.retry_delay_entry.pack(side=tk.LEFT, padx=(2, 8))
+        ttk.Label(retry_frame, text="Max delay (s)").pack(side=tk.LEFT)
+        self.retry_max_delay_entry = ttk.Entry(retry_frame, width=6)
+        self.retry_max_delay_entry.insert(0, f"{retry['max_delay']:g}")
+        self.retry_max_delay_entry.pack(side=tk.LEFT, padx=(2, 8))
+        ttk.Label(retry_frame, text="Jobs per site").pack(side=tk.LEFT)
+        self.host_limit_spin = ttk.Spinbox(retry_frame, from_=0, to=16, width=4)
+        self.host_limit_spin.set(retry["host_limit"])
+        self.host_limit_spin.pack(side=tk.LEFT, padx=2)
+        ttk.Button(main_frame, text="Apply", command=self.apply_retry_policy).grid(
+            row=row, column=2, padx=5
+        )
+
+        # scratch directory and free space
+        row += 1
+        ttk.Label(main_frame, text="Disk:").grid(row=row, column=0, sticky=tk.W, pady=5)
+        disk_frame = ttk.Frame(main_frame)
+        disk_frame.grid(row=row, column=1, sticky=(tk.W, tk.E), padx=5)
+        disk_frame.columnconfigure(1, weight=1)
+        disk = self.manager.disk.settings
+        ttk.Label(disk_frame, text="Scratch dir").grid(row=0, column=0)
+        self.scratch_dir_entry = ttk.Entry(disk_frame)
+        self.scratch_dir_entry.insert(0, disk["scratch_dir"])
+        self.scratch_dir_entry.grid(row=0, column=1, sticky=(tk.W, tk.E), padx=(2, 2))
+        ttk.Button(
+            disk_frame, text="...", width=3, command=self.browse_scratch_dir
+        ).grid(row=0, column=2, padx=(0, 8))
+        ttk.Label(disk_frame, text="Min free").grid(row=0, column=3)
+        self.min_free_entry = ttk.Entry(disk_frame, width=8)
+        self.min_free_entry.insert(0, disk["min_free"])
+        self.min_free_entry.grid(row=0, column=4, padx=2)
+        ttk.Button(main_frame, text="Apply", command=self.apply_disk_policy).grid(
+            row=row, column=2, padx=5
+        )
+        row += 1
+        self.disk_label = ttk.Label(main_frame, foreground="gray")
+        self.disk_label.grid(row=row, column=1, columnspan=2, sticky=tk.W, padx=5)
+        self.refresh_disk_label()
+
+        # download engine
+        row += 1
+        ttk.Label(main_frame, text="Download Engine:").grid(
+            row=row, column=0, sticky=tk.W, pady=5
+        )
+        engine_frame = ttk.Frame(main_frame)
+        engine_frame.grid(row=row, column=1, columnspan=2, sticky=tk.W, padx=5)
+        engine = dict(ENGINE_DEFAULTS, **(load_settings().get("engine") or {}))
+        ttk.Label(engine_frame, text="Fragments").pack(side=tk.LEFT)
+        self.fragments_combo = ttk.Combobox(
+            engine_frame, values=["auto", "1", "2", "4", "8", "16"], width=5
+        )
+        self.fragments_combo.set(engine["concurrent_fragments"])
+        self.fragments_combo.pack(side=tk.LEFT, padx=(2, 8))
+        ttk.Label(engine_frame, text="Chunk size").pack(side=tk.LEFT)
+        self.chunk_size_combo = ttk.Combobox(
+            engine_frame, values=["auto", "", "1M", "10M", "50M"], width=6
+        )
+        self.chunk_size_combo.set(engine["http_chunk_size"])
+        self.chunk_size_combo.pack(side=tk.LEFT, padx=(2, 8))
+        ttk.Label(engine_frame, text="Downloader").pack(side=tk.LEFT)
+        self.downloader_combo = ttk.Combobox(
+            engine_frame, values=DOWNLOADERS, width=8, state="readonly"
+        )
+        self.downloader_combo.set(engine["downloader"])
+        self.downloader_combo.pack(side=tk.LEFT, padx=(2, 8))
+        ttk.Label(engine_frame, text="Connections").pack(side=tk.LEFT)
+        self.connections_spin = ttk.Spinbox(engine_frame, from_=1, to=16, width=4)
+        self.connections_spin.set(engine["connections"])
+        self.connections_spin.pack(side=tk.LEFT, padx=(2, 8))
+        # "python" keeps yt_dlp loaded in worker processes between jobs
+        ttk.Label(engine_frame, text="Backend").pack(side=tk.LEFT)
+        self.backend_combo = ttk.Combobox(
+            engine_frame, values=BACKENDS, width=10, state="readonly"
+        )
+        self.backend_combo.set(engine["backend"])
+        self.backend_combo.pack(side=tk.LEFT, padx=2)
+
+        # URL
+        row += 1
+        ttk.Label(main_frame, text="Video URL:").grid(
+            row=row, column=0, sticky=tk.W, pady=5
+        )
+        self.url_entry = ttk.Entry(main_frame)
+        self.url_entry.grid(row=row, column=1, sticky=(tk.W, tk.E), padx=5, pady=5)
+        self.playlist_btn = ttk.Button(
+            main_frame,
+            text="Load Playlist...",
+            command=self.load_playlist,
+            state="disabled",
+        )
+        self.playlist_btn.grid(row=row, column=2, padx=5)
+        self.url_entry.insert(0, "https://www.youtube.com/watch?v=...")
+        self.url_entry.bind("<FocusOut>", self.check_url_type)
+        self.url_entry.bind("<KeyRelease>", self.check_url_type)
+        self.url_entry.bind("<<Paste>>", self.on_url_paste)
+        if tkinterdnd2 is not None and hasattr(self.root, "drop_target_register"):
+            self.root.drop_target_register(tkinterdnd2.DND_FILES, tkinterdnd2.DND_TEXT)
+            self.root.dnd_bind("<<Drop>>", self.on_drop)
+
+        self.url_type_label = ttk.Label(main_frame, text="", foreground="blue")
+        self.url_type_label.grid(
+            row=row + 1, column=1, columnspan=2, sticky=tk.W, padx=5
+        )
+
+        # 5. download button
+        row += 2
+        button_frame = ttk.Frame(main_frame)
+        button_frame.grid(row=row, column=0, columnspan=3, pady=10)
+        self.download_btn = ttk.Button(
+            button_frame,
+            text="▶ Add to Queue",
+            command=self.start_download,
+            width=20,
+        )
+        self.download_btn.pack(side=tk.LEFT)
+        ttk.Button(button_frame, text="Bulk Add...", command=self.show_bulk_add).pack(
+            side=tk.LEFT, padx=(5, 0)
+        )
+        ttk.Checkbutton(
+            button_frame,
+            text="Watch clipboard",
+            variable=self.watch_clipboard,
+            command=self.on_watch_clipboard,
+        ).pack(side=tk.LEFT, padx=(5, 0))
+        ttk.Label(button_frame, text="Parallel downloads:").pack(
+            side=tk.LEFT, padx=(20, 0)
+        )
+        self.workers_spin = ttk.Spinbox(
+            button_frame, from_=1, to=16, width=4, command=self.on_workers_change
+        )
+        self.workers_spin.set(self.manager.max_workers)
+        self.workers_spin.bind("<Return>", self.on_workers_change)
+        self.workers_spin.bind("<FocusOut>", self.on_workers_change)
+        self.workers_spin.pack(side=tk.LEFT)
+        ttk.Label(button_frame, text="Post-processing:").pack(
+            side=tk.LEFT, padx=(20, 0)
+        )
+        self.post_workers_spin = ttk.Spinbox(
+            button_frame, from_=1, to=64, width=4, command=self.on_post_workers_change
+        )
+        self.post_workers_spin.set(self.manager.post_workers)
+        self.post_workers_spin.bind("<Return>", self.on_post_workers_change)
+        self.post_workers_spin.bind("<FocusOut>", self.on_post_workers_change)
+        self.post_workers_spin.pack(side=tk.LEFT)
+
+        # 6. job queue
+        row += 1
+        queue_frame = ttk.Frame(main_frame)
+        queue_frame.grid(
+            row=row, column=0, columnspan=3, sticky=(tk.W, tk.E, tk.N, tk.S), padx=5
+        )
+        queue_frame.columnconfigure(0, weight=1)
+        self.queue_tree = ttk.Treeview(
+            queue_frame,
+            columns=("id", "status", "progress", "speed", "url", "file"),
+            show="headings",
+            height=6,
+        )
+        self.queue_tree.heading("id", text="#")
+        self.queue_tree.heading("status", text="Status")
+        self.queue_tree.heading("progress", text="Progress")
+        self.queue_tree.heading("speed", text="Speed")
+        self.queue_tree.heading("url", text="URL")
+        self.queue_tree.heading("file", text="File")
+        self.queue_tree.column("id", width=40, stretch=False, anchor=tk.E)
+        self.queue_tree.column("status", width=130, stretch=False)
+        self.queue_tree.column("progress", width=80, stretch=False, anchor=tk.E)
+        self.queue_tree.column("speed", width=110, stretch=False, anchor=tk.E)
+        self.queue_tree.column("url", width=300)
+        self.queue_tree.column("file", width=250)
+        self.queue_tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        self.queue_tree.bind("<<TreeviewSelect>>", self.on_job_select)
+        queue_scroll = ttk.Scrollbar(
+            queue_frame, orient=tk.VERTICAL, command=self.queue_tree.yview
+        )
+        queue_scroll.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        self.queue_tree.configure(yscrollcommand=queue_scroll.set)
+
+        self.aggregate_label = ttk.Label(queue_frame, text="", foreground="gray")
+        self.aggregate_label.grid(row=1, column=0, sticky=tk.W)
+        queue_buttons = ttk.Frame(queue_frame)
+        queue_buttons.grid(row=1, column=0, columnspan=2, sticky=tk.E, pady=5)
+        ttk.Button(
+            queue_buttons, text="⏸ Pause", command=self.pause_selected
+        ).pack(side=tk.LEFT, padx=2)
+        ttk.Button(
+            queue_buttons, text="▶ Resume", command=self.resume_selected
+        ).pack(side=tk.LEFT, padx=2)
+        ttk.Button(
+            queue_buttons, text="⏹ Stop Selected", command=self.stop_download
+        ).pack(side=tk.LEFT, padx=2)
+        ttk.Button(
+            queue_buttons, text="⏹ Stop All", command=self.stop_all_downloads
+        ).pack(side=tk.LEFT, padx=2)
+        ttk.Button(
+            queue_buttons, text="↻ Retry Selected", command=self.retry_selected
+        ).pack(side=tk.LEFT, padx=2)
+        ttk.Button(
+            queue_buttons, text="Remove Finished", command=self.remove_finished
+        ).pack(side=tk.LEFT, padx=2)
+        ttk.Button(queue_buttons, text="History...", command=self.show_history).pack(
+            side=tk.LEFT, padx=2
+        )
+        ttk.Button(queue_buttons, text="Metrics...", command=self.show_metrics).pack(
+            side=tk.LEFT, padx=2
+        )
+
+        # progress bar
+        row += 1
+        self.progress_var = tk.DoubleVar(value=0)
+        self.progress_bar = ttk.Progressbar(
+            main_frame,
+            variable=self.progress_var,
+            maximum=100,
+            mode="determinate",
+            length=400,
+        )
+        self.progress_bar.grid(
+            row=row, column=0, columnspan=3, sticky=(tk.W, tk.E), padx=5, pady=5
+        )
+        self.progress_label = ttk.Label(main_frame, text="Ready", foreground="gray")
+        self.progress_label.grid(row=row + 1, column=0, columnspan=3, pady=2)
+
+        # log detail
+        row += 2
+        ttk.Label(main_frame, text="Download Log:").grid(
+            row=row, column=0, sticky=tk.W, pady=5
+        )
+        self.log_text = scrolledtext.ScrolledText(
+            main_frame,
+            wrap=tk.WORD,
+            height=12,
+            font=("Consolas", 10),
+            bg="#f5f5f5",
+            fg="#333333",
+        )
+        self.log_text.grid(
+            row=row + 1,
+            column=0,
+            columnspan=3,
+            sticky=(tk.W, tk.E, tk.N, tk.S),
+            padx=5,
+            pady=5,
+        )
+        main_frame.rowconfigure(row + 1, weight=1)
+        log_tools = ttk.Frame(main_frame)
+        log_tools.grid(row=row, column=1, columnspan=2, sticky=tk.E, pady=5)
+        ttk.Label(log_tools, text="Filter:").pack(side=tk.LEFT)
+        self.log_filter_entry = ttk.Entry(log_tools, width=25)
+        self.log_filter_entry.pack(side=tk.LEFT, padx=2)
+        self.log_filter_entry.bind("<Return>", self.filter_log)
+        ttk.Button(log_tools, text="Search", command=self.filter_log).pack(
+            side=tk.LEFT, padx=2
+        )
+        ttk.Button(log_tools, text="Open Full Log", command=self.open_full_log).pack(
+            side=tk.LEFT, padx=2
+        )
+        ttk.Button(log_tools, text="Clear Log", command=self.clear_log).pack(
+            side=tk.LEFT, padx=2
+        )
+
+    def check_url_type(self, event=None):
+        url = self.url_entry.get().strip()
+        if self.prefetch_after is not None:
+            self.root.after_cancel(self.prefetch_after)
+            self.prefetch_after = None
+        if self.current_info is not None and self.current_info.get("_url") != url:
+            self.set_current_info(None)
+        if not url or "..." in url:
+            self.url_type_label.config(text="")
+            self.playlist_btn.config(state="disabled")
+            return
+        if self.current_info is not None:
+            return
+        self.prefetch_after = self.root.after(PREFETCH_DELAY_MS, self.prefetch_info)
+        if is_channel_url(url):
+            self.url_type_label.config(
+                text="⚠️ Detected channel, use Load Playlist to pick its videos",
+                foreground="orange",
+            )
+            self.playlist_btn.config(state="normal")
+        elif self.is_playlist_url(url):
+            self.url_type_label.config(
+                text="⚠️ Detected playlist, will only download current video "
+                "(use Load Playlist to pick entries)",
+                foreground="orange",
+            )
+            self.playlist_btn.config(state="normal")
+        else:
+            self.url_type_label.config(text="✓ Single video link", foreground="green")
+            self.playlist_btn.config(state="disabled")
+
+    def prefetch_info(self):
+        """fetch the formats of the entered URL in the background"""
+        self.prefetch_after = None
+        url = self.url_entry.get().strip()
+        ytdlp = self.ytdlp_path.get().strip()
+        if not url.startswith("http") or self.is_playlist_url(url) or not ytdlp:
+            return
+        info = self.info_cache.get(url)
+        if info is not None:
+            self.show_info(url, info)
+            return
+        if url in self.prefetching:
+            return
+        self.prefetching.add(url)
+        self.url_type_label.config(text="Fetching available formats...")
+        thread = threading.Thread(target=self.prefetch_worker, args=(ytdlp, url))
+        thread.daemon = True
+        thread.start()
+
+    def prefetch_worker(self, ytdlp, url):
+        try:
+            info = fetch_info(ytdlp, url)
+            error = None
+        except Exception as e:
+            info, error = None, str(e)
+        self.root.after(0, lambda: self._info_fetched(url, info, error))
+
+    def _info_fetched(self, url, info, error):
+        self.prefetching.discard(url)
+        if info is not None:
+            self.info_cache.put(url, info)
+        if url != self.url_entry.get().strip():
+            return
+        if info is not None:
+            self.show_info(url, info)
+        else:
+            self.url_type_label.config(
+                text=f"✓ Single video link (formats unavailable: {error})",
+                foreground="orange",
+            )
+
+    def show_info(self, url, info):
+        info["_url"] = url
+        self.set_current_info(info)
+        text = f"✓ {info.get('title') or 'Single video link'}"
+        if info.get("duration"):
+            text += f" ({format_eta(info['duration'])})"
+        self.url_type_label.config(text=text, foreground="green")
+
+    def set_current_info(self, info):
+        self.current_info = info
+        self.update_quality_options()
+        self.update_format_options()
+
+    def is_playlist_url(self, url):
+        return is_playlist_url(url)
+
+    def auto_detect_ytdlp(self):
+        """use the cached yt-dlp path, otherwise detect it in the background"""
+        cache = cached_ytdlp()
+        if cache:
+            self.ytdlp_path.insert(0, cache["path"])
+            self.set_ytdlp_version(cache.get("version"))
+            return
+        thread = threading.Thread(target=self.detect_ytdlp)
+        thread.daemon = True
+        thread.start()
+
+    def detect_ytdlp(self, path=None):
+        """find and probe yt-dlp, cache the result (worker thread)"""
+        path = path or find_ytdlp()
+        info = probe_ytdlp(path) if path else None
+        if info:
+            try:
+                update_settings(
+                    ytdlp={"path": path, "version": info[0], "mtime": info[1]}
+                )
+            except OSError:
+                pass
+        self.root.after(0, lambda: self._ytdlp_detected(path, info))
+
+    def _ytdlp_detected(self, path, info):
+        # the user may have typed or browsed a path in the meantime
+        if not self.ytdlp_path.get().strip():
+            self.ytdlp_path.insert(0, path or "yt-dlp.exe")
+        self.set_ytdlp_version(info[0] if info else None)
+
+    def set_ytdlp_version(self, version):
+        if version:
+            self.root.title(f"yt-dlp GUI (yt-dlp {version})")
+        else:
+            self.root.title("yt-dlp GUI")
+
+    def browse_ytdlp(self):
+        script_dir = os.path.dirname(os.path.abspath(__file__))
+        filename = filedialog.askopenfilename(
+            title="Choose yt-dlp executable",
+            initialdir=script_dir,
+            filetypes=[("Executable", "*.exe"), ("All Files", "*.*")],
+        )
+        if filename:
+            self.ytdlp_path.delete(0, tk.END)
+            self.ytdlp_path.insert(0, filename)
+            thread = threading.Thread(target=self.detect_ytdlp, args=(filename,))
+            thread.daemon = True
+            thread.start()
+
+    def browse_save_path(self):
+        directory = filedialog.askdirectory(title="Choose download path")
+        if directory:
+            self.save_path.delete(0, tk.END)
+            self.save_path.insert(0, directory)
+
+    def on_download_type_change(self, event=None):
+        """update quality and format options when download type changes"""
+        self.update_quality_options()
+        self.update_format_options()
+        self.on_options_edited()
+
+    def update_preset_options(self, selected=None):
+        names = [CUSTOM_PRESET, AUTO_PRESET] + self.presets.names()
+        self.preset_combo["values"] = names
+        selected = selected or self.preset_combo.get()
+        self.preset_combo.set(selected if selected in names else CUSTOM_PRESET)
+
+    def on_preset_selected(self, event=None):
+        """show the options of a named preset in the option widgets"""
+        preset = self.presets.get(self.preset_combo.get())
+        if preset is None:
+            return
+        self.download_type.set(preset.download_type)
+        self.update_quality_options()
+        self.update_format_options()
+        self.quality_combo.set(preset.quality)
+        self.format_combo.set(preset.output_format)
+
+    def on_options_edited(self, event=None):
+        # changed options no longer match the named preset
+        if self.presets.get(self.preset_combo.get()) is not None:
+            self.preset_combo.set(CUSTOM_PRESET)
+
+    def widget_preset(self):
+        """the option widgets as a preset, compiled again only after a change"""
+        quality = self.quality_combo.get()
+        values = (
+            self.download_type.get(),
+            quality,
+            self.format_combo.get(),
+            self.dynamic_qualities.get(quality),
+        )
+        if self.compiled_options is None or self.compiled_options[0] != values:
+            preset = DownloadPreset(
+                CUSTOM_PRESET,
+                values[0],
+                quality,
+                values[2],
+                quality_choices=self.dynamic_qualities,
+            )
+            self.compiled_options = (values, preset)
+        return self.compiled_options[1]
+
+    def preset_for(self, url):
+        """compiled preset of a download, by site in the auto mode"""
+        name = self.preset_combo.get()
+        if name == AUTO_PRESET:
+            preset = self.presets.for_url(url)
+        else:
+            preset = self.presets.get(name)
+        return preset or self.widget_preset()
+
+    def save_preset(self):
+        """save the option widgets as a named preset"""
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Save Preset")
+        dialog.transient(self.root)
+        dialog.columnconfigure(1, weight=1)
+        ttk.Label(dialog, text="Name:").grid(row=0, column=0, sticky=tk.W, padx=5)
+        name_entry = ttk.Entry(dialog, width=30)
+        name_entry.grid(row=0, column=1, sticky=(tk.W, tk.E), padx=5, pady=5)
+        ttk.Label(dialog, text="Sites:").grid(row=1, column=0, sticky=tk.W, padx=5)
+        sites_entry = ttk.Entry(dialog, width=30)
+        sites_entry.grid(row=1, column=1, sticky=(tk.W, tk.E), padx=5, pady=5)
+        preset = self.presets.get(self.preset_combo.get())
+        if preset is not None:
+            name_entry.insert(0, preset.name)
+            sites_entry.insert(0, ", ".join(preset.sites))
+        ttk.Label(
+            dialog,
+            text=f'e.g. youtube, vimeo.com - picked for these sites by "{AUTO_PRESET}"',
+            foreground="gray",
+        ).grid(row=2, column=1, sticky=tk.W, padx=5)
+
+        def save():
+            name = name_entry.get().strip()
+            if not name or name in (CUSTOM_PRESET, AUTO_PRESET):
+                messagebox.showerror(
+                    "Error", "Please enter a preset name!", parent=dialog
+                )
+                return
+            try:
+                preset = DownloadPreset(
+                    name,
+                    self.download_type.get(),
+                    self.quality_combo.get(),
+                    self.format_combo.get(),
+                    sites_entry.get().split(","),
+                )
+            except ValueError as e:
+                # qualities of the fetched formats only apply to one video
+                messagebox.showerror("Error", f"Invalid preset: {e}", parent=dialog)
+                return
+            self.presets.add(preset)
+            self.update_preset_options(name)
+            try:
+                update_settings(presets=self.presets.user)
+            except OSError:
+                pass
+            dialog.destroy()
+
+        button_frame = ttk.Frame(dialog)
+        button_frame.grid(row=3, column=0, columnspan=2, pady=5)
+        ttk.Button(button_frame, text="Save", command=save).pack(side=tk.LEFT, padx=5)
+        ttk.Button(button_frame, text="Cancel", command=dialog.destroy).pack(
+            side=tk.LEFT, padx=5
+        )
+        name_entry.focus_set()
+
+    def delete_preset(self):
+        name = self.preset_combo.get()
+        if name not in self.presets.user:
+            messagebox.showinfo("Presets", "Only saved presets can be deleted.")
+            return
+        if not messagebox.askyesno("Presets", f'Delete the preset "{name}"?'):
+            return
+        self.presets.remove(name)
+        self.update_preset_options(CUSTOM_PRESET)
+        try:
+            update_settings(presets=self.presets.user)
+        except OSError:
+            pass
+
+    def sidecar_settings(self):
+        return {
+            "kinds": [kind for kind, var in self.sidecar_vars.items() if var.get()],
+            "sub_langs": self.sub_langs_entry.get().strip(),
+            "skip_media": self.skip_media.get(),
+        }
+
+    def enqueue_sidecars(self, urls, save_dir, batch="", keys=None):
+        """queue side-car jobs for urls, ahead of their media jobs
+
+        keys maps urls to archive keys that are known already.
+        """
+        settings = self.sidecar_settings()
+        if not settings["kinds"]:
+            return []
+        jobs = self.manager.add_sidecars(
+            self.ytdlp_path.get().strip(),
+            urls,
+            save_dir,
+            settings["kinds"],
+            settings["sub_langs"],
+            batch,
+            start=False,
+            keys=keys,
+        )
+        for job in jobs:
+            self._refresh_job_row(job)
+        return jobs
+
+    def export_catalogue(self):
+        """save the metadata of all videos with side-cars as CSV"""
+        rows = self.sidecars.catalogue()
+        if not rows:
+            messagebox.showinfo(
+                "Catalogue",
+                "No side-cars fetched yet. Tick Info JSON (or another side-car) "
+                "and queue some videos first.",
+            )
+            return
+        path = filedialog.asksaveasfilename(
+            title="Export catalogue",
+            defaultextension=".csv",
+            initialfile="catalogue.csv",
+            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")],
+        )
+        if not path:
+            return
+        try:
+            write_catalogue(path, rows)
+        except OSError as e:
+            messagebox.showerror("Error", f"Could not write the catalogue: {e}")
+
+    def option_settings(self):
+        return {
+            "save_dir": self.save_path.get().strip(),
+            "preset": self.preset_combo.get(),
+            "type": self.download_type.get(),
+            "quality": self.quality_combo.get(),
+            "format": self.format_combo.get(),
+        }
+
+    def update_quality_options(self):
+        """update quality dropdown based on download type"""
+        download_type = self.download_type.get()
+
+        if download_type == "Video":
+            qualities = list(VIDEO_QUALITIES)
+        else:  # Audio
+            qualities = list(AUDIO_QUALITIES)
+
+        self.dynamic_qualities = format_choices(self.current_info, download_type)
+        qualities += list(self.dynamic_qualities)
+
+        previous = self.quality_combo.get()
+        self.quality_combo["values"] = qualities
+        self.quality_combo.set(previous if previous in qualities else qualities[0])
+
+    def update_format_options(self):
+        """update format dropdown based on download type"""
+        download_type = self.download_type.get()
+
+        if download_type == "Video":
+            # video format, default mp4
+            formats = VIDEO_FORMATS
+            self.format_combo["values"] = formats
+            # prefer the container of the best format to avoid a remux
+            best_ext = (self.current_info or {}).get("ext")
+            self.format_combo.set(best_ext if best_ext in formats else "mp4")
+        else:
+            # audio format, default mp3
+            formats = AUDIO_FORMATS
+            self.format_combo["values"] = formats
+            self.format_combo.set("mp3")
+
+    def get_quality_option(self):
+        """get quality parameter for yt-dlp based on selection"""
+        return quality_option(
+            self.download_type.get(), self.quality_combo.get(), self.dynamic_qualities
+        )
+
+    def get_format_option(self):
+        """get output format parameter"""
+        return format_option(self.download_type.get(), self.format_combo.get())
+
+    def on_manager_event(self, kind, job, payload):
+        """called from the manager's event loop, picked up by drain_ui_queue"""
+        self.ui_queue.put((kind, job))
+
+    def drain_ui_queue(self):
+        """apply all pending worker events in one batch
+
+        Only the latest state of each job is drawn and new log lines of the
+        selected job are appended with a single insert, so a flood of output
+        lines costs one widget update per refresh interval.
+        """
+        changed = {}
+        new_log = False
+        status_changed = False
+        try:
+            while True:
+                kind, job = self.ui_queue.get_nowait()
+                if kind == "log":
+                    new_log = new_log or job.id == self.selected_job_id
+                    continue
+                changed[job.id] = job
+                status_changed = status_changed or kind == "status"
+        except queue.Empty:
+            pass
+
+        if new_log:
+            self._append_new_log_lines()
+        for job in changed.values():
+            self._refresh_job_row(job)
+            if job.id == self.selected_job_id:
+                self._show_job_progress(job)
+        if changed:
+            self._refresh_aggregate()
+        if status_changed:
+            self.save_queue()
+        self.root.after(UI_REFRESH_MS, self.drain_ui_queue)
+
+    def _append_new_log_lines(self):
+        job = self.manager.jobs.get(self.selected_job_id)
+        if job is None or self.log_filter:
+            return
+        lines, self.log_shown = job.new_log_lines(self.log_shown)
+        if not lines:
+            return
+        self.log_text.insert(tk.END, "\n".join(lines) + "\n")
+        self._trim_log_view()
+        self.log_text.see(tk.END)
+
+    def _trim_log_view(self):
+        """keep only the last LOG_VIEW_LINES lines in the widget"""
+        line_count = int(self.log_text.index("end-1c").split(".")[0])
+        excess = line_count - LOG_VIEW_LINES
+        if excess > 0:
+            self.log_text.delete("1.0", f"{excess + 1}.0")
+
+    def get_selected_job(self):
+        job = self.manager.jobs.get(self.selected_job_id)
+        if job is None:
+            messagebox.showinfo("Log", "Please select a job in the queue first.")
+        return job
+
+    def open_full_log(self):
+        job = self.get_selected_job()
+        if job is None:
+            return
+        job.flush_log()
+        if not os.path.exists(job.log_path):
+            messagebox.showinfo("Log", "This job has no log file yet.")
+            return
+        try:
+            open_with_system(job.log_path)
+        except Exception as e:
+            messagebox.showerror("Error", f"Cannot open log file: {e}")
+
+    def filter_log(self, event=None):
+        """show the lines of the full on-disk log containing the filter text"""
+        job = self.get_selected_job()
+        if job is None:
+            return
+        text = self.log_filter_entry.get().strip()
+        if not text:
+            self.log_filter = ""
+            self.show_job(job)
+            return
+        self.log_filter = text
+        job.flush_log()
+        thread = threading.Thread(target=self.search_log_files, args=(job, text))
+        thread.daemon = True
+        thread.start()
+
+    def search_log_files(self, job, text):
+        """scan the log files line by line (worker thread)"""
+        needle = text.lower()
+        matches = collections.deque(maxlen=LOG_VIEW_LINES)
+        total = 0
+        for path in job.log_files():
+            try:
+                with open(path, "r", encoding="utf-8", errors="replace") as f:
+                    for line in f:
+                        if needle in line.lower():
+                            matches.append(line.rstrip("\n"))
+                            total += 1
+            except OSError:
+                continue
+        self.root.after(0, lambda: self._show_log_matches(job, text, matches, total))
+
+    def _show_log_matches(self, job, text, matches, total):
+        if job.id != self.selected_job_id or text != self.log_filter:
+            return
+        self.log_text.delete(1.0, tk.END)
+        summary = f"--- {total} line(s) matching '{text}'"
+        if total > len(matches):
+            summary += f", showing the last {len(matches)}"
+        summary += " (clear the filter to follow the live log) ---"
+        self.log_text.insert(tk.END, summary + "\n")
+        if matches:
+            self.log_text.insert(tk.END, "\n".join(matches) + "\n")
+        self.log_text.see(tk.END)
+
+    def _show_job_progress(self, job):
+        self._set_progress(job.progress, job.status_text)
+        if job.status == "stopped":
+            self.progress_label.config(text="Stopped", foreground="red")
+        elif job.status == "paused":
+            self.progress_label.config(text=job.status_text, foreground="orange")
+        elif job.status == "failed":
+            self.progress_label.config(text=job.status_text, foreground="red")
+
+    def _set_progress(self, percent, status_text):
+        self.progress_var.set(percent)
+        if status_text:
+            self.progress_label.config(text=status_text, foreground="#2196F3")
+        if percent >= 100:
+            self.progress_label.config(text="Download Complete!", foreground="green")
+
+    def _refresh_job_row(self, job):
+        status = job.status
+        if status == "failed" and job.failure_category:
+            status = f"failed ({job.failure_category})"
+        values = (
+            job.id,
+            status,
+            f"{job.progress:.1f}%",
+            f"{format_size(job.speed)}/s" if job.speed else "",
+            job.url if job.kind == "media" else f"[side-cars] {len(job.urls)} URL(s)",
+            os.path.basename(job.output_path or ""),
+        )
+        iid = str(job.id)
+        if self.queue_tree.exists(iid):
+            self.queue_tree.item(iid, values=values)
+        else:
+            self.queue_tree.insert("", tk.END, iid=iid, values=values)
+
+    def _refresh_aggregate(self):
+        running, pending, speed, eta = self.manager.aggregate_stats()
+        converting, waiting = self.manager.postprocess_stats()
+        if not running and not pending and not converting and not waiting:
+            self.aggregate_label.config(text="")
+            return
+        text = (
+            f"Running: {running} | Pending: {pending} | "
+            f"Speed: {format_size(speed)}/s | ETA: {format_eta(eta)}"
+        )
+        if converting or waiting:
+            text += f" | Post-processing: {converting} (+{waiting} waiting)"
+        if self.manager.bandwidth.is_limited():
+            share = self.manager.bandwidth.share(max(1, running))
+            text += f" | Limit per job: {format_rate(share)}"
+        self.aggregate_label.config(text=text)
+
+    def apply_bandwidth(self):
+        try:
+            policy = BandwidthPolicy(
+                self.global_rate_entry.get().strip(),
+                self.job_rate_entry.get().strip(),
+                self.rate_profiles_entry.get().strip(),
+            )
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        try:
+            update_settings(bandwidth=policy.settings)
+        except OSError:
+            pass
+        # restarting jobs waits for their processes, keep the UI responsive
+        thread = threading.Thread(target=self.manager.set_bandwidth, args=(policy,))
+        thread.daemon = True
+        thread.start()
+        self._refresh_aggregate()
+
+    def apply_retry_policy(self):
+        settings = dict(self.manager.retry.settings)
+        settings.update(
+            max_retries=self.max_retries_spin.get().strip(),
+            base_delay=self.retry_delay_entry.get().strip(),
+            max_delay=self.retry_max_delay_entry.get().strip(),
+            host_limit=self.host_limit_spin.get().strip(),
+        )
+        try:
+            policy = RetryPolicy(**settings)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        try:
+            update_settings(retry=policy.settings)
+        except OSError:
+            pass
+        self.manager.set_retry_policy(policy)
+
+    def apply_disk_policy(self):
+        settings = dict(self.manager.disk.settings)
+        settings.update(
+            scratch_dir=self.scratch_dir_entry.get().strip(),
+            min_free=self.min_free_entry.get().strip(),
+        )
+        try:
+            policy = DiskPolicy(**settings)
+            policy.check_save_dir(self.save_path.get().strip())
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        try:
+            update_settings(disk=policy.settings)
+        except OSError:
+            pass
+        self.manager.set_disk_policy(policy)
+        self.refresh_disk_label()
+
+    def browse_scratch_dir(self):
+        directory = filedialog.askdirectory(title="Choose scratch directory")
+        if directory:
+            self.scratch_dir_entry.delete(0, tk.END)
+            self.scratch_dir_entry.insert(0, directory)
+
+    def refresh_disk_label(self):
+        """free space of the directories downloads are written to"""
+        disk = self.manager.disk
+        save_dir = self.save_path.get().strip()
+        text = "e.g. Min free 1G, empty Scratch dir = download dir"
+        if save_dir:
+            text += f"; free: {format_size(free_space(save_dir))} downloads"
+        if disk.scratch_dir:
+            text += f", {format_size(free_space(disk.scratch_dir))} scratch"
+        files, size = self.manager.swept
+        if files:
+            text += f"; removed {files} leftover file(s), {format_size(size)}"
+        self.disk_label.config(text=text)
+
+    def check_bandwidth(self):
+        """follow time-of-day profiles and shares of long running jobs"""
+        if self.manager.bandwidth.is_limited():
+            self.manager.rebalance()
+        self.refresh_disk_label()
+        self.root.after(BANDWIDTH_CHECK_MS, self.check_bandwidth)
+
+    def on_job_select(self, event=None):
+        selection = self.queue_tree.selection()
+        if not selection:
+            return
+        job = self.manager.jobs.get(int(selection[0]))
+        if job is None or job.id == self.selected_job_id:
+            return
+        self.show_job(job)
+
+    def show_job(self, job):
+        """show log buffer and progress of the given job"""
+        self.selected_job_id = job.id
+        self.log_filter = ""
+        self.log_filter_entry.delete(0, tk.END)
+        self.log_text.delete(1.0, tk.END)
+        job.load_log_tail()
+        self.log_shown = 0
+        self._append_new_log_lines()
+        self.progress_label.config(text=job.status_text, foreground="gray")
+        self._show_job_progress(job)
+
+    def get_selected_job_ids(self):
+        return [int(iid) for iid in self.queue_tree.selection()]
+
+    def on_workers_change(self, event=None):
+        try:
+            count = int(self.workers_spin.get())
+        except ValueError:
+            count = self.manager.max_workers
+        count = max(1, min(16, count))
+        self.workers_spin.set(count)
+        self.manager.set_max_workers(count)
+
+    def on_post_workers_change(self, event=None):
+        try:
+            count = int(self.post_workers_spin.get())
+        except ValueError:
+            count = self.manager.post_workers
+        count = max(1, min(64, count))
+        self.post_workers_spin.set(count)
+        self.manager.set_post_workers(count)
+
+    def engine_settings(self):
+        return {
+            "concurrent_fragments": self.fragments_combo.get().strip() or "auto",
+            "http_chunk_size": self.chunk_size_combo.get().strip(),
+            "downloader": self.downloader_combo.get(),
+            "connections": self.connections_spin.get().strip() or 8,
+            "backend": self.backend_combo.get(),
+        }
+
+    def validate_paths(self):
+        """return (ytdlp, save_dir) or None after reporting the problem"""
+        ytdlp = self.ytdlp_path.get().strip()
+        save_dir = self.save_path.get().strip()
+        if not ytdlp:
+            messagebox.showerror("Error", "Please specify the yt-dlp path!")
+            return None
+        if not save_dir:
+            messagebox.showerror("Error", "Please specify the save path!")
+            return None
+        try:
+            resolve_engine(self.engine_settings(), "")
+        except ValueError as e:
+            messagebox.showerror("Error", f"Invalid download engine setting: {e}")
+            return None
+        try:
+            self.manager.disk.check_save_dir(save_dir)
+        except ValueError as e:
+            messagebox.showerror("Error", f"Invalid scratch directory: {e}")
+            return None
+        os.makedirs(save_dir, exist_ok=True)
+        os.makedirs(APP_DIR, exist_ok=True)
+        return ytdlp, save_dir
+
+    def archive_key_for(self, url):
+        info = self.info_cache.get(url)
+        if info is not None:
+            return archive_key(info.get("extractor_key"), info.get("id"))
+        return archive_key_from_url(url)
+
+    def enqueue(self, url, save_dir, batch="", key=None, force=False, start=True):
+        engine = resolve_engine(self.engine_settings(), url)
+        preset = self.preset_for(url)
+        quality = preset.quality
+        output_format = preset.output_format
+        plan = preset.plan
+        scratch_dir = self.manager.disk.scratch_dir or None
+        cmd = preset.command(
+            self.ytdlp_path.get().strip(),
+            url,
+            save_dir,
+            use_archive=not force,
+            engine=engine,
+            scratch_dir=scratch_dir,
+        )
+        header = [
+            "=" * 60,
+            "Start download...",
+            f"Preset: {preset.name}",
+            f"Quality: {quality}",
+            f"Format: {output_format}",
+            f"Engine: {describe_engine(engine)}",
+            f"Post-processing: {'ffmpeg pool' if plan else 'by yt-dlp'}",
+            f"Command: {' '.join(cmd)}",
+            "=" * 60,
+        ]
+        # prefetched sizes are of yt-dlp's default formats, others are probed
+        info = self.info_cache.get(url)
+        if plan or any(arg in FORMAT_SELECTION_OPTIONS for arg in preset.args):
+            info = None
+        job = self.manager.add_job(
+            url,
+            cmd,
+            save_dir,
+            quality,
+            output_format,
+            batch,
+            header,
+            key,
+            force,
+            engine,
+            plan,
+            start,
+            expected_size(info, preset.download_type),
+            scratch_dir,
+        )
+        self._refresh_job_row(job)
+        return job
+
+    def start_download(self):
+        url = self.url_entry.get().strip()
+        paths = self.validate_paths()
+        if paths is None:
+            return
+        if not url or "..." in url or not url.startswith("http"):
+            messagebox.showerror("Error", "Please enter a valid video URL!")
+            return
+        # a channel is no single video, pick its videos instead
+        if is_channel_url(url):
+            self.load_playlist()
+            return
+
+        key = self.archive_key_for(url)
+        force = False
+        if key in self.archive and not self.skip_media.get():
+            if not messagebox.askyesno(
+                "Already downloaded",
+                "This video is already in the download archive.\n"
+                "Download it again?",
+            ):
+                return
+            force = True
+
+        sidecar_jobs = self.enqueue_sidecars([url], paths[1], keys={url: key})
+        if self.skip_media.get():
+            self.manager.schedule()
+            if not sidecar_jobs:
+                messagebox.showinfo(
+                    "Side-cars",
+                    "Nothing to fetch: choose side-cars, or they are already saved.",
+                )
+                return
+            job = sidecar_jobs[0]
+        else:
+            job = self.enqueue(url, paths[1], key=key, force=force)
+        self.queue_tree.selection_set(str(job.id))
+        self.queue_tree.see(str(job.id))
+        self.show_job(job)
+        self._refresh_aggregate()
+        self.save_queue()
+
+    def known_urls(self):
+        """archive keys and canonical URLs not to be queued again"""
+        known = self.manager.queued()
+        if self.history is not None:
+            try:
+                known |= self.history.downloaded()
+            except sqlite3.Error:
+                pass
+        return known
+
+    def ingest_text(self, text, save_dir):
+        """queue every new URL found in text, return a summary"""
+        urls, duplicates = ingest_urls(text, self.known_urls())
+        archived = 0
+        sidecars = self.enqueue_sidecars(
+            [url for url, _ in urls], save_dir, keys=dict(urls)
+        )
+        added = []
+        for url, key in urls:
+            if self.skip_media.get():
+                continue
+            if key in self.archive:
+                archived += 1
+                continue
+            added.append(self.enqueue(url, save_dir, key=key, start=False))
+        self.manager.schedule()
+        self._refresh_aggregate()
+        if added or sidecars:
+            self.save_queue()
+        summary = f"Added {len(added)} URL(s)"
+        if sidecars:
+            summary += f", {len(sidecars)} side-car job(s)"
+        if duplicates:
+            summary += f", skipped {duplicates} duplicate(s)"
+        if archived:
+            summary += f", {archived} already downloaded"
+        return summary
+
+    def on_url_paste(self, event=None):
+        """paste with several URLs goes straight to the queue"""
+        try:
+            text = self.root.clipboard_get()
+        except tk.TclError:
+            return None
+        if len(URL_RE.findall(text)) < 2:
+            return None
+        paths = self.validate_paths()
+        if paths is not None:
+            summary = self.ingest_text(text, paths[1])
+            self.url_type_label.config(text=summary, foreground="green")
+        return "break"
+
+    def on_drop(self, event):
+        """text or .txt files dropped on the window (needs tkinterdnd2)"""
+        paths = self.validate_paths()
+        if paths is None:
+            return
+        texts = []
+        for item in self.root.tk.splitlist(event.data):
+            if os.path.isfile(item):
+                try:
+                    with open(item, "r", encoding="utf-8", errors="replace") as f:
+                        texts.append(f.read())
+                except OSError as e:
+                    messagebox.showerror("Error", f"Cannot read {item}: {e}")
+            else:
+                texts.append(item)
+        summary = self.ingest_text("\n".join(texts), paths[1])
+        self.url_type_label.config(text=summary, foreground="green")
+
+    def on_watch_clipboard(self):
+        if self.watch_clipboard.get():
+            # only URLs copied from now on
+            try:
+                self.last_clipboard = self.root.clipboard_get()
+            except tk.TclError:
+                self.last_clipboard = None
+            self.root.after(CLIPBOARD_POLL_MS, self.poll_clipboard)
+
+    def poll_clipboard(self):
+        if not self.watch_clipboard.get():
+            return
+        try:
+            text = self.root.clipboard_get()
+        except tk.TclError:
+            text = None
+        if text and text != self.last_clipboard and URL_RE.search(text):
+            paths = self.validate_paths()
+            if paths is not None:
+                summary = self.ingest_text(text, paths[1])
+                self.url_type_label.config(
+                    text=f"Clipboard: {summary}", foreground="green"
+                )
+        self.last_clipboard = text
+        self.root.after(CLIPBOARD_POLL_MS, self.poll_clipboard)
+
+    def show_bulk_add(self):
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Bulk Add URLs")
+        dialog.geometry("700x450")
+        dialog.transient(self.root)
+        dialog.columnconfigure(0, weight=1)
+        dialog.rowconfigure(1, weight=1)
+
+        ttk.Label(
+            dialog,
+            text="Paste text with one or more URLs, duplicates and already "
+            "downloaded videos are skipped:",
+        ).grid(row=0, column=0, sticky=tk.W, padx=5, pady=5)
+        text = scrolledtext.ScrolledText(dialog, wrap=tk.NONE)
+        text.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), padx=5)
+        result_label = ttk.Label(dialog, text="", foreground="gray")
+        result_label.grid(row=2, column=0, sticky=tk.W, padx=5)
+
+        def load_file():
+            path = filedialog.askopenfilename(
+                parent=dialog,
+                title="Select URL list",
+                filetypes=[("Text files", "*.txt"), ("All files", "*.*")],
+            )
+            if not path:
+                return
+            try:
+                with open(path, "r", encoding="utf-8", errors="replace") as f:
+                    text.insert(tk.END, f.read())
+            except OSError as e:
+                messagebox.showerror("Error", str(e), parent=dialog)
+
+        def add():
+            paths = self.validate_paths()
+            if paths is None:
+                return
+            content = text.get(1.0, tk.END)
+            found = len(URL_RE.findall(content))
+            summary = self.ingest_text(content, paths[1])
+            result_label.config(text=f"{found} URL(s) found. {summary}")
+            text.delete(1.0, tk.END)
+
+        button_frame = ttk.Frame(dialog)
+        button_frame.grid(row=3, column=0, pady=5)
+        ttk.Button(button_frame, text="Load File...", command=load_file).pack(
+            side=tk.LEFT, padx=2
+        )
+        ttk.Button(button_frame, text="▶ Add to Queue", command=add).pack(
+            side=tk.LEFT, padx=2
+        )
+        ttk.Button(button_frame, text="Close", command=dialog.destroy).pack(
+            side=tk.LEFT, padx=2
+        )
+
+    def load_playlist(self):
+        url = self.url_entry.get().strip()
+        paths = self.validate_paths()
+        if paths is None or not url.startswith("http"):
+            return
+        self.playlist_btn.config(state="disabled")
+        self.url_type_label.config(
+            text="Loading playlist entries...", foreground="blue"
+        )
+        thread = threading.Thread(
+            target=self.fetch_playlist, args=(paths[0], url, paths[1])
+        )
+        thread.daemon = True
+        thread.start()
+
+    def fetch_playlist(self, ytdlp, url, save_dir):
+        """list playlist entries in a worker thread"""
+        try:
+            title, entries = fetch_playlist(ytdlp, url)
+        except Exception as e:
+            message = f"Failed to load playlist: {e}"
+            self.root.after(0, lambda: self._playlist_failed(message))
+            return
+        self.root.after(0, lambda: self.show_playlist(title, entries, save_dir))
+
+    def _playlist_failed(self, message):
+        self.check_url_type()
+        messagebox.showerror("Error", message)
+
+    def show_playlist(self, title, entries, save_dir):
+        self.check_url_type()
+        if not entries:
+            messagebox.showinfo("Playlist", "The playlist has no entries.")
+            return
+
+        dialog = tk.Toplevel(self.root)
+        dialog.title(f"Playlist: {title}")
+        dialog.geometry("700x500")
+        dialog.transient(self.root)
+        dialog.columnconfigure(0, weight=1)
+        dialog.rowconfigure(1, weight=1)
+
+        ttk.Label(dialog, text=f"{title} ({len(entries)} entries)").grid(
+            row=0, column=0, columnspan=2, sticky=tk.W, padx=5, pady=5
+        )
+        listbox = tk.Listbox(dialog, selectmode=tk.EXTENDED, activestyle="none")
+        listbox.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), padx=(5, 0))
+        scroll = ttk.Scrollbar(dialog, orient=tk.VERTICAL, command=listbox.yview)
+        scroll.grid(row=1, column=1, sticky=(tk.N, tk.S), padx=(0, 5))
+        listbox.configure(yscrollcommand=scroll.set)
+        keys = [
+            archive_key(entry.get("ie_key"), entry.get("id"))
+            or archive_key_from_url(entry_url(entry))
+            for entry in entries
+        ]
+        archived = [key in self.archive for key in keys]
+        for index, entry in enumerate(entries, 1):
+            name = entry.get("title") or entry.get("id") or entry.get("url")
+            text = f"{index:4d}. {name}"
+            if entry.get("duration"):
+                text += f"  ({format_eta(entry['duration'])})"
+            if archived[index - 1]:
+                text += "  [downloaded]"
+            listbox.insert(tk.END, text)
+            if not archived[index - 1]:
+                listbox.selection_set(index - 1)
+
+        def enqueue_selected():
+            selected = listbox.curselection()
+            if not selected:
+                return
+            skipped = 0
+            # side-cars of the whole selection, also of downloaded videos
+            urls = [entry_url(entries[i]) for i in selected]
+            known = {url: keys[i] for url, i in zip(urls, selected)}
+            self.enqueue_sidecars(urls, save_dir, title, known)
+            for i in selected:
+                if self.skip_media.get():
+                    continue
+                if archived[i]:
+                    skipped += 1
+                    continue
+                entry = entries[i]
+                self.enqueue(entry_url(entry), save_dir, title, keys[i])
+            self.manager.schedule()
+            if skipped:
+                messagebox.showinfo(
+                    "Playlist",
+                    f"{skipped} entries are already in the download archive "
+                    "and were skipped.",
+                    parent=dialog,
+                )
+            self._refresh_aggregate()
+            self.save_queue()
+            dialog.destroy()
+
+        button_frame = ttk.Frame(dialog)
+        button_frame.grid(row=2, column=0, columnspan=2, pady=5)
+        ttk.Button(
+            button_frame,
+            text="Select All",
+            command=lambda: listbox.selection_set(0, tk.END),
+        ).pack(side=tk.LEFT, padx=2)
+        ttk.Button(
+            button_frame,
+            text="Select None",
+            command=lambda: listbox.selection_clear(0, tk.END),
+        ).pack(side=tk.LEFT, padx=2)
+        ttk.Button(
+            button_frame, text="▶ Enqueue Selected", command=enqueue_selected
+        ).pack(side=tk.LEFT, padx=2)
+
+    def stop_download(self):
+        """stop the selected jobs"""
+        for job_id in self.get_selected_job_ids():
+            self.manager.stop_job(job_id)
+
+    def stop_all_downloads(self):
+        self.manager.stop_all()
+
+    def pause_selected(self):
+        for job_id in self.get_selected_job_ids():
+            self.manager.pause_job(job_id)
+
+    def resume_selected(self):
+        for job_id in self.get_selected_job_ids():
+            self.manager.resume_job(job_id)
+
+    def retry_selected(self):
+        for job_id in self.get_selected_job_ids():
+            self.manager.retry_job(job_id)
+
+    def remove_finished(self):
+        for job_id in self.manager.remove_finished():
+            if self.queue_tree.exists(str(job_id)):
+                self.queue_tree.delete(str(job_id))
+            if job_id == self.selected_job_id:
+                self.selected_job_id = None
+                self.clear_log()
+        self.save_queue()
+
+    def show_history(self):
+        """sortable and filterable view of the job history database"""
+        if self.history is None:
+            messagebox.showerror("History", f"Cannot open {HISTORY_FILE}")
+            return
+
+        dialog = tk.Toplevel(self.root)
+        dialog.title("Download History")
+        dialog.geometry("1000x500")
+        dialog.transient(self.root)
+        dialog.columnconfigure(0, weight=1)
+        dialog.rowconfigure(1, weight=1)
+
+        tools = ttk.Frame(dialog)
+        tools.grid(row=0, column=0, sticky=(tk.W, tk.E), padx=5, pady=5)
+        ttk.Label(tools, text="Filter:").pack(side=tk.LEFT)
+        filter_entry = ttk.Entry(tools, width=30)
+        filter_entry.pack(side=tk.LEFT, padx=2)
+        ttk.Label(tools, text="Status:").pack(side=tk.LEFT, padx=(10, 0))
+        status_combo = ttk.Combobox(
+            tools, values=["", "done", "failed", "stopped"], width=8, state="readonly"
+        )
+        status_combo.pack(side=tk.LEFT, padx=2)
+        count_label = ttk.Label(tools, text="", foreground="gray")
+        count_label.pack(side=tk.RIGHT)
+
+        notebook = ttk.Notebook(dialog)
+        notebook.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), padx=5)
+
+        def seconds(value):
+            return f"{value:.1f}s" if value is not None else ""
+
+        def rate(value):
+            return f"{format_size(value)}/s" if value else ""
+
+        def timestamp(value):
+            return time.strftime("%Y-%m-%d %H:%M", time.localtime(value))
+
+        job_columns = [
+            # (history column, heading, width, formatter)
+            ("finished_at", "Finished", 130, timestamp),
+            ("status", "Status", 60, str),
+            ("extractor", "Extractor", 80, lambda v: v or ""),
+            ("video_id", "ID", 100, lambda v: v or ""),
+            ("bytes", "Size", 80, lambda v: format_size(v) if v else ""),
+            ("wall_time", "Wall", 60, seconds),
+            ("average_speed", "Avg speed", 85, rate),
+            ("peak_speed", "Peak speed", 85, rate),
+            ("extract_time", "Extract", 60, seconds),
+            ("transfer_time", "Transfer", 65, seconds),
+            ("postprocess_time", "Post", 55, seconds),
+            ("exit_code", "Exit", 40, lambda v: "" if v is None else str(v)),
+            ("failure_class", "Class", 80, lambda v: v or ""),
+            ("url", "URL", 250, str),
+            ("failure_reason", "Failure", 250, lambda v: v or ""),
+        ]
+        jobs_frame = ttk.Frame(notebook)
+        jobs_frame.columnconfigure(0, weight=1)
+        jobs_frame.rowconfigure(0, weight=1)
+        notebook.add(jobs_frame, text="Jobs")
+        jobs_tree = ttk.Treeview(
+            jobs_frame, columns=[c[0] for c in job_columns], show="headings"
+        )
+        for name, heading, width, _ in job_columns:
+            jobs_tree.heading(name, text=heading, command=lambda n=name: sort_by(n))
+            stretch = name in ("url", "failure_reason")
+            jobs_tree.column(name, width=width, stretch=stretch)
+        jobs_tree.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        scroll = ttk.Scrollbar(jobs_frame, orient=tk.VERTICAL, command=jobs_tree.yview)
+        scroll.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        jobs_tree.configure(yscrollcommand=scroll.set)
+
+        summary_columns = [
+            ("extractor", "Extractor", 120, lambda v: v or "(unknown)"),
+            ("jobs", "Jobs", 60, str),
+            ("failed", "Failed", 60, str),
+            ("transient", "Temporary", 70, str),
+            ("average_speed", "Avg speed", 100, rate),
+            ("extract_time", "Avg extract", 90, seconds),
+            ("transfer_time", "Avg transfer", 90, seconds),
+            ("postprocess_time", "Avg post", 80, seconds),
+            ("wall_time", "Avg wall", 80, seconds),
+        ]
+        summary_tree = ttk.Treeview(
+            notebook, columns=[c[0] for c in summary_columns], show="headings"
+        )
+        for name, heading, width, _ in summary_columns:
+            summary_tree.heading(name, text=heading)
+            summary_tree.column(name, width=width)
+        notebook.add(summary_tree, text="By Extractor")
+
+        engine_columns = [
+            ("backend", "Backend", 80, lambda v: v or ""),
+            ("downloader", "Downloader", 80, str),
+            ("concurrent_fragments", "Fragments", 70, lambda v: str(v or "")),
+            ("http_chunk_size", "Chunk", 60, lambda v: v or "off"),
+            ("connections", "Connections", 80, lambda v: str(v or "")),
+            ("jobs", "Jobs", 50, str),
+            ("failed", "Failed", 50, str),
+            ("average_speed", "Avg speed", 100, rate),
+            ("extract_time", "Avg extract", 90, seconds),
+            ("transfer_time", "Avg transfer", 90, seconds),
+            ("wall_time", "Avg wall", 80, seconds),
+        ]
+        engine_tree = ttk.Treeview(
+            notebook, columns=[c[0] for c in engine_columns], show="headings"
+        )
+        for name, heading, width, _ in engine_columns:
+            engine_tree.heading(name, text=heading)
+            engine_tree.column(name, width=width)
+        notebook.add(engine_tree, text="By Engine")
+
+        order = {"column": "finished_at", "descending": True}
+
+        def sort_by(column):
+            if order["column"] == column:
+                order["descending"] = not order["descending"]
+            else:
+                order["column"] = column
+                order["descending"] = column != "url"
+            refresh()
+
+        def refresh(event=None):
+            try:
+                rows = self.history.query(
+                    filter_entry.get().strip(),
+                    status_combo.get(),
+                    order["column"],
+                    order["descending"],
+                )
+                summary = self.history.extractor_summary()
+                engines = self.history.engine_summary()
+            except sqlite3.Error as e:
+                messagebox.showerror("History", str(e), parent=dialog)
+                return
+            jobs_tree.delete(*jobs_tree.get_children())
+            for row in rows:
+                jobs_tree.insert(
+                    "", tk.END, values=[f(row[n]) for n, _, _, f in job_columns]
+                )
+            summary_tree.delete(*summary_tree.get_children())
+            for row in summary:
+                summary_tree.insert(
+                    "", tk.END, values=[f(row[n]) for n, _, _, f in summary_columns]
+                )
+            engine_tree.delete(*engine_tree.get_children())
+            for row in engines:
+                engine_tree.insert(
+                    "", tk.END, values=[f(row[n]) for n, _, _, f in engine_columns]
+                )
+            count_label.config(text=f"{len(rows)} job(s)")
+
+        filter_entry.bind("<Return>", refresh)
+        status_combo.bind("<<ComboboxSelected>>", refresh)
+        ttk.Button(tools, text="Refresh", command=refresh).pack(side=tk.LEFT, padx=2)
+        refresh()
+
+    def sample_metrics(self):
+        snapshot = self.metrics.sample()
+        if self.metrics_csv is not None:
+            try:
+                self.metrics_csv.write(snapshot)
+            except OSError as e:
+                self.stop_metrics_csv()
+                messagebox.showerror("Metrics", f"CSV export stopped: {e}")
+        if self.metrics_view is not None:
+            self.metrics_view(snapshot)
+        self.root.after(METRICS_MS, self.sample_metrics)
+
+    def start_metrics_csv(self, path):
+        self.stop_metrics_csv()
+        self.metrics_csv = MetricsCsv(path)
+
+    def stop_metrics_csv(self):
+        if self.metrics_csv is not None:
+            self.metrics_csv.close()
+            self.metrics_csv = None
+
+    def start_metrics_server(self, port):
+        self.stop_metrics_server()
+        self.metrics_server = MetricsServer(self.metrics, port).start()
+
+    def stop_metrics_server(self):
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+            self.metrics_server = None
+
+    def show_metrics(self):
+        """live speed graphs, queue depth and CPU/memory of the processes"""
+        if self.metrics_dialog is not None:
+            self.metrics_dialog.lift()
+            return
+        dialog = self.metrics_dialog = tk.Toplevel(self.root)
+        dialog.title("Instrumentation")
+        dialog.geometry("900x650")
+        dialog.transient(self.root)
+        dialog.columnconfigure(0, weight=1)
+        dialog.rowconfigure(3, weight=1)
+        dialog.rowconfigure(5, weight=1)
+
+        summary_label = ttk.Label(dialog, text="Collecting samples...")
+        summary_label.grid(row=0, column=0, sticky=tk.W, padx=5)
+        throughput_canvas = tk.Canvas(
+            dialog, height=70, bg="white", highlightthickness=0
+        )
+        throughput_canvas.grid(row=1, column=0, sticky=(tk.W, tk.E), padx=5)
+
+        ttk.Label(dialog, text="Active jobs:").grid(row=2, column=0, sticky=tk.W)
+        jobs_frame = ttk.Frame(dialog)
+        jobs_frame.grid(row=3, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), padx=5)
+        jobs_frame.columnconfigure(0, weight=1)
+        jobs_frame.rowconfigure(0, weight=1)
+        jobs_canvas = tk.Canvas(jobs_frame, bg="white", highlightthickness=0)
+        jobs_canvas.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        jobs_scroll = ttk.Scrollbar(
+            jobs_frame, orient=tk.VERTICAL, command=jobs_canvas.yview
+        )
+        jobs_scroll.grid(row=0, column=1, sticky=(tk.N, tk.S))
+        jobs_canvas.configure(yscrollcommand=jobs_scroll.set)
+
+        process_text = "Processes:"
+        if not PROC_AVAILABLE:
+            process_text += " (CPU and memory need /proc, not available here)"
+        ttk.Label(dialog, text=process_text).grid(row=4, column=0, sticky=tk.W)
+        process_columns = [
+            ("job", "Job", 50),
+            ("pid", "PID", 70),
+            ("name", "Process", 120),
+            ("cpu", "CPU", 70),
+            ("rss", "Memory", 90),
+            ("read", "Disk read", 90),
+            ("write", "Disk write", 90),
+        ]
+        process_tree = ttk.Treeview(
+            dialog, columns=[c[0] for c in process_columns], show="headings", height=6
+        )
+        for name, heading, width in process_columns:
+            process_tree.heading(name, text=heading)
+            process_tree.column(name, width=width, anchor=tk.E)
+        process_tree.grid(row=5, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), padx=5)
+
+        export = ttk.Frame(dialog)
+        export.grid(row=6, column=0, sticky=(tk.W, tk.E), padx=5, pady=5)
+        csv_var = tk.BooleanVar(value=self.metrics_csv is not None)
+        server_var = tk.BooleanVar(value=self.metrics_server is not None)
+        csv_label = ttk.Label(export, text="", foreground="gray")
+        port_spin = ttk.Spinbox(export, from_=1024, to=65535, width=6)
+        server = self.metrics_server
+        port_spin.set(server.server_address[1] if server else METRICS_PORT)
+
+        def toggle_csv():
+            if not csv_var.get():
+                self.stop_metrics_csv()
+            else:
+                path = filedialog.asksaveasfilename(
+                    parent=dialog,
+                    title="Export metrics to",
+                    defaultextension=".csv",
+                    initialfile="yt-dlp-gui-metrics.csv",
+                    filetypes=[("CSV files", "*.csv"), ("All files", "*.*")],
+                )
+                try:
+                    if path:
+                        self.start_metrics_csv(path)
+                except OSError as e:
+                    messagebox.showerror("Metrics", str(e), parent=dialog)
+                csv_var.set(self.metrics_csv is not None)
+            csv_label.config(text=self.metrics_csv.path if self.metrics_csv else "")
+
+        def toggle_server():
+            if not server_var.get():
+                self.stop_metrics_server()
+                return
+            try:
+                self.start_metrics_server(int(port_spin.get()))
+            except (OSError, ValueError) as e:
+                messagebox.showerror("Metrics", str(e), parent=dialog)
+                server_var.set(False)
+
+        ttk.Checkbutton(
+            export, text="Export CSV", variable=csv_var, command=toggle_csv
+        ).pack(side=tk.LEFT)
+        csv_label.pack(side=tk.LEFT, padx=(2, 20))
+        ttk.Checkbutton(
+            export,
+            text="Serve Prometheus metrics on http://127.0.0.1:",
+            variable=server_var,
+            command=toggle_server,
+        ).pack(side=tk.LEFT)
+        port_spin.pack(side=tk.LEFT)
+        ttk.Label(export, text="/metrics").pack(side=tk.LEFT)
+        csv_label.config(text=self.metrics_csv.path if self.metrics_csv else "")
+
+        def rate(value):
+            return f"{format_size(value)}/s" if value else ""
+
+        def refresh(snapshot):
+            summary_label.config(
+                text=(
+                    f"Throughput: {format_size(snapshot['throughput'])}/s | "
+                    f"Running: {snapshot['running']} | "
+                    f"Pending: {snapshot['pending']} | "
+                    f"Post-processing: {snapshot['processing']} "
+                    f"(+{snapshot['postprocess_waiting']} waiting) | "
+                    f"Processes: {snapshot['processes']} | "
+                    f"CPU: {snapshot['cpu_percent']:.0f}% | "
+                    f"Memory: {format_size(snapshot['rss_bytes'])}"
+                )
+            )
+            width = max(200, throughput_canvas.winfo_width())
+            throughput_canvas.delete("all")
+            draw_sparkline(
+                throughput_canvas, self.metrics.throughput, 5, 5, width - 10, 60, "blue"
+            )
+            peak = max(self.metrics.throughput, default=0)
+            throughput_canvas.create_text(
+                8, 5, anchor=tk.NW, text=f"peak {rate(peak)}", fill="gray"
+            )
+
+            # one row per job: label on the left, speed graph on the right
+            row_height = 34
+            width = max(400, jobs_canvas.winfo_width())
+            jobs_canvas.delete("all")
+            for index, job in enumerate(snapshot["jobs"]):
+                y = index * row_height
+                cpu = sum(p["cpu_percent"] or 0 for p in job["processes"])
+                label = (
+                    f"#{job['id']} {job['phase']} {job['progress']:.0f}%  "
+                    f"{rate(job['speed'])}"
+                )
+                if job["processes"]:
+                    label += f"  CPU {cpu:.0f}%"
+                jobs_canvas.create_text(5, y + 17, anchor=tk.W, text=label)
+                draw_sparkline(
+                    jobs_canvas,
+                    self.metrics.speeds.get(job["id"], ()),
+                    260,
+                    y + 4,
+                    width - 270,
+                    row_height - 8,
+                    "#2196F3",
+                )
+            jobs_canvas.configure(
+                scrollregion=(0, 0, width, len(snapshot["jobs"]) * row_height)
+            )
+
+            process_tree.delete(*process_tree.get_children())
+            for job in snapshot["jobs"]:
+                for p in job["processes"]:
+                    cpu = p["cpu_percent"]
+                    process_tree.insert(
+                        "",
+                        tk.END,
+                        values=(
+                            job["id"],
+                            p["pid"],
+                            p["name"],
+                            "" if cpu is None else f"{cpu:.0f}%",
+                            format_size(p["rss_bytes"]),
+                            format_size(p["read_bytes"] or 0),
+                            format_size(p["write_bytes"] or 0),
+                        ),
+                    )
+
+        def close():
+            self.metrics_view = self.metrics_dialog = None
+            dialog.destroy()
+
+        dialog.protocol("WM_DELETE_WINDOW", close)
+        self.metrics_view = refresh
+        if self.metrics.snapshot is not None:
+            refresh(self.metrics.snapshot)
+
+    def save_queue(self):
+        try:
+            self.manager.save(QUEUE_FILE)
+        except OSError:
+            pass
+
+    def on_close(self):
+        # pause rather than stop so the jobs can be resumed on the next start
+        self.manager.pause_all()
+        self.manager.join(SHUTDOWN_TIMEOUT)
+        self.save_queue()
+        try:
+            update_settings(
+                engine=self.engine_settings(),
+                options=self.option_settings(),
+                sidecars=self.sidecar_settings(),
+            )
+        except OSError:
+            pass
+        self.stop_metrics_csv()
+        self.stop_metrics_server()
+        self.root.destroy()
+
+    def clear_log(self):
+        self.log_text.delete(1.0, tk.END)
+        self.progress_var.set(0)
+        self.progress_label.config(text="Ready", foreground="gray")
+
+
+def main():
+    root = tkinterdnd2.TkinterDnD.Tk() if tkinterdnd2 is not None else tk.Tk()
+    app = YtDlpGUI(root)
+    root.protocol("WM_DELETE_WINDOW", app.on_close)
+    root.mainloop()
+
+
+if __name__ == "__main__":
+    main()
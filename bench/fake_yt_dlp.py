@@ -0,0 +1,375 @@
+"""stand-in for the yt-dlp executable, for benchmarks without network access
+
+Understands the options the GUI passes (-o, -f, --print, --progress-template,
+--limit-rate, --download-archive, --continue, --skip-download with the
+side-car options, -J) and writes real files.
+URLs on the local media server (bench/media_server.py) are fetched over
+HTTP, progressive or HLS; any other URL produces synthetic data.
+
+Tuning through environment variables:
+
+    FAKE_YTDLP_LINE_RATE      progress lines per second (default 20)
+    FAKE_YTDLP_NOISE          plain log lines after each progress line (0)
+    FAKE_YTDLP_SIZE           bytes of synthetic downloads (10 MiB)
+    FAKE_YTDLP_SPEED          bytes/s of synthetic downloads, 0 = no limit
+    FAKE_YTDLP_EXTRACT_DELAY  seconds spent "extracting" (0.05)
+
+URLs containing "fail" exit with an HTTP 429 error.
+"""
+
+import json
+import os
+import re
+import sys
+import time
+import urllib.request
+
+VERSION = "2099.01.01"
+CHUNK_SIZE = 64 * 1024
+FIELD_RE = re.compile(r"%\((?P<expr>[^)]*)\)(?P<conv>[sdj])")
+RATE_RE = re.compile(r"^(\d+(?:\.\d+)?)([KMG]?)", re.IGNORECASE)
+ID_RE = re.compile(r"(?:v=|youtu\.be/|/video/|/hls/)([\w-]+)")
+OPTIONS_WITH_VALUE = {
+    "-o",
+    "-f",
+    "-P",
+    "-N",
+    "--print",
+    "--progress-template",
+    "--limit-rate",
+    "--download-archive",
+    "--concurrent-fragments",
+    "--http-chunk-size",
+    "--downloader",
+    "--downloader-args",
+    "--merge-output-format",
+    "--audio-format",
+    "--audio-quality",
+    "--sub-langs",
+}
+
+
+def env_number(name, default):
+    return float(os.environ.get(name, default))
+
+
+def parse_args(argv):
+    options = {"--print": []}
+    flags = set()
+    positional = []
+    args = iter(argv)
+    for arg in args:
+        if arg in OPTIONS_WITH_VALUE:
+            value = next(args, "")
+            if arg == "--print":
+                options["--print"].append(value)
+            else:
+                options[arg] = value
+        elif arg.startswith("-"):
+            flags.add(arg)
+        else:
+            positional.append(arg)
+    return options, flags, positional
+
+
+def parse_rate(text):
+    match = RATE_RE.match(text or "")
+    if not match:
+        return None
+    units = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3}
+    return float(match.group(1)) * units[match.group(2).upper()]
+
+
+def render(template, info):
+    """tiny subset of the yt-dlp output template language"""
+
+    def value(match):
+        expr = match.group("expr")
+        if ".:." in expr:
+            path, field = expr.split(".:.", 1)
+            source = info.get(path) or []
+            items = source.values() if isinstance(source, dict) else source
+            result = [item[field] for item in items if item.get(field)]
+        elif ".{" in expr:
+            path, fields = expr.split(".{", 1)
+            source = info.get(path, {}) if path else info
+            result = {k: source.get(k) for k in fields.rstrip("}").split(",")}
+        else:
+            result = info.get(expr)
+        if match.group("conv") == "j":
+            return json.dumps(result)
+        return "NA" if result is None else str(result)
+
+    return FIELD_RE.sub(value, template)
+
+
+def emit(line):
+    sys.stdout.write(line + "\n")
+    sys.stdout.flush()
+
+
+def print_stage(prints, stage, info):
+    for item in prints:
+        when, _, template = item.partition(":")
+        if when == stage:
+            emit(render(template, info))
+
+
+def format_bytes(num):
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if num < 1024:
+            return f"{num:.2f}{unit}"
+        num /= 1024
+    return f"{num:.2f}TiB"
+
+
+def synthetic_chunks(size, speed, chunk_size=CHUNK_SIZE):
+    sent = 0
+    started = time.monotonic()
+    block = b"\0" * chunk_size
+    while sent < size:
+        chunk = block[: min(chunk_size, size - sent)]
+        sent += len(chunk)
+        if speed:
+            delay = sent / speed - (time.monotonic() - started)
+            if delay > 0:
+                time.sleep(delay)
+        yield chunk
+
+
+def http_chunks(url, offset=0):
+    request = urllib.request.Request(url)
+    if offset:
+        request.add_header("Range", f"bytes={offset}-")
+    with urllib.request.urlopen(request, timeout=30) as response:
+        while True:
+            chunk = response.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+def hls_segments(url):
+    with urllib.request.urlopen(url, timeout=30) as response:
+        playlist = response.read().decode()
+    base = url.split("/hls/", 1)[0]
+    return [
+        base + line if line.startswith("/") else line
+        for line in playlist.splitlines()
+        if line and not line.startswith("#")
+    ]
+
+
+class Downloader:
+    def __init__(self, options, flags):
+        self.options = options
+        self.flags = flags
+        self.limit = parse_rate(options.get("--limit-rate"))
+        self.line_rate = max(0.1, env_number("FAKE_YTDLP_LINE_RATE", 20))
+        self.line_interval = 1 / self.line_rate
+        self.noise = int(env_number("FAKE_YTDLP_NOISE", 0))
+        self.structured = "--progress-template" in options
+
+    def progress(self, data):
+        if self.structured:
+            template = self.options["--progress-template"].partition(":")[2]
+            emit(render(template, {"progress": data}))
+        else:
+            total = data.get("total_bytes") or 0
+            percent = data["downloaded_bytes"] * 100 / total if total else 0
+            minutes, seconds = divmod(int(data.get("eta") or 0), 60)
+            emit(
+                f"[download] {percent:5.1f}% of {format_bytes(total):>10} at "
+                f"{format_bytes(data.get('speed') or 0):>10}/s "
+                f"ETA {minutes:02d}:{seconds:02d}"
+            )
+        for index in range(self.noise):
+            emit(f"[debug] fragment worker {index}: buffer ok")
+
+    def fetch(self, path, chunks, total, fragments=None):
+        """write chunks to path, reporting progress like yt-dlp"""
+        part = path + ".part"
+        resume = os.path.exists(part) and "--no-continue" not in self.flags
+        mode = "ab" if resume else "wb"
+        downloaded = os.path.getsize(part) if resume else 0
+        started = time.monotonic()
+        start_bytes = downloaded
+        last_line = 0
+        with open(part, mode) as f:
+            for fragment, chunk in chunks:
+                f.write(chunk)
+                downloaded += len(chunk)
+                elapsed = time.monotonic() - started
+                speed = (downloaded - start_bytes) / elapsed if elapsed else None
+                if self.limit and speed and speed > self.limit:
+                    time.sleep((downloaded - start_bytes) / self.limit - elapsed)
+                now = time.monotonic()
+                if now - last_line >= self.line_interval:
+                    last_line = now
+                    eta = (total - downloaded) / speed if speed and total else None
+                    self.progress(
+                        {
+                            "status": "downloading",
+                            "downloaded_bytes": downloaded,
+                            "total_bytes": total,
+                            "total_bytes_estimate": None,
+                            "speed": speed,
+                            "eta": eta,
+                            "fragment_index": fragment,
+                            "fragment_count": fragments,
+                        }
+                    )
+        os.replace(part, path)
+        self.progress(
+            {
+                "status": "finished",
+                "downloaded_bytes": downloaded,
+                "total_bytes": downloaded,
+                "total_bytes_estimate": None,
+                "speed": None,
+                "eta": None,
+                "fragment_index": fragments,
+                "fragment_count": fragments,
+            }
+        )
+        return downloaded
+
+    def source(self, url, size, path):
+        """(chunks of (fragment, bytes), total size, fragment count)"""
+        part = path + ".part"
+        offset = os.path.getsize(part) if os.path.exists(part) else 0
+        if url.startswith("http://127.0.0.1") and ".m3u8" in url:
+            segments = hls_segments(url)
+
+            def chunks():
+                for index, segment in enumerate(segments, 1):
+                    for chunk in http_chunks(segment):
+                        yield index, chunk
+
+            return chunks(), None, len(segments)
+        if url.startswith("http://127.0.0.1"):
+            with urllib.request.urlopen(url, timeout=30) as response:
+                total = int(response.headers.get("Content-Length", 0)) or None
+            return ((None, c) for c in http_chunks(url, offset)), total, None
+        speed = env_number("FAKE_YTDLP_SPEED", 50 * 1024 * 1024)
+        # small enough chunks to reach the configured progress line rate
+        chunk_size = CHUNK_SIZE
+        if speed:
+            chunk_size = max(1024, min(CHUNK_SIZE, int(speed / self.line_rate)))
+        chunks = synthetic_chunks(max(0, size - offset), speed, chunk_size)
+        return ((None, c) for c in chunks), size, None
+
+
+def write_sidecars(options, flags, url, video_id):
+    """--skip-download: write the requested side-car files of one video"""
+    extractor = "Youtube" if "youtu" in url else "Generic"
+    info = {"extractor_key": extractor, "id": video_id, "title": f"Fake {video_id}"}
+    info.update(duration=60, webpage_url=url, original_url=url, uploader="Fake")
+    template = options.get("-o", "%(title)s [%(id)s].%(ext)s")
+    base = render(template, dict(info, ext="")).rstrip(".")
+    os.makedirs(os.path.dirname(base) or ".", exist_ok=True)
+    info["requested_subtitles"] = {}
+    if "--write-subs" in flags or "--write-auto-subs" in flags:
+        for lang in options.get("--sub-langs", "en").split(","):
+            lang = lang.strip().rstrip(".*") or "en"
+            path = f"{base}.{lang}.vtt"
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("WEBVTT\n\n00:00.000 --> 00:01.000\nfake\n")
+            info["requested_subtitles"][lang] = {"ext": "vtt", "filepath": path}
+    info["thumbnails"] = [{"url": "fake"}]
+    if "--write-thumbnail" in flags:
+        path = f"{base}.jpg"
+        with open(path, "wb") as f:
+            f.write(b"\xff\xd8\xff\xd9")
+        info["thumbnails"][0]["filepath"] = path
+    info["requested_downloads"] = [{}]
+    if "--write-info-json" in flags:
+        path = f"{base}.info.json"
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(info, f)
+        info["requested_downloads"][0]["infojson_filename"] = path
+    print_stage(options["--print"], "after_video", info)
+
+
+def main(argv):
+    if "--version" in argv:
+        emit(VERSION)
+        return 0
+    options, flags, positional = parse_args(argv)
+    if not positional:
+        emit("ERROR: no URL given")
+        return 2
+    if "-J" in flags:
+        url = positional[-1]
+        match = ID_RE.search(url)
+        video_id = match.group(1) if match else "fake"
+        size = int(env_number("FAKE_YTDLP_SIZE", 10 * 1024 * 1024))
+        formats = [
+            {"format_id": "137", "vcodec": "avc1", "filesize": int(size * 0.8)},
+            {"format_id": "140", "vcodec": "none", "filesize": int(size * 0.2)},
+        ]
+        info = {"id": video_id, "title": f"Fake {video_id}", "webpage_url": url}
+        if "," in options.get("-f", ""):
+            # like yt-dlp, one download per stream, the last one on top
+            downloads = [dict(info, **fmt) for fmt in formats]
+            info = dict(downloads[-1], requested_downloads=downloads)
+            emit(json.dumps(dict(info, formats=formats)))
+        else:
+            emit(json.dumps(dict(info, formats=formats, requested_formats=formats)))
+        return 0
+    if "--skip-download" in flags:
+        code = 0
+        for url in positional:
+            match = ID_RE.search(url)
+            emit(f"[generic] Extracting URL: {url}")
+            time.sleep(env_number("FAKE_YTDLP_EXTRACT_DELAY", 0.05))
+            if "fail" in url:
+                emit("ERROR: unable to download webpage: HTTP Error 404: Not Found")
+                code = 1
+                if "--ignore-errors" not in flags:
+                    return code
+                continue
+            write_sidecars(options, flags, url, match.group(1) if match else "fake")
+        return code
+
+    url = positional[-1]
+    match = ID_RE.search(url)
+    video_id = match.group(1) if match else "fake"
+    emit(f"[generic] Extracting URL: {url}")
+    time.sleep(env_number("FAKE_YTDLP_EXTRACT_DELAY", 0.05))
+    emit(f"[generic] {video_id}: Downloading webpage")
+    if "fail" in url:
+        emit("ERROR: unable to download video data: HTTP Error 429: Too Many Requests")
+        return 1
+
+    extractor = "Youtube" if "youtu" in url else "Generic"
+    info = {"extractor_key": extractor, "id": video_id, "title": f"Fake {video_id}"}
+    info["duration"] = 60
+    print_stage(options["--print"], "pre_process", info)
+
+    template = options.get("-o", "%(title)s [%(id)s].%(ext)s")
+    size = int(env_number("FAKE_YTDLP_SIZE", 10 * 1024 * 1024))
+    # split selectors like "(bv,ba)/b" download two streams
+    streams = [("137", "mp4", 1.0)]
+    if "%(format_id)s" in template and "," in options.get("-f", ""):
+        streams = [("137", "mp4", 0.8), ("140", "m4a", 0.2)]
+
+    downloader = Downloader(options, flags)
+    for format_id, ext, share in streams:
+        fields = dict(info, format_id=format_id, ext=ext)
+        path = render(template, fields)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        emit(f"[download] Destination: {path}")
+        chunks, total, fragments = downloader.source(url, int(size * share), path)
+        downloader.fetch(path, chunks, total, fragments)
+        print_stage(options["--print"], "after_move", dict(fields, filepath=path))
+
+    archive = options.get("--download-archive")
+    if archive:
+        with open(archive, "a", encoding="utf-8") as f:
+            f.write(f"generic {video_id}\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
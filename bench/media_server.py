@@ -0,0 +1,142 @@
+"""local HTTP server with synthetic media for the benchmarks
+
+    python bench/media_server.py --port 8765
+
+/video/<name>.mp4?size=N   progressive file of N bytes, supports Range
+/hls/<name>/index.m3u8?segments=N&segment_size=N   HLS playlist
+/hls/<name>/<index>.ts?segment_size=N   one HLS segment
+/stats   bytes served so far as JSON
+"""
+
+import argparse
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+DEFAULT_SIZE = 10 * 1024 * 1024
+DEFAULT_SEGMENTS = 20
+DEFAULT_SEGMENT_SIZE = 512 * 1024
+CHUNK_SIZE = 64 * 1024
+# a block of pseudo random bytes, repeated to build files of any size
+PATTERN = bytes((i * 7919 + 13) % 256 for i in range(CHUNK_SIZE))
+
+RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+class MediaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        if url.path == "/stats":
+            body = json.dumps({"bytes_served": self.server.bytes_served}).encode()
+            self.send_body(200, "application/json", body)
+        elif url.path.startswith("/video/"):
+            self.send_media(int(query.get("size", DEFAULT_SIZE)), "video/mp4")
+        elif url.path.startswith("/hls/") and url.path.endswith(".m3u8"):
+            self.send_playlist(url.path, query)
+        elif url.path.startswith("/hls/") and url.path.endswith(".ts"):
+            size = int(query.get("segment_size", DEFAULT_SEGMENT_SIZE))
+            self.send_media(size, "video/mp2t")
+        else:
+            self.send_body(404, "text/plain", b"not found")
+
+    def send_body(self, code, content_type, body):
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_playlist(self, path, query):
+        segments = int(query.get("segments", DEFAULT_SEGMENTS))
+        segment_size = int(query.get("segment_size", DEFAULT_SEGMENT_SIZE))
+        base = path.rsplit("/", 1)[0]
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:3",
+            "#EXT-X-TARGETDURATION:4",
+            "#EXT-X-MEDIA-SEQUENCE:0",
+        ]
+        for index in range(segments):
+            lines.append("#EXTINF:4.0,")
+            lines.append(f"{base}/{index}.ts?segment_size={segment_size}")
+        lines.append("#EXT-X-ENDLIST")
+        body = ("\n".join(lines) + "\n").encode()
+        self.send_body(200, "application/vnd.apple.mpegurl", body)
+
+    def send_media(self, size, content_type):
+        start, end = 0, size - 1
+        match = RANGE_RE.match(self.headers.get("Range", ""))
+        if match and (match.group(1) or match.group(2)):
+            if match.group(1):
+                start = int(match.group(1))
+                if match.group(2):
+                    end = min(end, int(match.group(2)))
+            else:
+                start = max(0, size - int(match.group(2)))
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+        remaining = end - start + 1
+        offset = start % CHUNK_SIZE
+        try:
+            while remaining > 0:
+                block = PATTERN[offset : offset + remaining]
+                self.wfile.write(block)
+                remaining -= len(block)
+                self.server.count(len(block))
+                offset = 0
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+class MediaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0):
+        super().__init__(("127.0.0.1", port), MediaHandler)
+        self.bytes_served = 0
+        self.lock = threading.Lock()
+
+    def count(self, size):
+        with self.lock:
+            self.bytes_served += size
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        """serve from a daemon thread, return self"""
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    server = MediaServer(args.port)
+    print(f"serving synthetic media on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,402 @@
+"""benchmarks of the download engine, results are written as JSON
+
+    python bench/run_bench.py                      # all benchmarks
+    python bench/run_bench.py parser scheduler     # some of them
+    python bench/run_bench.py --compare bench/results/bench-old.json
+
+Runs offline: downloads use bench/fake_yt_dlp.py and the local media
+server of bench/media_server.py instead of yt-dlp and the internet.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import queue
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+import ytdlp_core as core  # noqa: E402
+from media_server import MediaServer  # noqa: E402
+
+FAKE_YTDLP = os.path.join(BENCH_DIR, "fake_yt_dlp.py")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+# same refresh interval as the GUI's drain_ui_queue
+UI_REFRESH_MS = 75
+# relative change of a metric reported as a regression by --compare
+REGRESSION_THRESHOLD = 0.10
+
+
+@contextlib.contextmanager
+def fake_env(**values):
+    """environment of the fake yt-dlp processes started meanwhile"""
+    saved = {}
+    for name, value in values.items():
+        key = f"FAKE_YTDLP_{name.upper()}"
+        saved[key] = os.environ.get(key)
+        os.environ[key] = str(value)
+    try:
+        yield
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+def fake_command(url, save_dir):
+    cmd = core.build_command(FAKE_YTDLP, url, save_dir, use_archive=False)
+    # run the stub with this interpreter, no executable bit needed
+    return [sys.executable] + cmd
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def wait_idle(manager, timeout):
+    deadline = time.monotonic() + timeout
+    while not manager.is_idle():
+        if time.monotonic() > deadline:
+            manager.stop_all()
+            raise RuntimeError("benchmark jobs did not finish in time")
+        time.sleep(0.01)
+
+
+def bench_parser(args):
+    """cost of decoding one line of yt-dlp output, in nanoseconds"""
+    manager = core.DownloadManager(lambda kind, job, payload: None, log_dir=None)
+    job = core.DownloadJob(1, "https://example.com/v", [], "/tmp", log_dir=None)
+    progress = {
+        "status": "downloading",
+        "downloaded_bytes": 5242880,
+        "total_bytes": 10485760,
+        "total_bytes_estimate": None,
+        "speed": 2097152.0,
+        "eta": 2,
+        "fragment_index": 12,
+        "fragment_count": 40,
+    }
+    stream = {"filepath": "/tmp/Fake [v].f137.mp4", "format_id": "137", "ext": "mp4"}
+    lines = {
+        "progress_line_ns": core.PROGRESS_PREFIX + json.dumps(progress),
+        "info_line_ns": core.INFO_PREFIX + '{"extractor_key": "Youtube", "id": "v"}',
+        "stream_line_ns": core.STREAM_PREFIX + json.dumps(stream),
+        "filepath_line_ns": core.FILEPATH_PREFIX + "/tmp/Fake [v].mp4",
+        "log_line_ns": "[download] Destination: /tmp/Fake [v].f137.mp4",
+    }
+    results = {}
+    count = args.lines
+    for name, line in lines.items():
+        best = None
+        for _ in range(5):
+            started = time.perf_counter_ns()
+            for _ in range(count):
+                manager.handle_output(job, line)
+            elapsed = (time.perf_counter_ns() - started) / count
+            best = elapsed if best is None else min(best, elapsed)
+        results[name] = round(best, 1)
+
+    helpers = {
+        "normalize_url_ns": lambda: core.normalize_url(
+            "https://m.youtube.com/watch?v=dQw4w9WgXcQ&feature=share&si=x"
+        ),
+        "classify_failure_ns": lambda: core.classify_failure(
+            "ERROR: unable to download video data: HTTP Error 429: Too Many Requests"
+        ),
+    }
+    for name, call in helpers.items():
+        started = time.perf_counter_ns()
+        for _ in range(count):
+            call()
+        results[name] = round((time.perf_counter_ns() - started) / count, 1)
+    results["lines"] = count
+    return results
+
+
+def bench_ui_latency(args):
+    """delay between a worker event and the GUI refresh that draws it
+
+    Jobs flood the log while a thread drains the event queue every
+    UI_REFRESH_MS like the GUI does.
+    """
+    events = queue.Queue()
+    latencies = []
+    drain_times = []
+    depth = [0]
+    counts = {"log": 0, "other": 0}
+    running = threading.Event()
+    running.set()
+
+    def on_event(kind, job, payload):
+        events.put((kind, job, time.perf_counter()))
+
+    def drain():
+        shown = 0
+        while running.is_set():
+            time.sleep(UI_REFRESH_MS / 1000)
+            started = time.perf_counter()
+            depth[0] = max(depth[0], events.qsize())
+            selected = None
+            created_times = []
+            while True:
+                try:
+                    kind, job, created = events.get_nowait()
+                except queue.Empty:
+                    break
+                if kind == "log":
+                    counts["log"] += 1
+                    selected = selected or job
+                    continue
+                counts["other"] += 1
+                created_times.append(created)
+            if selected is not None:
+                _, shown = selected.new_log_lines(shown)
+            # an event is on screen once the whole batch is drawn
+            finished = time.perf_counter()
+            latencies.extend(finished - created for created in created_times)
+            drain_times.append(finished - started)
+
+    thread = threading.Thread(target=drain)
+    thread.daemon = True
+    thread.start()
+    with tempfile.TemporaryDirectory() as out_dir, fake_env(
+        line_rate=args.line_rate,
+        noise=args.noise,
+        size=args.size,
+        speed=args.size,  # one second per job
+        extract_delay=0,
+    ):
+        manager = core.DownloadManager(on_event, args.workers, log_dir=None)
+        started = time.monotonic()
+        for index in range(args.workers):
+            url = f"https://example.com/video/flood{index}"
+            manager.add_job(url, fake_command(url, out_dir), out_dir)
+        wait_idle(manager, 120)
+        elapsed = time.monotonic() - started
+    time.sleep(UI_REFRESH_MS / 1000 * 2)
+    running.clear()
+    thread.join()
+
+    return {
+        "jobs": args.workers,
+        "log_lines_per_s": round(counts["log"] / elapsed),
+        "events_per_s": round(counts["other"] / elapsed),
+        "latency_p50_ms": round(percentile(latencies, 0.5) * 1000, 2),
+        "latency_p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "latency_max_ms": round(max(latencies) * 1000, 2),
+        "drain_p95_ms": round(percentile(drain_times, 0.95) * 1000, 3),
+        "max_queue_depth": depth[0],
+    }
+
+
+def bench_scheduler(args):
+    """jobs per second through the worker pool, plus the cost of one scan"""
+    with tempfile.TemporaryDirectory() as out_dir, fake_env(
+        line_rate=1000, noise=0, size=64 * 1024, speed=0, extract_delay=0
+    ):
+        manager = core.DownloadManager(
+            lambda kind, job, payload: None, args.workers, log_dir=None
+        )
+        started = time.monotonic()
+        for index in range(args.jobs):
+            url = f"https://example.com/video/job{index}"
+            manager.add_job(url, fake_command(url, out_dir), out_dir, start=False)
+        manager.schedule()
+        wait_idle(manager, 600)
+        elapsed = time.monotonic() - started
+        done = sum(job.status == "done" for job in manager.jobs.values())
+
+    # one schedule() pass over a large queue without free worker slots
+    manager = core.DownloadManager(lambda kind, job, payload: None, log_dir=None)
+    for index in range(args.queue_size):
+        manager.add_job(f"https://example.com/video/q{index}", [], "/tmp", start=False)
+    manager.max_workers = 0
+    scan_started = time.perf_counter()
+    manager.schedule()
+    scan = time.perf_counter() - scan_started
+
+    return {
+        "jobs": args.jobs,
+        "workers": args.workers,
+        "done": done,
+        "jobs_per_s": round(done / elapsed, 2),
+        "wall_s": round(elapsed, 3),
+        "queue_size": args.queue_size,
+        "schedule_scan_ms": round(scan * 1000, 3),
+    }
+
+
+def bench_e2e(args):
+    """bytes per second of real HTTP downloads from the local media server"""
+    server = MediaServer().start()
+    segment_size = 256 * 1024
+    segments = max(1, args.size // segment_size)
+    urls = []
+    for index in range(args.jobs):
+        if index % 2:
+            urls.append(
+                f"{server.base_url}/hls/h{index}/index.m3u8"
+                f"?segments={segments}&segment_size={segment_size}"
+            )
+        else:
+            urls.append(f"{server.base_url}/video/p{index}.mp4?size={args.size}")
+    try:
+        with tempfile.TemporaryDirectory() as out_dir, fake_env(
+            line_rate=20, noise=0, extract_delay=0
+        ):
+            manager = core.DownloadManager(
+                lambda kind, job, payload: None, args.workers, log_dir=None
+            )
+            started = time.monotonic()
+            for url in urls:
+                manager.add_job(url, fake_command(url, out_dir), out_dir, start=False)
+            manager.schedule()
+            wait_idle(manager, 600)
+            elapsed = time.monotonic() - started
+            written = sum(
+                os.path.getsize(os.path.join(out_dir, name))
+                for name in os.listdir(out_dir)
+            )
+            failed = sum(job.status != "done" for job in manager.jobs.values())
+    finally:
+        server.shutdown()
+        server.server_close()
+    return {
+        "jobs": args.jobs,
+        "workers": args.workers,
+        "failed": failed,
+        "bytes": written,
+        "bytes_served": server.bytes_served,
+        "bytes_per_s": round(written / elapsed),
+        "wall_s": round(elapsed, 3),
+    }
+
+
+BENCHMARKS = {
+    "parser": bench_parser,
+    "ui_latency": bench_ui_latency,
+    "scheduler": bench_scheduler,
+    "e2e": bench_e2e,
+}
+
+
+def git_revision():
+    try:
+        result = subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            cwd=BENCH_DIR,
+            capture_output=True,
+            text=True,
+        )
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+
+def compare(old, new, threshold=REGRESSION_THRESHOLD):
+    """print metric changes, return the number of regressions
+
+    Metrics ending in _per_s are better when higher, _ns/_ms/_s ones when
+    lower; other values are informational.
+    """
+    regressions = 0
+    for name, metrics in new["benchmarks"].items():
+        baseline = old.get("benchmarks", {}).get(name, {})
+        for metric, value in metrics.items():
+            before = baseline.get(metric)
+            if not isinstance(value, (int, float)) or not before:
+                continue
+            if metric.endswith("_per_s"):
+                change = (before - value) / before
+            elif metric.endswith(("_ns", "_ms", "_s")):
+                change = (value - before) / before
+            else:
+                continue
+            flag = "REGRESSION" if change > threshold else ""
+            regressions += bool(flag)
+            print(f"{name}.{metric:24} {before:>12} -> {value:<12} {flag}")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the download engine.")
+    parser.add_argument(
+        "benchmarks",
+        nargs="*",
+        help=f"benchmarks to run: {', '.join(BENCHMARKS)} (default: all)",
+    )
+    parser.add_argument("-o", "--output", help="result file (default: bench/results/)")
+    parser.add_argument("--compare", help="earlier result file to compare with")
+    parser.add_argument("--workers", type=int, default=4, help="parallel jobs")
+    parser.add_argument("--jobs", type=int, default=40, help="jobs per run")
+    parser.add_argument(
+        "--size", type=int, default=8 * 1024 * 1024, help="bytes per download"
+    )
+    parser.add_argument(
+        "--lines", type=int, default=20000, help="lines per parser measurement"
+    )
+    parser.add_argument(
+        "--line-rate", type=int, default=2000, help="progress lines/s when flooding"
+    )
+    parser.add_argument(
+        "--noise", type=int, default=5, help="log lines per progress line when flooding"
+    )
+    parser.add_argument(
+        "--queue-size", type=int, default=10000, help="jobs in the scheduler scan"
+    )
+    args = parser.parse_args(argv)
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmark: {', '.join(sorted(unknown))}")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    names = args.benchmarks or list(BENCHMARKS)
+    result = {
+        "meta": {
+            "revision": git_revision(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "benchmarks": {},
+    }
+    for name in names:
+        print(f"running {name}...", file=sys.stderr)
+        result["benchmarks"][name] = BENCHMARKS[name](args)
+        print(json.dumps(result["benchmarks"][name]), file=sys.stderr)
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        output = os.path.join(RESULTS_DIR, f"bench-{stamp}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"results written to {output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(baseline, result):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,28 @@
+"""the bandwidth policy"""
+
+import pytest
+
+from ytdlp_core import BandwidthPolicy
+
+
+def test_bandwidth_share():
+    assert BandwidthPolicy().share(3) is None
+    assert BandwidthPolicy("3M").share(3) == 1024**2
+    assert BandwidthPolicy("3M").share(0) == 3 * 1024**2
+    assert BandwidthPolicy("", "500K").share(4) == 500 * 1024
+    assert BandwidthPolicy("4M", "500K").share(2) == 500 * 1024
+
+
+def test_bandwidth_profiles():
+    policy = BandwidthPolicy("1M", "", "00:00-23:59=0")
+    assert policy.share(2) is None
+    with pytest.raises(ValueError):
+        BandwidthPolicy("", "", "later=1M")
+
+
+@pytest.mark.parametrize(
+    "profiles", ["25:00-07:00=1M", "00:00-24:00=1M", "09:60-18:00=1M", "99:75-1:00=0"]
+)
+def test_bandwidth_profiles_reject_impossible_times(profiles):
+    with pytest.raises(ValueError):
+        BandwidthPolicy("", "", profiles)
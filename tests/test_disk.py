@@ -0,0 +1,160 @@
+"""disk space admission, the scratch directory and the sweeper"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from ytdlp_core import DISK_PROBE_BELOW, DiskPolicy, DownloadJob, expected_size
+
+FAKE_YTDLP = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "bench",
+    "fake_yt_dlp.py",
+)
+
+VIDEO = "https://www.youtube.com/watch?v=abcdefghijk"
+
+
+def old_file(path, age=7200):
+    with open(path, "w") as f:
+        f.write("x")
+    then = time.time() - age
+    os.utime(path, (then, then))
+
+
+def listing(directory):
+    return sorted(os.listdir(directory))
+
+
+def test_sweep_keeps_finished_files_when_scratch_is_the_library(tmp_path):
+    library = str(tmp_path)
+    old_file(os.path.join(library, "My Video [abcdefghijk].mp4"))
+    old_file(os.path.join(library, "My Video [abcdefghijk].mp4.part"))
+    files, _ = DiskPolicy().sweep({library + os.sep}, {library}, set())
+    assert files == 1
+    assert listing(library) == ["My Video [abcdefghijk].mp4"]
+
+
+def test_sweep_scratch_removes_partials_and_known_streams(tmp_path):
+    scratch = tmp_path / "scratch"
+    library = tmp_path / "library"
+    scratch.mkdir()
+    library.mkdir()
+    for name in [
+        "A [aaaaaaaaaaa].f137.mp4",
+        "B [bbbbbbbbbbb].f140.m4a",
+        "C [ccccccccccc].mp4.part",
+        "D [ddddddddddd].mp4.part",
+        "notes.txt.part",
+    ]:
+        old_file(scratch / name)
+    old_file(scratch / "E [eeeeeeeeeee].mp4.part", age=10)
+    streams = [str(scratch / "A [aaaaaaaaaaa].f137.mp4")]
+    owned = {"[ddddddddddd]"}
+    files, size = DiskPolicy().sweep({str(scratch)}, {str(library)}, owned, streams)
+    assert (files, size) == (2, 2)
+    assert listing(scratch) == [
+        "B [bbbbbbbbbbb].f140.m4a",
+        "D [ddddddddddd].mp4.part",
+        "E [eeeeeeeeeee].mp4.part",
+        "notes.txt.part",
+    ]
+
+
+def test_scratch_dir_must_not_hold_the_library(tmp_path):
+    library = tmp_path / "library"
+    with pytest.raises(ValueError):
+        DiskPolicy(str(tmp_path)).check_save_dir(str(library))
+    with pytest.raises(ValueError):
+        DiskPolicy(str(library) + os.sep).check_save_dir(str(library))
+    DiskPolicy(str(tmp_path / "scratch")).check_save_dir(str(library))
+    DiskPolicy().check_save_dir(str(library))
+
+
+def disk_job(directory, expected_bytes):
+    job = DownloadJob(1, VIDEO, ["yt-dlp", VIDEO], str(directory))
+    job.expected_bytes = expected_bytes
+    return job
+
+
+def test_claim_takes_space_from_the_budget(tmp_path):
+    policy = DiskPolicy(min_free="0")
+    job = disk_job(tmp_path, 600)
+    (disk,) = policy.needs(job)
+    budget = {disk: 1000}
+    assert policy.claim(job, budget)
+    assert budget == {disk: 400}
+    assert not policy.claim(disk_job(tmp_path, 600), budget)
+    assert budget == {disk: 400}
+    assert policy.claim(disk_job(tmp_path, 600), budget, force=True)
+    assert budget == {disk: -200}
+
+
+def test_claim_fills_the_budget_with_free_space(tmp_path):
+    policy = DiskPolicy(min_free="0")
+    assert policy.claim(disk_job(tmp_path, 0), {})
+    huge = disk_job(tmp_path, 1024**6)
+    assert not policy.claim(huge, {})
+
+
+def test_claim_counts_downloaded_bytes(tmp_path):
+    policy = DiskPolicy(min_free="0")
+    job = disk_job(tmp_path, 1000)
+    job.downloaded_bytes = 700
+    (disk,) = policy.needs(job)
+    budget = {disk: 500}
+    assert policy.claim(job, budget)
+    assert budget == {disk: 200}
+
+
+def test_must_probe_only_unknown_sizes_on_low_disks(tmp_path):
+    policy = DiskPolicy(min_free="0")
+    job = disk_job(tmp_path, None)
+    (disk,) = policy.needs(job)
+    assert policy.must_probe(job, {disk: DISK_PROBE_BELOW - 1})
+    assert not policy.must_probe(job, {disk: DISK_PROBE_BELOW})
+    job.expected_bytes = 0
+    assert not policy.must_probe(job, {disk: 0})
+
+
+def test_disk_policy_rejects_bad_sizes():
+    with pytest.raises(ValueError):
+        DiskPolicy(min_free="lots")
+
+
+def test_expected_size_sums_merged_formats():
+    info = {
+        "format_id": "137+140",
+        "requested_formats": [
+            {"format_id": "137", "vcodec": "avc1", "filesize": 800},
+            {"format_id": "140", "vcodec": "none", "filesize_approx": 200},
+        ],
+    }
+    assert expected_size(info) == 1000
+    assert expected_size(info, "Audio") == 200
+    info["requested_formats"][0]["filesize"] = None
+    assert expected_size(info) is None
+
+
+def test_expected_size_sums_every_download_of_a_split_selector():
+    video = {"format_id": "137", "vcodec": "avc1", "filesize": 800}
+    audio = {"format_id": "140", "vcodec": "none", "filesize": 200}
+    merged = {"format_id": "136+140", "requested_formats": [video, audio]}
+    # the top level is only the last download
+    info = dict(audio, requested_downloads=[video, audio])
+    assert expected_size(info) == 1000
+    info = dict(audio, requested_downloads=[merged, audio])
+    assert expected_size(info) == 1200
+
+
+@pytest.mark.parametrize("selector", ["bv*+ba/b", "(bv*,ba)/b"])
+def test_expected_size_of_fake_yt_dlp_probe(selector, monkeypatch):
+    monkeypatch.setenv("FAKE_YTDLP_SIZE", "1000")
+    probe = [sys.executable, FAKE_YTDLP, "-J", "-f", selector, VIDEO]
+    result = subprocess.run(probe, capture_output=True, text=True, check=True)
+    info = json.loads(result.stdout)
+    assert expected_size(info) == 1000
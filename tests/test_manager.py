@@ -0,0 +1,307 @@
+"""DownloadManager behaviour, with bench/fake_yt_dlp.py as yt-dlp"""
+
+import collections
+import os
+import stat
+import sys
+import threading
+import time
+
+import pytest
+
+from ytdlp_core import (
+    BandwidthPolicy,
+    DiskPolicy,
+    DownloadArchive,
+    DownloadManager,
+    RetryPolicy,
+    SidecarCache,
+    build_command,
+    host_key,
+)
+
+FAKE_YTDLP = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "bench",
+    "fake_yt_dlp.py",
+)
+
+
+def video(n):
+    return f"https://www.youtube.com/watch?v=video{n:06d}"
+
+
+def command(url, save_dir):
+    """build_command with the fake yt-dlp run by this interpreter"""
+    cmd = build_command("yt-dlp", url, str(save_dir), use_archive=False)
+    return [sys.executable, FAKE_YTDLP] + cmd[1:]
+
+
+def wait_for(predicate, timeout=20):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            pytest.fail("timed out")
+        time.sleep(0.02)
+
+
+class Recorder:
+    """status events of a manager and the most jobs seen running at once"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.statuses = {}
+        self.most_running = 0
+        self.most_per_host = collections.Counter()
+        self.manager = None
+
+    def __call__(self, kind, job, payload):
+        if kind != "status":
+            return
+        with self.lock:
+            self.statuses.setdefault(job.id, []).append(job.status)
+            running = self.manager.running_jobs()
+            self.most_running = max(self.most_running, len(running))
+            per_host = collections.Counter(host_key(job.url) for job in running)
+            self.most_per_host |= per_host
+
+
+@pytest.fixture
+def fake_env(monkeypatch):
+    monkeypatch.setenv("FAKE_YTDLP_EXTRACT_DELAY", "0")
+    monkeypatch.setenv("FAKE_YTDLP_LINE_RATE", "50")
+    monkeypatch.setenv("FAKE_YTDLP_SIZE", str(200 * 1024))
+    monkeypatch.setenv("FAKE_YTDLP_SPEED", str(1024**2))
+
+
+def new_manager(tmp_path, max_workers=2, sidecars=None):
+    recorder = Recorder()
+    manager = DownloadManager(
+        recorder, max_workers, log_dir=str(tmp_path / "logs"), sidecars=sidecars
+    )
+    manager.disk = DiskPolicy(min_free="0")
+    recorder.manager = manager
+    return manager, recorder
+
+
+def add(manager, url, save_dir, start=True):
+    # a known size, the scheduler never probes it
+    return manager.add_job(
+        url, command(url, save_dir), str(save_dir), start=start, expected_bytes=0
+    )
+
+
+def test_schedule_runs_at_most_max_workers(tmp_path, fake_env):
+    manager, recorder = new_manager(tmp_path, max_workers=2)
+    jobs = [add(manager, video(n), tmp_path, start=False) for n in range(5)]
+    manager.schedule()
+    wait_for(manager.is_idle)
+    assert recorder.most_running == 2
+    assert [job.status for job in jobs] == ["done"] * 5
+    for job in jobs:
+        assert os.path.getsize(job.output_path) == 200 * 1024
+        assert recorder.statuses[job.id][0] == "running"
+
+
+def test_at_least_one_worker(tmp_path):
+    manager = DownloadManager(Recorder(), 0, log_dir=None, post_workers=-2)
+    assert (manager.max_workers, manager.post_workers) == (1, 1)
+
+
+def test_set_max_workers_starts_waiting_jobs(tmp_path, fake_env):
+    manager, recorder = new_manager(tmp_path, max_workers=1)
+    jobs = [add(manager, video(n), tmp_path) for n in range(3)]
+    manager.set_max_workers(3)
+    wait_for(manager.is_idle)
+    assert recorder.most_running == 3
+    assert all(job.status == "done" for job in jobs)
+
+
+def test_transient_failure_is_retried_with_backoff(tmp_path, fake_env):
+    manager, recorder = new_manager(tmp_path)
+    manager.retry = RetryPolicy(max_retries=2, base_delay=0.2, jitter=0)
+    job = add(manager, "https://www.youtube.com/watch?v=failfail000", tmp_path)
+    wait_for(manager.is_idle)
+    assert job.status == "failed"
+    assert job.failure_category == "transient"
+    assert job.attempts == 2
+    # running, back in the queue, running again, ... until it gives up
+    statuses = [s for s in recorder.statuses[job.id] if s in ("running", "pending")]
+    assert statuses == ["running", "pending", "running", "pending", "running"]
+    log = "\n".join(job.log_lines)
+    assert "Retry 1/2" in log and "Retry 2/2" in log
+    assert "Gave up after 2 automatic retries" in log
+
+
+def test_failure_without_retries_fails_at_once(tmp_path, fake_env):
+    manager, recorder = new_manager(tmp_path)
+    manager.retry = RetryPolicy(max_retries=0)
+    job = add(manager, "https://www.youtube.com/watch?v=failfail000", tmp_path)
+    wait_for(manager.is_idle)
+    assert job.status == "failed"
+    assert job.attempts == 0
+    assert "pending" not in recorder.statuses[job.id]
+
+
+def test_host_limit_caps_jobs_per_site(tmp_path, fake_env):
+    manager, recorder = new_manager(tmp_path, max_workers=4)
+    manager.retry = RetryPolicy(host_limit=1)
+    urls = [video(n) for n in range(3)]
+    urls += [f"https://example.com/clip{n}.mp4" for n in range(2)]
+    jobs = [add(manager, url, tmp_path, start=False) for url in urls]
+    manager.schedule()
+    wait_for(manager.is_idle)
+    assert all(job.status == "done" for job in jobs)
+    assert recorder.most_per_host["youtube"] == 1
+    assert recorder.most_running == 2
+
+
+def recording_commands(manager):
+    """wrap command_for so the test sees the argument list of every run"""
+    commands = []
+    command_for = manager.command_for
+
+    def record(job):
+        cmd = command_for(job)
+        commands.append(cmd)
+        return cmd
+
+    manager.command_for = record
+    return commands
+
+
+def test_pause_keeps_partial_data_and_resume_continues(
+    tmp_path, fake_env, monkeypatch
+):
+    size = 4 * 1024**2
+    monkeypatch.setenv("FAKE_YTDLP_SIZE", str(size))
+    manager, recorder = new_manager(tmp_path)
+    commands = recording_commands(manager)
+    job = add(manager, video(1), tmp_path)
+    wait_for(lambda: (job.downloaded_bytes or 0) > size // 8)
+    manager.pause_job(job.id)
+    wait_for(lambda: job.status == "paused")
+    paused_at = job.downloaded_bytes
+    parts = [name for name in os.listdir(tmp_path) if name.endswith(".part")]
+    assert len(parts) == 1
+    assert os.path.getsize(tmp_path / parts[0]) >= paused_at
+    assert "--continue" not in commands[0]
+
+    manager.resume_job(job.id)
+    wait_for(lambda: job.status not in ("paused", "pending", "running"))
+    assert job.status == "done"
+    assert len(commands) == 2
+    assert "--continue" in commands[1]
+    assert os.path.getsize(job.output_path) == size
+    assert not any(name.endswith(".part") for name in os.listdir(tmp_path))
+    log = "\n".join(job.log_lines)
+    assert "Resuming download" in log
+
+
+def limit_rate(cmd):
+    return int(cmd[cmd.index("--limit-rate") + 1])
+
+
+def test_new_bandwidth_restarts_running_jobs_with_their_share(
+    tmp_path, fake_env, monkeypatch
+):
+    size = 6 * 1024**2
+    monkeypatch.setenv("FAKE_YTDLP_SIZE", str(size))
+    monkeypatch.setenv("FAKE_YTDLP_SPEED", str(100 * 1024**2))
+    manager, recorder = new_manager(tmp_path)
+    manager.bandwidth = BandwidthPolicy("2M")
+    commands = recording_commands(manager)
+    jobs = [add(manager, video(n), tmp_path, start=False) for n in range(2)]
+    manager.schedule()
+    wait_for(lambda: all((job.downloaded_bytes or 0) > 0 for job in jobs))
+    assert all(limit_rate(cmd) <= 2 * 1024**2 for cmd in commands)
+
+    manager.set_bandwidth(BandwidthPolicy("8M"))
+    wait_for(manager.is_idle)
+    assert all(job.status == "done" for job in jobs)
+    assert len(commands) == 4
+    for cmd in commands[2:]:
+        assert "--continue" in cmd
+        assert limit_rate(cmd) == 4 * 1024**2
+    for job in jobs:
+        assert os.path.getsize(job.output_path) == size
+        assert "restarting download with --continue" in "\n".join(job.log_lines)
+
+
+def add_sidecars(manager, urls, save_dir, keys=None):
+    jobs = manager.add_sidecars(
+        "yt-dlp", urls, str(save_dir), ["info"], start=False, keys=keys
+    )
+    for job in jobs:
+        job.cmd = [sys.executable, FAKE_YTDLP] + job.cmd[1:]
+    manager.schedule()
+    return jobs
+
+
+def test_unavailable_video_fails_only_its_sidecars(tmp_path, fake_env):
+    cache = SidecarCache(str(tmp_path / "sidecars.json"))
+    manager, recorder = new_manager(tmp_path, sidecars=cache)
+    saved = [video(1), "https://example.com/clip.mp4"]
+    missing = "https://www.youtube.com/watch?v=failfail000"
+    (job,) = add_sidecars(manager, saved + [missing], tmp_path)
+    wait_for(manager.is_idle)
+    assert job.status == "done"
+    assert job.urls == saved
+    (failed,) = [other for other in manager.jobs.values() if other is not job]
+    assert failed.kind == "sidecar"
+    assert failed.status == "failed"
+    assert failed.failure_category == "unavailable"
+    assert failed.urls == [missing]
+    assert failed.cmd[-1] == missing and saved[0] not in failed.cmd
+    # the key of the other site is known once its side-cars are saved
+    assert sorted(job.sidecar_keys) == sorted(saved)
+    assert len(cache.catalogue(list(job.sidecar_keys.values()))) == 2
+    assert add_sidecars(manager, saved, tmp_path, keys=job.sidecar_keys) == []
+    assert len(add_sidecars(manager, saved, tmp_path)) == 1
+    wait_for(manager.is_idle)
+
+
+def fake_ffmpeg(tmp_path, code=0):
+    """script writing an empty file at its last argument, the ffmpeg target"""
+    path = tmp_path / "ffmpeg"
+    path.write_text(f'#!/bin/sh\nfor target; do :; done\n: > "$target"\nexit {code}\n')
+    path.chmod(path.stat().st_mode | stat.S_IXUSR)
+    return str(path)
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="fake ffmpeg is a shell script")
+@pytest.mark.parametrize("code", [0, 1])
+def test_split_streams_are_archived_once_merged(tmp_path, fake_env, code):
+    manager, recorder = new_manager(tmp_path)
+    archive_path = tmp_path / "archive.txt"
+    manager.archive = DownloadArchive(str(archive_path))
+    commands = recording_commands(manager)
+    plan = {
+        "type": "Video",
+        "ffmpeg": fake_ffmpeg(tmp_path, code),
+        "selector": "(bv*,ba)/b",
+        "format": "mkv",
+    }
+    url = video(1)
+    cmd = build_command("yt-dlp", url, str(tmp_path), postprocess=plan)
+    assert "--download-archive" in cmd
+    job = manager.add_job(
+        url,
+        [sys.executable, FAKE_YTDLP] + cmd[1:],
+        str(tmp_path),
+        postprocess=plan,
+        expected_bytes=0,
+    )
+    wait_for(manager.is_idle)
+    # yt-dlp must not archive the video before the streams are merged
+    assert "--download-archive" not in commands[0]
+    assert len(job.streams) == 2
+    if code == 0:
+        assert job.status == "done"
+        assert job.output_path.endswith(".mkv")
+        assert archive_path.read_text() == "youtube video000001\n"
+        assert "youtube video000001" in manager.archive
+    else:
+        assert job.status == "failed"
+        assert not archive_path.exists()
+        assert "youtube video000001" not in manager.archive
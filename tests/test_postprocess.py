@@ -0,0 +1,56 @@
+"""ffmpeg commands of the post-processing pool"""
+
+from ytdlp_core import postprocess_commands
+
+VIDEO = "https://www.youtube.com/watch?v=abcdefghijk"
+
+
+def stream(path, format_id, ext, **fields):
+    return dict(filepath=path, format_id=format_id, ext=ext, **fields)
+
+
+VIDEO_PLAN = {"type": "Video", "ffmpeg": "ffmpeg", "selector": "bv,ba", "format": ""}
+
+
+def test_postprocess_merges_two_streams():
+    streams = [
+        stream("/d/V [x].f137.mp4", "137", "mp4"),
+        stream("/d/V [x].f140.m4a", "140", "m4a"),
+    ]
+    target, attempts = postprocess_commands(dict(VIDEO_PLAN, format="mp4"), streams)
+    assert target == "/d/V [x].mp4"
+    assert len(attempts) == 2
+    remux, encode = attempts
+    assert remux[-3:] == ["-c", "copy", target]
+    assert encode[-1] == target and "copy" not in encode
+    assert remux[remux.index("-map") :][:4] == ["-map", "0:v:0", "-map", "1:a:0"]
+
+
+def test_postprocess_single_stream_is_renamed():
+    streams = [stream("/d/V [x].f22.mp4", "22", "mp4")]
+    assert postprocess_commands(VIDEO_PLAN, streams) == ("/d/V [x].mp4", [])
+
+
+def test_postprocess_merge_defaults_to_mkv():
+    streams = [
+        stream("/d/V [x].f248.webm", "248", "webm"),
+        stream("/d/V [x].f251.webm", "251", "webm"),
+    ]
+    target, _ = postprocess_commands(VIDEO_PLAN, streams)
+    assert target == "/d/V [x].mkv"
+
+
+def test_postprocess_audio_conversion():
+    plan = {"type": "Audio", "ffmpeg": "ffmpeg", "format": "mp3", "audio_quality": "2"}
+    source = stream("/d/A [x].f251.webm", "251", "webm")
+    target, (cmd,) = postprocess_commands(plan, [source])
+    assert target == "/d/A [x].mp3"
+    assert cmd[-5:] == ["-c:a", "libmp3lame", "-q:a", "2", target]
+
+
+def test_postprocess_audio_copy_keeps_the_codec():
+    plan = {"type": "Audio", "ffmpeg": "ffmpeg", "format": "", "audio_quality": "0"}
+    source = stream("/d/A [x].f140.m4a", "140", "m4a")
+    target, (cmd,) = postprocess_commands(plan, [source])
+    assert target == "/d/A [x].m4a"
+    assert cmd[-3:] == ["-c:a", "copy", target]
@@ -0,0 +1,44 @@
+"""failure classification and the retry policy"""
+
+import pytest
+
+from ytdlp_core import RetryPolicy, classify_failure
+
+
+@pytest.mark.parametrize(
+    "error, category",
+    [
+        ("ERROR: unable to download video data: HTTP Error 429", "transient"),
+        ("ERROR: [youtube] x: Sign in to confirm you're not a bot", "auth"),
+        ("ERROR: This video is not available in your country", "geo"),
+        ("ERROR: [youtube] x: Video unavailable", "unavailable"),
+        ("ERROR: something odd", "unknown"),
+        (None, "unknown"),
+    ],
+)
+def test_classify_failure(error, category):
+    assert classify_failure(error) == category
+
+
+def test_retry_delay_backs_off_up_to_the_maximum():
+    policy = RetryPolicy(max_retries=10, base_delay=5, max_delay=60, jitter=0)
+    assert [policy.delay("transient", n) for n in range(5)] == [5, 10, 20, 40, 60]
+
+
+def test_retry_delay_gives_up():
+    policy = RetryPolicy(max_retries=2, base_delay=1, jitter=0)
+    assert policy.delay("transient", 2) is None
+    assert policy.delay("auth", 0) is None
+
+
+def test_retry_delay_jitter_stays_in_bounds():
+    policy = RetryPolicy(base_delay=10, jitter=0.3)
+    for _ in range(100):
+        assert 7 <= policy.delay("transient", 0) <= 13
+
+
+def test_retry_policy_rejects_bad_settings():
+    with pytest.raises(ValueError):
+        RetryPolicy(retry_on="transient,bogus")
+    with pytest.raises(ValueError):
+        RetryPolicy(max_retries=-1)
@@ -0,0 +1,79 @@
+"""URL normalization, bulk ingestion and playlist detection"""
+
+import pytest
+
+from ytdlp_core import ingest_urls, is_channel_url, is_playlist_url, normalize_url
+
+VIDEO = "https://www.youtube.com/watch?v=abcdefghijk"
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "https://youtu.be/abcdefghijk?si=xyz",
+        "https://m.youtube.com/watch?v=abcdefghijk&feature=share",
+        "https://www.youtube.com/shorts/abcdefghijk",
+        "https://music.youtube.com/watch?v=abcdefghijk&t=42",
+        VIDEO + ".",
+    ],
+)
+def test_normalize_youtube_variants(url):
+    assert normalize_url(url) == (VIDEO, "youtube abcdefghijk")
+
+
+def test_normalize_keeps_playlist_of_video():
+    url, key = normalize_url(VIDEO + "&list=PL123_ab&index=4&si=x")
+    assert url == VIDEO + "&list=PL123_ab"
+    assert key == "youtube abcdefghijk"
+    assert is_playlist_url(url)
+
+
+def test_normalize_playlist_and_bilibili_page():
+    assert normalize_url("https://www.youtube.com/playlist?list=PL1&si=a") == (
+        "https://www.youtube.com/playlist?list=PL1",
+        None,
+    )
+    url = "https://www.bilibili.com/video/BV1xx411c7mD?p=2&spm_id_from=333"
+    assert normalize_url(url) == (
+        "https://www.bilibili.com/video/BV1xx411c7mD?p=2",
+        "bilibili BV1xx411c7mD_p2",
+    )
+
+
+def test_normalize_keeps_site_params_of_unknown_hosts():
+    url, key = normalize_url("https://Example.com/page?from=2&ref=a&t=5&utm_source=x")
+    assert url == "https://example.com/page?from=2&ref=a&t=5"
+    assert key is None
+
+
+def test_ingest_dedupes_variants_and_known():
+    text = f"""
+    {VIDEO}
+    see https://youtu.be/abcdefghijk, and https://youtu.be/bbbbbbbbbbb
+    {VIDEO}&list=PL1
+    """
+    new, duplicates = ingest_urls(text, known={"youtube bbbbbbbbbbb"})
+    assert new == [
+        (VIDEO, "youtube abcdefghijk"),
+        (VIDEO + "&list=PL1", "youtube abcdefghijk"),
+    ]
+    assert duplicates == 2
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "https://www.youtube.com/@name/videos",
+        "https://www.youtube.com/channel/UCabcdef-123",
+        "https://www.youtube.com/c/name",
+        "https://space.bilibili.com/12345/video",
+    ],
+)
+def test_channel_urls_are_playlists(url):
+    assert is_channel_url(url)
+    assert is_playlist_url(url)
+
+
+def test_video_urls_are_no_playlists():
+    assert not is_playlist_url(VIDEO)
+    assert not is_playlist_url("https://www.bilibili.com/video/BV1xx411c7mD")
@@ -0,0 +1,3767 @@
+"""widget-free download engine shared by the GUI and the headless CLI"""
+
+import asyncio
+import codecs
+import concurrent.futures
+import importlib.util
+import itertools
+import subprocess
+import threading
+import re
+import os
+import sys
+import signal
+import json
+import collections
+import csv
+import errno
+import random
+import shutil
+import sqlite3
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+APP_DIR = os.path.join(os.path.expanduser("~"), ".yt-dlp-gui")
+QUEUE_FILE = os.path.join(APP_DIR, "queue.json")
+SETTINGS_FILE = os.path.join(APP_DIR, "settings.json")
+# same format as yt-dlp --download-archive: "<extractor> <video id>" per line
+ARCHIVE_FILE = os.path.join(APP_DIR, "archive.txt")
+LOG_DIR = os.path.join(APP_DIR, "logs")
+# one row per finished, failed or stopped job with its timing metrics
+HISTORY_FILE = os.path.join(APP_DIR, "history.sqlite3")
+# subtitles, thumbnails and info JSON fetched per video, see SidecarCache
+SIDECAR_FILE = os.path.join(APP_DIR, "sidecars.json")
+# lines kept in memory per job, the full log is on disk
+LOG_BUFFER_LINES = 2000
+LOG_FILE_MAX_BYTES = 5 * 1024 * 1024
+LOG_FILE_BACKUPS = 3
+INFO_CACHE_SIZE = 64
+# running jobs are restarted with a new --limit-rate only if their share
+# changed by more than this fraction and they ran for a while
+REBALANCE_THRESHOLD = 0.25
+REBALANCE_MIN_SECONDS = 30
+# ffmpeg conversions are CPU bound, run at most one per core
+POST_WORKERS = os.cpu_count() or 2
+# jobs wait while their expected size would leave less than min_free on a
+# disk, waiting jobs are checked again after DISK_RECHECK_SECONDS
+DISK_MIN_FREE = "1G"
+DISK_RECHECK_SECONDS = 30
+# jobs of unknown size are probed with `yt-dlp -J` (at most PROBE_WORKERS at
+# a time) before they start while a disk has less than this above min_free
+DISK_PROBE_BELOW = 20 * 1024**3
+PROBE_WORKERS = 2
+# options of a download command that select the formats, kept by the probe
+FORMAT_SELECTION_OPTIONS = ("-f", "--format", "-S", "--format-sort")
+# orphaned partial files untouched for SWEEP_MIN_AGE seconds are removed
+# every SWEEP_INTERVAL seconds
+SWEEP_INTERVAL = 600
+SWEEP_MIN_AGE = 3600
+# instrumentation: seconds between samples and samples kept per sparkline
+METRICS_INTERVAL = 1.0
+METRICS_POINTS = 120
+METRICS_PORT = 9464
+# CPU and memory of child processes are read from /proc (Linux only)
+PROC_AVAILABLE = os.path.isdir("/proc/self/task")
+try:
+    CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+    PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+except (AttributeError, ValueError, OSError):
+    CLOCK_TICKS, PAGE_SIZE = 100, 4096
+
+# machine readable progress: yt-dlp prints one JSON object per progress
+# update and the final path after all post-processing, each behind a marker
+PROGRESS_PREFIX = "[gui-progress] "
+FILEPATH_PREFIX = "[gui-filepath] "
+PROGRESS_FIELDS = (
+    "status",
+    "downloaded_bytes",
+    "total_bytes",
+    "total_bytes_estimate",
+    "speed",
+    "eta",
+    "fragment_index",
+    "fragment_count",
+)
+PROGRESS_TEMPLATE = (
+    "download:" + PROGRESS_PREFIX + "%(progress.{" + ",".join(PROGRESS_FIELDS) + "})j"
+)
+FILEPATH_TEMPLATE = "after_move:" + FILEPATH_PREFIX + "%(filepath)s"
+# printed once extraction is done, ends the "extract" part of the run time
+INFO_PREFIX = "[gui-info] "
+INFO_TEMPLATE = "pre_process:" + INFO_PREFIX + "%(.{extractor_key,id})j"
+# raw streams of a download whose post-processing runs in the GUI's own pool
+STREAM_PREFIX = "[gui-stream] "
+STREAM_TEMPLATE = (
+    "after_move:" + STREAM_PREFIX + "%(.{filepath,format_id,ext,duration})j"
+)
+# one line per video of a side-car job: a metadata summary, then the lists of
+# subtitle, thumbnail and info JSON files written, tab separated
+SIDECAR_PREFIX = "[gui-sidecar] "
+SIDECAR_TEMPLATE = (
+    "after_video:"
+    + SIDECAR_PREFIX
+    + "%(.{id,extractor_key,title,uploader,upload_date,duration,webpage_url,"
+    "original_url})j"
+    + "\t%(requested_subtitles.:.filepath)j"
+    + "\t%(thumbnails.:.filepath)j"
+    + "\t%(requested_downloads.:.infojson_filename)j"
+)
+# key=value lines of `ffmpeg -progress pipe:1`
+FFMPEG_PROGRESS_RE = re.compile(r"^\w+=\S*$")
+# warm yt_dlp workers of the "python" backend, see ytdlp_worker.py: one line
+# when a worker is ready and one after each download with its exit code
+WORKER_SCRIPT = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "ytdlp_worker.py"
+)
+READY_PREFIX = "[gui-ready] "
+EXIT_PREFIX = "[gui-exit] "
+# idle workers are shut down after this many seconds
+WORKER_IDLE_TIMEOUT = 300
+# child output is split into lines like text mode pipes do
+LINE_BREAK_RE = re.compile(r"\r\n|\r|\n")
+PIPE_READ_SIZE = 64 * 1024
+# seconds a process gets to exit after SIGTERM before it is killed
+TERMINATE_TIMEOUT = 2
+
+
+OUTPUT_TEMPLATE = "%(title)s [%(id)s].%(ext)s"
+# each stream is kept apart until the post-processing pool merges them
+STREAM_OUTPUT_TEMPLATE = "%(title)s [%(id)s].f%(format_id)s.%(ext)s"
+# files yt-dlp writes before a download is complete
+PARTIAL_FILE_RE = re.compile(
+    r"\.(part|ytdl|aria2)$|\.part-Frag\d+(\.part)?$|\.temp\.\w+$"
+)
+# the "[<video id>]." in the names of both output templates
+OUTPUT_ID_RE = re.compile(r"\[[\w-]+\]\.")
+
+VIDEO_QUALITIES = {
+    "Auto (Best Quality)": "",
+    "Best Quality (best)": "-f best",
+    "1080p": '-f "bestvideo[height<=1080]+bestaudio/best[height<=1080]"',
+    "720p": '-f "bestvideo[height<=720]+bestaudio/best[height<=720]"',
+    "480p": '-f "bestvideo[height<=480]+bestaudio/best[height<=480]"',
+    "360p": '-f "bestvideo[height<=360]+bestaudio/best[height<=360]"',
+    "Only Video (No Audio)": "-f bestvideo",
+    "Only Audio Extraction": "-f bestaudio",
+}
+AUDIO_QUALITIES = {
+    "Auto (Best Quality)": "--audio-quality 0",
+    "Best Quality (320k)": "--audio-quality 0",
+    "High Quality (256k)": "--audio-quality 2",
+    "Standard Quality (192k)": "--audio-quality 3",
+    "Medium Quality (128k)": "--audio-quality 5",
+    "Low Quality (96k)": "--audio-quality 7",
+}
+VIDEO_FORMATS = ["mp4", "webm", "mkv", "mov", "avi"]
+AUDIO_FORMATS = ["mp3", "m4a", "wav", "flac", "opus"]
+# ffmpeg encoders and --audio-quality equivalents for audio extraction
+AUDIO_CODECS = {
+    "mp3": "libmp3lame",
+    "m4a": "aac",
+    "wav": "pcm_s16le",
+    "flac": "flac",
+    "opus": "libopus",
+}
+AUDIO_BITRATES = {"0": "320k", "2": "256k", "3": "192k", "5": "128k", "7": "96k"}
+
+# named download presets, "sites" are host keys (see host_key) the preset is
+# picked for when presets are chosen by site
+PRESETS = {
+    "YouTube 1080p mp4": {
+        "type": "Video",
+        "quality": "1080p",
+        "format": "mp4",
+        "sites": ["youtube"],
+    },
+    "BiliBili 1080p mkv": {
+        "type": "Video",
+        "quality": "1080p",
+        "format": "mkv",
+        "sites": ["bilibili"],
+    },
+    "YouTube podcast opus": {
+        "type": "Audio",
+        "quality": "Medium Quality (128k)",
+        "format": "opus",
+        "sites": [],
+    },
+    "Music mp3 320k": {
+        "type": "Audio",
+        "quality": "Best Quality (320k)",
+        "format": "mp3",
+        "sites": [],
+    },
+}
+# preset choices that are not presets: the option widgets as they are, and
+# the preset of each URL's site with the widgets as fallback
+CUSTOM_PRESET = "Custom"
+AUTO_PRESET = "Auto (by site)"
+
+# side-car assets are fetched with --skip-download, SIDECAR_BATCH URLs per
+# yt-dlp run, on SIDECAR_WORKERS slots of their own next to the media jobs
+SIDECAR_OPTIONS = {
+    "subtitles": ["--write-subs", "--write-auto-subs"],
+    "thumbnail": ["--write-thumbnail"],
+    "info": ["--write-info-json"],
+}
+SUB_LANGS = "en.*"
+SIDECAR_BATCH = 50
+SIDECAR_WORKERS = 2
+CATALOGUE_FIELDS = [
+    "key",
+    "title",
+    "uploader",
+    "upload_date",
+    "duration",
+    "webpage_url",
+    "files",
+]
+
+# download engine: fragment concurrency, chunking and external downloader,
+# "auto" values are taken from the preset of the site being downloaded
+DOWNLOADERS = ["native", "aria2c"]
+# "executable" starts yt-dlp for every job, "python" runs jobs in warm
+# worker processes with the yt_dlp package
+BACKENDS = ["executable", "python"]
+ENGINE_DEFAULTS = {
+    "concurrent_fragments": "auto",
+    "http_chunk_size": "auto",
+    "downloader": "native",
+    "connections": 8,
+    "backend": "executable",
+}
+ENGINE_PRESETS = {
+    # YouTube throttles long unchunked requests, DASH fragments are small
+    "youtube": {"concurrent_fragments": 4, "http_chunk_size": "10M"},
+    # BiliBili serves large DASH segments from slow CDN nodes
+    "bilibili": {"concurrent_fragments": 8, "http_chunk_size": ""},
+    "generic": {"concurrent_fragments": 4, "http_chunk_size": ""},
+}
+
+YTDLP_CANDIDATES = [
+    "yt-dlp.exe",
+    "yt-dlp",
+    os.path.expanduser("~/yt-dlp.exe"),
+    os.path.expanduser("~/yt-dlp"),
+    "/usr/local/bin/yt-dlp",
+    "/usr/bin/yt-dlp",
+    "C:/yt-dlp/yt-dlp.exe",
+]
+
+settings_lock = threading.Lock()
+
+
+def load_settings():
+    try:
+        with open(SETTINGS_FILE, "r", encoding="utf-8") as f:
+            settings = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return settings if isinstance(settings, dict) else {}
+
+
+def update_settings(**values):
+    """merge values into the settings file, safe to call from any thread"""
+    with settings_lock:
+        settings = load_settings()
+        settings.update(values)
+        os.makedirs(APP_DIR, exist_ok=True)
+        tmp_path = SETTINGS_FILE + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(settings, f, indent=2)
+        os.replace(tmp_path, SETTINGS_FILE)
+
+
+def find_ytdlp():
+    """locate yt-dlp without running it, PATH lookup first"""
+    found = shutil.which("yt-dlp")
+    if found:
+        return found
+    for path in YTDLP_CANDIDATES:
+        if os.path.isfile(path):
+            return os.path.abspath(path)
+    return None
+
+
+def probe_ytdlp(path):
+    """run `yt-dlp --version`, return (version, mtime) or None"""
+    try:
+        mtime = os.path.getmtime(path)
+        result = subprocess.run(
+            [path, "--version"], capture_output=True, text=True, timeout=60
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    if result.returncode != 0:
+        return None
+    return result.stdout.strip(), mtime
+
+
+def cached_ytdlp():
+    """cached yt-dlp entry if the binary has not changed since it was probed"""
+    cache = load_settings().get("ytdlp") or {}
+    path = cache.get("path")
+    try:
+        if path and os.path.getmtime(path) == cache.get("mtime"):
+            return cache
+    except OSError:
+        pass
+    return None
+
+
+YOUTUBE_ID_RE = re.compile(
+    r"(?:youtube\.com/(?:watch\?(?:.*&)?v=|shorts/|embed/|live/)|youtu\.be/)"
+    r"([0-9A-Za-z_-]{11})"
+)
+BILIBILI_ID_RE = re.compile(r"bilibili\.com/video/(BV[0-9A-Za-z]{10})")
+BILIBILI_PAGE_RE = re.compile(r"[?&]p=(\d+)")
+YOUTUBE_PLAYLIST_RE = re.compile(r"youtube\.com/.*[?&]list=([0-9A-Za-z_-]+)")
+PLAYLIST_RE = re.compile(r"playlist|list=|album=|page=", re.IGNORECASE)
+# channel pages, their uploads are listed like a playlist
+CHANNEL_RE = re.compile(
+    r"youtube\.com/(?:@[^/?#]+|channel/UC[\w-]+|c/[^/?#]+|user/[^/?#]+)"
+    r"|space\.bilibili\.com/\d+",
+    re.IGNORECASE,
+)
+# URLs in pasted text or files, trailing punctuation is stripped afterwards
+URL_RE = re.compile(r"https?://[^\s<>\"'`]+", re.IGNORECASE)
+# query parameters that never change which page a URL points to
+TRACKING_PARAM_RE = re.compile(r"^(utm_\w+|fbclid|gclid|igshid)$")
+# more of them on sites whose URLs are known, elsewhere "from", "ref" or "t"
+# may select the content
+SITE_TRACKING_PARAMS = {
+    "youtube.com": re.compile(r"^(si|feature|pp|t)$"),
+    "youtu.be": re.compile(r"^(si|feature|t)$"),
+    "bilibili.com": re.compile(
+        r"^(spm_id_from|vd_source|share_\w+|from_spmid|from|ref|ref_src)$"
+    ),
+}
+
+
+RATE_RE = re.compile(r"^(\d+(?:\.\d+)?)\s*([KMG]?)(?:i?B)?(?:/s)?$", re.IGNORECASE)
+RATE_PROFILE_RE = re.compile(r"^(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*=\s*(.*)$")
+RATE_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3}
+
+
+def parse_rate(text):
+    """bytes per second from "500K", "2.5M" etc., None means unlimited"""
+    text = (text or "").strip()
+    if not text or text.lower() == "unlimited":
+        return None
+    match = RATE_RE.match(text)
+    if not match:
+        raise ValueError(f"invalid rate: {text}")
+    rate = float(match.group(1)) * RATE_UNITS[match.group(2).upper()]
+    return int(rate) or None
+
+
+def format_rate(rate):
+    return f"{format_size(rate)}/s" if rate else "unlimited"
+
+
+def parse_size(text):
+    """bytes from "500M", "2G" etc., None if empty"""
+    try:
+        return parse_rate(text)
+    except ValueError:
+        raise ValueError(f"invalid size: {text.strip()}")
+
+
+def existing_parent(path):
+    """path or its nearest existing parent directory"""
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return path
+
+
+def same_or_inside(path, directory):
+    """whether path is directory or below it, after resolving symlinks"""
+    path = os.path.realpath(os.path.expanduser(path))
+    directory = os.path.realpath(os.path.expanduser(directory))
+    try:
+        return os.path.commonpath([path, directory]) == directory
+    except ValueError:
+        # different drives on Windows
+        return False
+
+
+def free_space(path):
+    """free bytes on the disk of path, infinite if it cannot be checked"""
+    try:
+        return shutil.disk_usage(existing_parent(path)).free
+    except OSError:
+        return float("inf")
+
+
+def move_to_library(path, save_dir):
+    """move a finished file from the scratch directory into save_dir
+
+    The file only shows up in save_dir once complete: a rename on the same
+    disk, otherwise a copy to a hidden name that is renamed at the end.
+    Returns the new path.
+    """
+    os.makedirs(save_dir, exist_ok=True)
+    target = os.path.join(save_dir, os.path.basename(path))
+    if os.path.abspath(path) == os.path.abspath(target):
+        return target
+    try:
+        os.replace(path, target)
+        return target
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+    partial = os.path.join(save_dir, f".{os.path.basename(path)}.moving")
+    try:
+        shutil.copyfile(path, partial)
+        shutil.copystat(path, partial)
+        os.replace(partial, target)
+    except OSError:
+        try:
+            os.remove(partial)
+        except OSError:
+            pass
+        raise
+    os.remove(path)
+    return target
+
+
+class DiskPolicy:
+    """free space admission and the scratch directory of unfinished files
+
+    Jobs downloading to scratch_dir (empty = the download directory) are
+    moved to their download directory once finished. A job only starts if
+    its expected size leaves min_free on the disks it writes to, next to
+    what the running jobs still need.
+    """
+
+    def __init__(self, scratch_dir="", min_free=DISK_MIN_FREE, sweep_age=SWEEP_MIN_AGE):
+        self.scratch_dir = os.path.expanduser((scratch_dir or "").strip())
+        self.min_free = parse_size(min_free) or 0
+        try:
+            self.sweep_age = float(sweep_age)
+        except (TypeError, ValueError):
+            raise ValueError("sweep age must be a number")
+        self.settings = {
+            "scratch_dir": self.scratch_dir,
+            "min_free": min_free,
+            "sweep_age": self.sweep_age,
+        }
+
+    @classmethod
+    def from_settings(cls, settings):
+        try:
+            return cls(**(settings or {}))
+        except (TypeError, ValueError):
+            return cls()
+
+    def check_save_dir(self, save_dir):
+        """raise ValueError if the scratch directory is save_dir or holds it
+
+        Finished files there could not be told apart from leftovers.
+        """
+        if self.scratch_dir and save_dir and same_or_inside(save_dir, self.scratch_dir):
+            raise ValueError(
+                "the scratch directory must not be the download directory "
+                "or contain it"
+            )
+
+    def needs(self, job):
+        """{disk: (directory, bytes)} a job still has to write"""
+        size = job.remaining_bytes()
+        if size is None and job.expected_bytes:
+            size = max(0, job.expected_bytes - (job.downloaded_bytes or 0))
+        needs = {}
+        for directory in (job.scratch_dir or job.save_dir, job.save_dir):
+            try:
+                disk = os.stat(existing_parent(directory)).st_dev
+            except OSError:
+                continue
+            # moving within one disk is a rename
+            needs.setdefault(disk, (directory, size or 0))
+        return needs
+
+    def fill(self, budget, needs):
+        for disk, (directory, _) in needs.items():
+            if disk not in budget:
+                budget[disk] = free_space(directory) - self.min_free
+
+    def claim(self, job, budget, force=False):
+        """take the space job needs from budget, False if there is too little
+
+        budget maps disks to free bytes above min_free and is filled on first
+        use. force takes the space anyway, for jobs that already run.
+        """
+        needs = self.needs(job)
+        self.fill(budget, needs)
+        if not force and any(budget[d] < size for d, (_, size) in needs.items()):
+            return False
+        for disk, (_, size) in needs.items():
+            budget[disk] -= size
+        return True
+
+    def must_probe(self, job, budget):
+        """whether job's size is unknown while its disks run low"""
+        if job.expected_bytes is not None or job.remaining_bytes() is not None:
+            return False
+        needs = self.needs(job)
+        self.fill(budget, needs)
+        return any(budget[disk] < DISK_PROBE_BELOW for disk in needs)
+
+    def sweep(self, scratch_dirs, save_dirs, owned, streams=(), now=None):
+        """remove partial files not owned by a job, return (files, bytes)
+
+        Only unfinished files named by the output templates are touched, and
+        in scratch_dirs the raw streams listed in streams. owned holds the
+        "[<video id>]" of jobs that may still use their files.
+        """
+        cutoff = (now or time.time()) - self.sweep_age
+        files = size = 0
+        save_dirs = {os.path.realpath(d) for d in save_dirs}
+        # a scratch dir holding a download directory holds finished files too
+        scratch_dirs = {
+            directory
+            for directory in map(os.path.realpath, scratch_dirs)
+            if not any(same_or_inside(d, directory) for d in save_dirs)
+        }
+        streams = {os.path.realpath(path) for path in streams}
+        for directory in sorted(scratch_dirs | save_dirs):
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                name = entry.name
+                if not OUTPUT_ID_RE.search(name):
+                    continue
+                if not PARTIAL_FILE_RE.search(name) and not (
+                    directory in scratch_dirs
+                    and os.path.join(directory, name) in streams
+                ):
+                    continue
+                if any(tag in name for tag in owned):
+                    continue
+                try:
+                    stat = entry.stat(follow_symlinks=False)
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+                    if stat.st_mtime > cutoff:
+                        continue
+                    os.remove(entry.path)
+                except OSError:
+                    continue
+                files += 1
+                size += stat.st_size
+        return files, size
+
+
+class BandwidthPolicy:
+    """global bandwidth budget shared fairly by the running jobs
+
+    profiles is a comma separated list like "00:00-07:00=0, 09:00-18:00=2M"
+    that replaces the global limit during those hours (0 = unlimited).
+    """
+
+    def __init__(self, global_limit="", job_limit="", profiles=""):
+        self.global_limit = parse_rate(global_limit)
+        self.job_limit = parse_rate(job_limit)
+        self.profiles = self.parse_profiles(profiles)
+        self.settings = {
+            "global_limit": global_limit,
+            "job_limit": job_limit,
+            "profiles": profiles,
+        }
+
+    @staticmethod
+    def parse_profiles(text):
+        profiles = []
+        for item in (text or "").split(","):
+            if not item.strip():
+                continue
+            match = RATE_PROFILE_RE.match(item.strip())
+            if not match:
+                raise ValueError(f"invalid time profile: {item.strip()}")
+            h1, m1, h2, m2, rate = match.groups()
+            if max(int(h1), int(h2)) > 23 or max(int(m1), int(m2)) > 59:
+                raise ValueError(f"invalid time in profile: {item.strip()}")
+            start = int(h1) * 60 + int(m1)
+            end = int(h2) * 60 + int(m2)
+            profiles.append((start, end, parse_rate(rate)))
+        return profiles
+
+    @classmethod
+    def from_settings(cls, settings):
+        try:
+            return cls(**(settings or {}))
+        except (TypeError, ValueError):
+            return cls()
+
+    def is_limited(self):
+        return bool(self.global_limit or self.job_limit or self.profiles)
+
+    def global_limit_at(self, now=None):
+        local = time.localtime(now)
+        minute = local.tm_hour * 60 + local.tm_min
+        for start, end, rate in self.profiles:
+            if start <= end:
+                active = start <= minute < end
+            else:  # over midnight
+                active = minute >= start or minute < end
+            if active:
+                return rate
+        return self.global_limit
+
+    def share(self, active_jobs):
+        """--limit-rate for each of active_jobs, None means unlimited"""
+        total = self.global_limit_at()
+        rate = total / max(1, active_jobs) if total else None
+        if self.job_limit:
+            rate = min(rate, self.job_limit) if rate else self.job_limit
+        return int(rate) if rate else None
+
+
+# failure classes, checked in this order against the last ERROR line of a run
+FAILURE_PATTERNS = [
+    (
+        "auth",
+        re.compile(
+            r"sign in to confirm|login required|\blog ?in\b|--cookies|members[- ]only"
+            r"|private video|this video is private|premium",
+            re.IGNORECASE,
+        ),
+    ),
+    (
+        "geo",
+        re.compile(
+            r"available (in|from) your (country|location)|geo[- ]?restrict"
+            r"|blocked it in your country",
+            re.IGNORECASE,
+        ),
+    ),
+    (
+        "unavailable",
+        re.compile(
+            r"video unavailable|has been removed|no longer available|does not exist"
+            r"|unsupported url|http error 404|copyright",
+            re.IGNORECASE,
+        ),
+    ),
+    (
+        "transient",
+        re.compile(
+            r"http error (403|412|429|5\d\d)|too many requests|rate[- ]limit"
+            r"|timed out|timeout|connection (reset|refused|aborted)|incompleteread"
+            r"|giving up after|unable to download (fragment|video data)"
+            r"|fragment \d+ not found|temporary failure|network is unreachable",
+            re.IGNORECASE,
+        ),
+    ),
+]
+FAILURE_LABELS = {
+    "transient": "Temporary error",
+    "auth": "Login required",
+    "geo": "Geo-restricted",
+    "unavailable": "Video unavailable",
+    "unknown": "Download failed",
+}
+
+
+def classify_failure(error):
+    """transient / auth / geo / unavailable / unknown for an ERROR line"""
+    for category, pattern in FAILURE_PATTERNS:
+        if error and pattern.search(error):
+            return category
+    return "unknown"
+
+
+def host_key(url):
+    """sites with several domains share one per-host concurrency slot"""
+    extractor = extractor_for_url(url)
+    if extractor != "generic":
+        return extractor
+    host = (urlparse(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+class RetryPolicy:
+    """automatic retries with exponential backoff and per-host job caps
+
+    retry_on is a comma separated list of failure classes that are retried,
+    host_limit caps the running jobs per site (0 = unlimited).
+    """
+
+    def __init__(
+        self,
+        max_retries=3,
+        base_delay=5,
+        max_delay=300,
+        jitter=0.3,
+        host_limit=0,
+        retry_on="transient",
+    ):
+        try:
+            self.max_retries = int(max_retries)
+            self.base_delay = float(base_delay)
+            self.max_delay = float(max_delay)
+            self.jitter = float(jitter)
+            self.host_limit = int(host_limit)
+        except (TypeError, ValueError):
+            raise ValueError("retry settings must be numbers")
+        if min(self.max_retries, self.base_delay, self.max_delay, self.host_limit) < 0:
+            raise ValueError("retry settings must not be negative")
+        self.retry_on = {c.strip() for c in retry_on.split(",") if c.strip()}
+        unknown = self.retry_on - set(FAILURE_LABELS)
+        if unknown:
+            raise ValueError(f"unknown failure class: {', '.join(sorted(unknown))}")
+        self.settings = {
+            "max_retries": self.max_retries,
+            "base_delay": self.base_delay,
+            "max_delay": self.max_delay,
+            "jitter": self.jitter,
+            "host_limit": self.host_limit,
+            "retry_on": ",".join(sorted(self.retry_on)),
+        }
+
+    @classmethod
+    def from_settings(cls, settings):
+        try:
+            return cls(**(settings or {}))
+        except (TypeError, ValueError):
+            return cls()
+
+    def delay(self, category, attempts):
+        """seconds before the next attempt, None if the job should fail"""
+        if category not in self.retry_on or attempts >= self.max_retries:
+            return None
+        delay = min(self.max_delay, self.base_delay * 2**attempts)
+        return delay * (1 + random.uniform(-self.jitter, self.jitter))
+
+
+def rates_differ(old, new):
+    if not old or not new:
+        return bool(old) != bool(new)
+    return abs(old - new) / max(old, new) > REBALANCE_THRESHOLD
+
+
+def archive_key(extractor, video_id):
+    if not extractor or not video_id:
+        return None
+    return f"{extractor.lower()} {video_id}"
+
+
+def archive_key_from_url(url):
+    """archive key of well known video URLs without asking the extractor"""
+    match = YOUTUBE_ID_RE.search(url)
+    if match:
+        return archive_key("youtube", match.group(1))
+    match = BILIBILI_ID_RE.search(url)
+    if match:
+        page = BILIBILI_PAGE_RE.search(url)
+        if page and page.group(1) != "1":
+            return archive_key("bilibili", f"{match.group(1)}_p{page.group(1)}")
+        return archive_key("bilibili", match.group(1))
+    return None
+
+
+def is_channel_url(url):
+    return CHANNEL_RE.search(url) is not None
+
+
+def is_playlist_url(url):
+    """playlist or channel URL, something fetch_playlist can list"""
+    return PLAYLIST_RE.search(url) is not None or is_channel_url(url)
+
+
+def normalize_url(url):
+    """return (canonical URL, archive key or None)
+
+    youtu.be, m./music.youtube.com, shorts and tracking parameter variants
+    of the same video all map to the same canonical URL. The playlist of a
+    YouTube video URL (list=) is kept.
+    """
+    url = url.rstrip(".,;:!?)]}>'\"")
+    key = archive_key_from_url(url)
+    playlist = YOUTUBE_PLAYLIST_RE.search(url)
+    if key:
+        extractor, video_id = key.split(" ", 1)
+        if extractor == "youtube":
+            canonical = f"https://www.youtube.com/watch?v={video_id}"
+            # the video of a playlist, --playlist still expands it
+            if playlist:
+                canonical += f"&list={playlist.group(1)}"
+            return canonical, key
+        video_id, _, page = video_id.partition("_p")
+        canonical = f"https://www.bilibili.com/video/{video_id}"
+        return canonical + (f"?p={page}" if page else ""), key
+    if playlist:
+        return f"https://www.youtube.com/playlist?list={playlist.group(1)}", None
+    parts = urlparse(url)
+    host = parts.netloc.lower().rsplit("@", 1)[-1].split(":", 1)[0]
+    site_params = [
+        params
+        for domain, params in SITE_TRACKING_PARAMS.items()
+        if host == domain or host.endswith("." + domain)
+    ]
+    query = [
+        (name, value)
+        for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not TRACKING_PARAM_RE.match(name)
+        and not any(params.match(name) for params in site_params)
+    ]
+    canonical = urlunparse(
+        (
+            parts.scheme.lower(),
+            parts.netloc.lower(),
+            parts.path or "/",
+            parts.params,
+            urlencode(query),
+            "",
+        )
+    )
+    return canonical, None
+
+
+def ingest_urls(text, known=()):
+    """split pasted text into new and duplicate URLs
+
+    Returns ([(canonical URL, archive key), ...], duplicate count). known
+    holds archive keys and canonical URLs that are already queued or done.
+    """
+    seen = set(known)
+    new = []
+    duplicates = 0
+    for url in URL_RE.findall(text):
+        url, key = normalize_url(url)
+        # a video in a playlist is not the same input as the video alone
+        ident = url if is_playlist_url(url) else key or url
+        if ident in seen:
+            duplicates += 1
+            continue
+        seen.add(ident)
+        new.append((url, key))
+    return new, duplicates
+
+
+def quality_option(download_type, quality, extra_choices=None):
+    """get quality parameter for yt-dlp based on selection"""
+    if extra_choices and quality in extra_choices:
+        return extra_choices[quality]
+    if download_type == "Video":
+        return VIDEO_QUALITIES.get(quality, "")
+    return AUDIO_QUALITIES.get(quality, "")
+
+
+def format_option(download_type, output_format):
+    """get output format parameter"""
+    if download_type == "Video":
+        # video: use --remux-video or --merge-output-format to ensure output format
+        if output_format:
+            return f"--merge-output-format {output_format}"
+        return ""
+    else:
+        # Audio: use --audio-format
+        if output_format:
+            return f"--extract-audio --audio-format {output_format}"
+        return "--extract-audio"
+
+
+def split_option(option):
+    """split an option string, text in double quotes stays one argument"""
+    args = []
+    if '"' in option:
+        parts = option.split('"')
+        for i, part in enumerate(parts):
+            if i % 2 == 0:
+                if part.strip():
+                    args.extend(part.strip().split())
+            else:
+                args.append(part)
+    else:
+        args.extend(option.split())
+    return args
+
+
+def option_value(args, name):
+    """value following name in an argument list, or None"""
+    if name in args[:-1]:
+        return args[args.index(name) + 1]
+    return None
+
+
+def split_format_selector(selector):
+    """download the parts of "video+audio" selectors as separate streams
+
+    "bv[height<=720]+ba/b" becomes "(bv[height<=720],ba)/b", yt-dlp then
+    saves each stream and leaves merging to the post-processing pool.
+    """
+    alternatives = []
+    for alternative in (selector or "bv*+ba/b").split("/"):
+        if "+" in alternative:
+            alternative = "(" + alternative.replace("+", ",") + ")"
+        alternatives.append(alternative)
+    return "/".join(alternatives)
+
+
+def find_ffmpeg():
+    return shutil.which("ffmpeg")
+
+
+def postprocess_plan(download_type, quality, output_format, quality_choices=None):
+    """ffmpeg work to run in the post-processing pool instead of in yt-dlp
+
+    Returns None if ffmpeg is not on PATH, yt-dlp then post-processes the
+    download itself as before.
+    """
+    ffmpeg = find_ffmpeg()
+    if not ffmpeg:
+        return None
+    args = split_option(quality_option(download_type, quality, quality_choices))
+    selector = option_value(args, "-f")
+    if download_type == "Video":
+        return {
+            "type": "Video",
+            "ffmpeg": ffmpeg,
+            "selector": split_format_selector(selector),
+            "format": output_format,
+        }
+    return {
+        "type": "Audio",
+        "ffmpeg": ffmpeg,
+        "selector": selector or "bestaudio/best",
+        "format": output_format,
+        "audio_quality": option_value(args, "--audio-quality") or "0",
+    }
+
+
+def stream_base(stream):
+    """path of a downloaded stream without its ".f<format id>.<ext>" suffix"""
+    path = stream["filepath"]
+    suffix = f".f{stream.get('format_id')}.{stream.get('ext')}"
+    if path.endswith(suffix):
+        return path[: -len(suffix)]
+    return os.path.splitext(path)[0]
+
+
+def postprocess_commands(plan, streams):
+    """return (final path, ffmpeg commands to try in order)
+
+    No commands means the single stream only has to be renamed.
+    """
+    ffmpeg = [plan["ffmpeg"], "-y", "-nostdin", "-loglevel", "error"]
+    ffmpeg += ["-progress", "pipe:1", "-nostats"]
+    source = streams[0]
+    base = stream_base(source)
+    if plan["type"] == "Video":
+        if len(streams) == 1:
+            return f"{base}.{source['ext']}", []
+        target = f"{base}.{plan['format'] or 'mkv'}"
+        cmd = list(ffmpeg)
+        for stream in streams:
+            cmd.extend(["-i", stream["filepath"]])
+        if len(streams) == 2:
+            cmd.extend(["-map", "0:v:0", "-map", "1:a:0"])
+        else:
+            for index in range(len(streams)):
+                cmd.extend(["-map", str(index)])
+        # remux first, re-encode only if the streams do not fit the container
+        return target, [cmd + ["-c", "copy", target], cmd + [target]]
+
+    output_format = plan["format"] or source["ext"]
+    target = f"{base}.{output_format}"
+    quality = plan.get("audio_quality", "0")
+    cmd = ffmpeg + ["-i", source["filepath"], "-vn"]
+    if output_format == source["ext"] and quality == "0":
+        codec_args = ["-c:a", "copy"]
+    else:
+        codec_args = ["-c:a", AUDIO_CODECS.get(output_format, output_format)]
+        if output_format == "mp3":
+            codec_args.extend(["-q:a", quality])
+        elif output_format not in ("wav", "flac"):
+            codec_args.extend(["-b:a", AUDIO_BITRATES.get(quality, "192k")])
+    return target, [cmd + codec_args + [target]]
+
+
+async def open_process(cmd, stdin=None):
+    """start cmd in its own process group with stdout and stderr merged"""
+    if sys.platform == "win32":
+        options = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    else:
+        options = {"start_new_session": True}
+    return await asyncio.create_subprocess_exec(
+        *cmd, stdin=stdin, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, **options
+    )
+
+
+async def read_lines(stream):
+    """decoded lines of a child's pipe, split at \\n, \\r\\n or \\r"""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    pending = ""
+    while True:
+        chunk = await stream.read(PIPE_READ_SIZE)
+        if not chunk:
+            break
+        lines = LINE_BREAK_RE.split(pending + decoder.decode(chunk))
+        pending = lines.pop()
+        for line in lines:
+            yield line
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+
+class EventLoopThread:
+    """an asyncio event loop in a daemon thread, started on first use
+
+    All child processes of a DownloadManager are started, read and ended on
+    this loop, so no thread is blocked per download.
+    """
+
+    def __init__(self):
+        self.loop = None
+        self.lock = threading.Lock()
+
+    def get_loop(self):
+        with self.lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=self.loop.run_forever)
+                thread.daemon = True
+                thread.start()
+        return self.loop
+
+    def submit(self, coro):
+        """run coro on the loop, return a concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.get_loop())
+
+    def call_soon(self, callback, *args):
+        self.get_loop().call_soon_threadsafe(callback, *args)
+
+    def call_later(self, delay, callback, *args):
+        loop = self.get_loop()
+        loop.call_soon_threadsafe(loop.call_later, delay, callback, *args)
+
+
+class WarmWorker:
+    """a running ytdlp_worker.py process"""
+
+    def __init__(self, process):
+        self.process = process
+        self.lines = asyncio.Queue()
+        self.reader = asyncio.ensure_future(self.read())
+        self.eof = False
+        self.run_id = None
+        self.idle_since = None
+
+    async def read(self):
+        async for line in read_lines(self.process.stdout):
+            self.lines.put_nowait(line)
+        self.lines.put_nowait(None)
+
+    @property
+    def alive(self):
+        return not self.eof and self.process.returncode is None
+
+    async def next_line(self):
+        """the next output line, None once the worker has exited"""
+        if self.eof:
+            return None
+        line = await self.lines.get()
+        self.eof = line is None
+        return line
+
+    def send(self, message):
+        if self.alive:
+            self.process.stdin.write((json.dumps(message) + "\n").encode("utf-8"))
+
+
+class WorkerPool:
+    """warm ytdlp_worker.py processes of the "python" backend
+
+    Only used on the event loop. A worker runs one download at a time and
+    is handed back to the pool afterwards, workers idle for
+    WORKER_IDLE_TIMEOUT seconds are shut down.
+    """
+
+    def __init__(self, script=WORKER_SCRIPT):
+        self.script = script
+        self.idle = []
+        self.run_ids = itertools.count(1)
+
+    async def acquire(self):
+        """an idle worker or a new one, RuntimeError if it cannot start"""
+        while self.idle:
+            worker = self.idle.pop()
+            if worker.alive:
+                return worker
+        process = await open_process(
+            [sys.executable, "-u", self.script], stdin=subprocess.PIPE
+        )
+        worker = WarmWorker(process)
+        output = []
+        while True:
+            line = await worker.next_line()
+            if line is None:
+                raise RuntimeError(
+                    "yt_dlp worker did not start: " + " | ".join(output[-3:])
+                )
+            if line.startswith(READY_PREFIX):
+                return worker
+            output.append(line.strip())
+
+    def release(self, worker):
+        worker.run_id = None
+        if not worker.alive:
+            return
+        loop = asyncio.get_running_loop()
+        worker.idle_since = loop.time()
+        self.idle.append(worker)
+        loop.call_later(WORKER_IDLE_TIMEOUT, self.reap)
+
+    def reap(self):
+        now = asyncio.get_running_loop().time()
+        for worker in list(self.idle):
+            if now - worker.idle_since >= WORKER_IDLE_TIMEOUT:
+                self.idle.remove(worker)
+                # the worker exits at the end of its input
+                worker.process.stdin.close()
+
+    async def run(self, worker, args, on_line):
+        """download with yt-dlp arguments args on worker
+
+        Returns the exit code, or None if the worker died meanwhile.
+        """
+        worker.run_id = next(self.run_ids)
+        worker.send({"run": args, "id": worker.run_id})
+        return await self.finish(worker, on_line)
+
+    async def finish(self, worker, on_line):
+        while True:
+            line = await worker.next_line()
+            if line is None:
+                return None
+            if line.startswith(EXIT_PREFIX):
+                try:
+                    return int(line[len(EXIT_PREFIX) :])
+                except ValueError:
+                    return 1
+            on_line(line)
+
+    async def cancel(self, worker, on_line):
+        """abort the download on worker, False if it did not stop in time"""
+        if worker.run_id is None:
+            return worker.alive
+        worker.send({"cancel": worker.run_id})
+        waiter = asyncio.ensure_future(self.finish(worker, on_line))
+        done, _ = await asyncio.wait([waiter], timeout=TERMINATE_TIMEOUT)
+        if not done:
+            waiter.cancel()
+        return bool(done) and worker.alive
+
+
+def proc_descendants(pid):
+    """pids of all children of pid and their children, read from /proc"""
+    found = []
+    parents = [pid]
+    while parents:
+        parent = parents.pop()
+        try:
+            tasks = os.listdir(f"/proc/{parent}/task")
+        except OSError:
+            continue
+        for task in tasks:
+            try:
+                with open(f"/proc/{parent}/task/{task}/children") as f:
+                    children = [int(child) for child in f.read().split()]
+            except (OSError, ValueError):
+                continue
+            found.extend(children)
+            parents.extend(children)
+    return found
+
+
+def proc_stats(pid):
+    """name, CPU seconds, RSS and disk IO of a process, None if it is gone"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            stat = f.read()
+    except OSError:
+        return None
+    # the name is in parentheses and may contain spaces
+    end = stat.rindex(")")
+    fields = stat[end + 2 :].split()
+    stats = {
+        "name": stat[stat.index("(") + 1 : end],
+        "cpu_seconds": (int(fields[11]) + int(fields[12])) / CLOCK_TICKS,
+        "rss_bytes": int(fields[21]) * PAGE_SIZE,
+        "read_bytes": None,
+        "write_bytes": None,
+    }
+    try:
+        with open(f"/proc/{pid}/io") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("read_bytes", "write_bytes"):
+                    stats[key] = int(value)
+    except (OSError, ValueError):
+        pass
+    return stats
+
+
+def extractor_for_url(url):
+    """name of the engine preset for a URL"""
+    url = url.lower()
+    if "youtube.com" in url or "youtu.be" in url:
+        return "youtube"
+    if "bilibili.com" in url or "b23.tv" in url:
+        return "bilibili"
+    return "generic"
+
+
+def resolve_engine(engine, url):
+    """engine settings with "auto" values replaced for the site of url
+
+    Raises ValueError for settings yt-dlp would reject.
+    """
+    engine = dict(ENGINE_DEFAULTS, **(engine or {}))
+    engine["extractor"] = extractor_for_url(url)
+    preset = ENGINE_PRESETS[engine["extractor"]]
+    for key in ("concurrent_fragments", "http_chunk_size"):
+        if str(engine[key]).lower() == "auto":
+            engine[key] = preset[key]
+    engine["concurrent_fragments"] = max(1, int(engine["concurrent_fragments"]))
+    engine["connections"] = max(1, int(engine["connections"]))
+    if engine["http_chunk_size"] and not RATE_RE.match(engine["http_chunk_size"]):
+        raise ValueError(f"invalid chunk size: {engine['http_chunk_size']}")
+    if engine["downloader"] not in DOWNLOADERS:
+        raise ValueError(f"unknown downloader: {engine['downloader']}")
+    if engine["downloader"] == "aria2c" and not shutil.which("aria2c"):
+        engine["downloader"] = "native"
+    if engine["backend"] not in BACKENDS:
+        raise ValueError(f"unknown backend: {engine['backend']}")
+    if engine["backend"] == "python" and not has_ytdlp_package():
+        engine["backend"] = "executable"
+    return engine
+
+
+def has_ytdlp_package():
+    """whether the yt_dlp package can be imported by this interpreter"""
+    return importlib.util.find_spec("yt_dlp") is not None
+
+
+def engine_args(engine):
+    args = []
+    if engine["concurrent_fragments"] > 1:
+        args.extend(["--concurrent-fragments", str(engine["concurrent_fragments"])])
+    if engine["http_chunk_size"]:
+        args.extend(["--http-chunk-size", engine["http_chunk_size"]])
+    if engine["downloader"] == "aria2c":
+        connections = engine["connections"]
+        args.extend(
+            [
+                "--downloader",
+                "aria2c",
+                "--downloader-args",
+                f"aria2c:-x {connections} -s {connections} -k 1M",
+            ]
+        )
+    return args
+
+
+def describe_engine(engine):
+    text = (
+        f"{engine['downloader']}, {engine['concurrent_fragments']} fragment(s), "
+        f"chunk {engine['http_chunk_size'] or 'off'}"
+    )
+    if engine["downloader"] == "aria2c":
+        text += f", {engine['connections']} connection(s)"
+    if engine.get("backend") == "python":
+        text += ", warm python worker"
+    return text
+
+
+def build_command(
+    ytdlp,
+    url,
+    save_dir,
+    download_type="Video",
+    quality="Auto (Best Quality)",
+    output_format="",
+    quality_choices=None,
+    single_video=True,
+    use_archive=True,
+    engine=None,
+    postprocess=None,
+    format_args=None,
+    scratch_dir=None,
+):
+    """build the yt-dlp argument list for one download
+
+    With a postprocess plan (see postprocess_plan) yt-dlp only downloads the
+    raw streams. format_args are already split quality and format options
+    (see DownloadPreset) used instead of the quality tables. With a
+    scratch_dir files are written there and moved to save_dir by the
+    DownloadManager once finished.
+    """
+    # command line string
+    cmd = [ytdlp]
+
+    if postprocess:
+        cmd.extend(["-f", postprocess["selector"]])
+    elif format_args is not None:
+        cmd.extend(format_args)
+    else:
+        # add quality option
+        cmd.extend(
+            split_option(quality_option(download_type, quality, quality_choices))
+        )
+
+        # add format option
+        cmd.extend(split_option(format_option(download_type, output_format)))
+
+    # playlist handling
+    if single_video and is_playlist_url(url):
+        cmd.extend(["--no-playlist"])
+
+    # download engine (resolved settings, see resolve_engine)
+    if engine:
+        cmd.extend(engine_args(engine))
+
+    # output template (use Video ID to make sure the filename is valid)
+    template = STREAM_OUTPUT_TEMPLATE if postprocess else OUTPUT_TEMPLATE
+    cmd.extend(["-o", os.path.join(scratch_dir or save_dir, template)])
+
+    # let yt-dlp record finished downloads and skip recorded ones
+    if use_archive:
+        cmd.extend(["--download-archive", ARCHIVE_FILE])
+
+    # other options: structured progress and final path instead of the
+    # human readable output (--print implies --quiet, undo that for the log)
+    cmd.extend(
+        [
+            "--newline",
+            "--progress",
+            "--progress-template",
+            PROGRESS_TEMPLATE,
+            "--print",
+            INFO_TEMPLATE,
+            "--print",
+            STREAM_TEMPLATE if postprocess else FILEPATH_TEMPLATE,
+            "--no-quiet",
+        ]
+    )
+
+    cmd.append(url)
+    return cmd
+
+
+def sidecar_command(ytdlp, urls, save_dir, kinds, sub_langs=SUB_LANGS):
+    """yt-dlp argument list writing only the side-car files of urls
+
+    Raises ValueError for kinds not in SIDECAR_OPTIONS.
+    """
+    unknown = set(kinds) - set(SIDECAR_OPTIONS)
+    if unknown:
+        raise ValueError(f"unknown side-car: {', '.join(sorted(unknown))}")
+    # a video without subtitles must not end the batch
+    cmd = [ytdlp, "--skip-download", "--no-playlist", "--ignore-errors"]
+    for kind in SIDECAR_OPTIONS:
+        if kind in kinds:
+            cmd.extend(SIDECAR_OPTIONS[kind])
+    if "subtitles" in kinds:
+        cmd.extend(["--sub-langs", sub_langs or SUB_LANGS])
+    cmd.extend(
+        [
+            "-o",
+            os.path.join(save_dir, OUTPUT_TEMPLATE),
+            "--newline",
+            "--print",
+            SIDECAR_TEMPLATE,
+            "--no-quiet",
+        ]
+    )
+    cmd.extend(urls)
+    return cmd
+
+
+def site_key(site):
+    """host key of a site typed by the user, like www.Vimeo.com or youtube"""
+    return host_key("https://" + site.strip().lower())
+
+
+class DownloadPreset:
+    """download type, quality and output format, compiled once
+
+    The quality tables are looked up and split when the preset is made, so
+    queueing a job only copies the prepared arguments. Raises ValueError for
+    unknown types, qualities or formats.
+    """
+
+    def __init__(
+        self,
+        name,
+        download_type="Video",
+        quality="Auto (Best Quality)",
+        output_format=None,
+        sites=(),
+        quality_choices=None,
+    ):
+        if download_type not in ("Video", "Audio"):
+            raise ValueError(f"unknown download type: {download_type}")
+        if download_type == "Video":
+            qualities, formats = VIDEO_QUALITIES, VIDEO_FORMATS
+        else:
+            qualities, formats = AUDIO_QUALITIES, AUDIO_FORMATS
+        if quality not in qualities and quality not in (quality_choices or {}):
+            raise ValueError(f"unknown {download_type.lower()} quality: {quality}")
+        if output_format is None:
+            output_format = formats[0]
+        if output_format and output_format not in formats:
+            raise ValueError(f"unknown {download_type.lower()} format: {output_format}")
+        self.name = name
+        self.download_type = download_type
+        self.quality = quality
+        self.output_format = output_format
+        self.sites = [site_key(site) for site in sites if site.strip()]
+        quality_args = quality_option(download_type, quality, quality_choices)
+        self.args = split_option(quality_args)
+        self.args += split_option(format_option(download_type, output_format))
+        self.plan = postprocess_plan(
+            download_type, quality, output_format, quality_choices
+        )
+        self.settings = {
+            "type": download_type,
+            "quality": quality,
+            "format": output_format,
+            "sites": self.sites,
+        }
+
+    @classmethod
+    def from_settings(cls, name, settings):
+        settings = settings or {}
+        return cls(
+            name,
+            settings.get("type", "Video"),
+            settings.get("quality", "Auto (Best Quality)"),
+            settings.get("format"),
+            settings.get("sites") or (),
+        )
+
+    def command(
+        self,
+        ytdlp,
+        url,
+        save_dir,
+        single_video=True,
+        use_archive=True,
+        engine=None,
+        scratch_dir=None,
+    ):
+        """yt-dlp argument list of one download with this preset"""
+        return build_command(
+            ytdlp,
+            url,
+            save_dir,
+            single_video=single_video,
+            use_archive=use_archive,
+            engine=engine,
+            postprocess=self.plan,
+            format_args=self.args,
+            scratch_dir=scratch_dir,
+        )
+
+
+class PresetLibrary:
+    """built-in and user presets by name, and the preset of each site
+
+    user_presets is the "presets" settings key, a user preset replaces the
+    built-in one of the same name and wins over it for a site. Invalid user
+    presets are skipped.
+    """
+
+    def __init__(self, user_presets=None):
+        self.presets = {
+            name: DownloadPreset.from_settings(name, values)
+            for name, values in PRESETS.items()
+        }
+        self.user = {}
+        for name, values in (user_presets or {}).items():
+            try:
+                preset = DownloadPreset.from_settings(name, values)
+            except (AttributeError, TypeError, ValueError):
+                continue
+            self.presets[name] = preset
+            self.user[name] = preset.settings
+        self.index()
+
+    def index(self):
+        self.by_site = {}
+        for preset in sorted(self.presets.values(), key=lambda p: p.name in self.user):
+            for site in preset.sites:
+                self.by_site[site] = preset
+
+    def names(self):
+        return list(self.presets)
+
+    def get(self, name):
+        return self.presets.get(name)
+
+    def for_url(self, url):
+        """preset for the site of url, None if no preset claims it"""
+        return self.by_site.get(host_key(url))
+
+    def add(self, preset):
+        self.presets[preset.name] = preset
+        self.user[preset.name] = preset.settings
+        self.index()
+
+    def remove(self, name):
+        """delete a user preset, a replaced built-in preset comes back"""
+        self.user.pop(name, None)
+        self.presets.pop(name, None)
+        if name in PRESETS:
+            self.presets[name] = DownloadPreset.from_settings(name, PRESETS[name])
+        self.index()
+
+
+def fetch_info(ytdlp, url):
+    """return the info dict of a single video (`yt-dlp -J`)"""
+    result = subprocess.run(
+        [ytdlp, "-J", "--no-playlist", url],
+        capture_output=True,
+        encoding="utf-8",
+        errors="replace",
+        timeout=120,
+    )
+    if result.returncode != 0:
+        errors = result.stderr.strip().splitlines()
+        raise RuntimeError(errors[-1] if errors else f"error code {result.returncode}")
+    return json.loads(result.stdout)
+
+
+def fetch_expected_size(cmd):
+    """bytes a download command will write, None if unknown
+
+    Asks `yt-dlp -J` with the format selection of the command.
+    """
+    probe = [cmd[0], "-J", "--no-playlist"]
+    for index, arg in enumerate(cmd[:-1]):
+        if arg in FORMAT_SELECTION_OPTIONS:
+            probe.extend(cmd[index : index + 2])
+    probe.append(cmd[-1])
+    try:
+        result = subprocess.run(
+            probe,
+            capture_output=True,
+            encoding="utf-8",
+            errors="replace",
+            timeout=120,
+        )
+        info = json.loads(result.stdout) if result.returncode == 0 else None
+    except (OSError, ValueError, subprocess.TimeoutExpired):
+        return None
+    return expected_size(info)
+
+
+def fetch_playlist(ytdlp, url):
+    """list playlist entries without resolving each video
+
+    Returns (title, entries); channel tabs nested as playlists are walked.
+    """
+    result = subprocess.run(
+        [ytdlp, "--flat-playlist", "-J", url],
+        capture_output=True,
+        encoding="utf-8",
+        errors="replace",
+    )
+    if result.returncode != 0:
+        errors = result.stderr.strip().splitlines()
+        raise RuntimeError(errors[-1] if errors else f"error code {result.returncode}")
+    info = json.loads(result.stdout)
+    return info.get("title") or url, flatten_entries(info.get("entries") or [])
+
+
+def flatten_entries(entries):
+    result = []
+    for entry in entries:
+        if not entry:
+            continue
+        if entry.get("entries"):
+            result.extend(flatten_entries(entry["entries"]))
+        elif entry.get("url") or entry.get("webpage_url"):
+            result.append(entry)
+    return result
+
+
+def entry_url(entry):
+    return entry.get("webpage_url") or entry["url"]
+
+
+def format_filesize(fmt):
+    if not fmt:
+        return None
+    return to_number(fmt.get("filesize")) or to_number(fmt.get("filesize_approx"))
+
+
+def expected_size(info, download_type="Video"):
+    """bytes the best formats of info will take on disk, None if unknown"""
+    if not info:
+        return None
+    # split selectors like "(bv*,ba)/b" list one download per stream, the top
+    # level of info is only the last of them
+    formats = []
+    for download in info.get("requested_downloads") or [info]:
+        formats.extend(download.get("requested_formats") or [download])
+    if download_type == "Audio":
+        audio = [f for f in formats if f.get("vcodec") == "none"]
+        formats = audio or formats
+    sizes = [format_filesize(fmt) for fmt in formats]
+    if not all(sizes):
+        return None
+    return int(sum(sizes))
+
+
+def format_choices(info, download_type):
+    """quality label -> option for the formats a video actually has"""
+    choices = {}
+    if not info:
+        return choices
+    formats = info.get("formats") or []
+    videos = [
+        f
+        for f in formats
+        if f.get("vcodec") not in (None, "none") and f.get("height")
+    ]
+    audios = [
+        f
+        for f in formats
+        if f.get("vcodec") == "none" and f.get("acodec") not in (None, "none")
+    ]
+
+    def bitrate(fmt):
+        return to_number(fmt.get("tbr")) or to_number(fmt.get("abr")) or 0
+
+    if download_type == "Audio":
+        for fmt in sorted(audios, key=bitrate, reverse=True):
+            label = f"{fmt['format_id']}: {fmt.get('ext', '')} {bitrate(fmt):.0f}k"
+            size = format_filesize(fmt)
+            if size:
+                label += f" ({format_size(size)})"
+            choices[label] = f'-f "{fmt["format_id"]}" --audio-quality 0'
+        return choices
+
+    best_audio = max(audios, key=bitrate, default=None)
+    audio_size = format_filesize(best_audio) or 0
+    for height in sorted({f["height"] for f in videos}, reverse=True):
+        best = max((f for f in videos if f["height"] == height), key=bitrate)
+        label = f"{height}p"
+        size = format_filesize(best)
+        if size:
+            if best.get("acodec") == "none":
+                size += audio_size
+            label += f" (~{format_size(size)})"
+        choices[label] = (
+            f'-f "bestvideo[height<={height}]+bestaudio/best[height<={height}]"'
+        )
+    for fmt in sorted(
+        videos, key=lambda f: (f["height"], bitrate(f)), reverse=True
+    ):
+        format_id = fmt["format_id"]
+        label = (
+            f"{format_id}: {fmt.get('resolution') or fmt['height']} "
+            f"{fmt.get('ext', '')} {(fmt.get('vcodec') or '').split('.')[0]}"
+        )
+        size = format_filesize(fmt)
+        if size:
+            label += f" ({format_size(size)})"
+        if fmt.get("acodec") == "none":
+            choices[label] = f'-f "{format_id}+bestaudio/{format_id}"'
+        else:
+            choices[label] = f'-f "{format_id}"'
+    return choices
+
+
+def rotate_file(path, backups):
+    """path -> path.1 -> path.2 ..., the oldest backup is dropped"""
+    for index in range(backups - 1, 0, -1):
+        older = f"{path}.{index}"
+        if os.path.exists(older):
+            os.replace(older, f"{path}.{index + 1}")
+    if os.path.exists(path):
+        os.replace(path, f"{path}.1")
+
+
+def to_number(value):
+    """progress fields are null or "NA" when yt-dlp does not know them"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    return None
+
+
+def format_size(num_bytes):
+    """human readable size, e.g. 1.5 MiB"""
+    if num_bytes is None:
+        return "?"
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if abs(num_bytes) < 1024:
+            return f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.1f} TiB"
+
+
+def format_eta(seconds):
+    if seconds is None:
+        return "--:--"
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes:02d}:{seconds:02d}"
+
+
+class InfoCache:
+    """size bounded LRU cache of info dicts, keyed by extractor and video id"""
+
+    def __init__(self, max_size=INFO_CACHE_SIZE):
+        self.max_size = max_size
+        self.items = collections.OrderedDict()
+        self.url_keys = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key_for(info):
+        return f"{info.get('extractor_key', '')}:{info.get('id', '')}"
+
+    def get(self, url):
+        with self.lock:
+            key = self.url_keys.get(url)
+            info = self.items.get(key)
+            if info is not None:
+                self.items.move_to_end(key)
+            return info
+
+    def put(self, url, info):
+        key = self.key_for(info)
+        with self.lock:
+            self.items[key] = info
+            self.items.move_to_end(key)
+            self.url_keys[url] = key
+            if info.get("webpage_url"):
+                self.url_keys[info["webpage_url"]] = key
+            while len(self.items) > self.max_size:
+                evicted, _ = self.items.popitem(last=False)
+                self.url_keys = {
+                    u: k for u, k in self.url_keys.items() if k != evicted
+                }
+
+
+class DownloadArchive:
+    """in-memory index of the download archive file
+
+    yt-dlp appends to the file itself (--download-archive), the index is
+    reloaded whenever the file changes on disk.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.keys = set()
+        self.mtime = None
+        self.lock = threading.Lock()
+
+    def _reload_if_changed(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self.mtime:
+            return
+        keys = set()
+        try:
+            with open(self.path, "r", encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) >= 2:
+                        keys.add(archive_key(parts[0], parts[1]))
+        except OSError:
+            return
+        self.keys = keys
+        self.mtime = mtime
+
+    def __contains__(self, key):
+        if key is None:
+            return False
+        with self.lock:
+            self._reload_if_changed()
+            return key in self.keys
+
+    def remember(self, key):
+        """add a key recorded by yt-dlp before the file is reloaded"""
+        if key is not None:
+            with self.lock:
+                self.keys.add(key)
+
+    def record(self, key):
+        """append a key to the file like yt-dlp, for runs without the archive
+
+        Raises OSError if the file cannot be written.
+        """
+        if key is None:
+            return
+        with self.lock:
+            self._reload_if_changed()
+            if key in self.keys:
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(key + "\n")
+            self.keys.add(key)
+
+
+class SidecarCache:
+    """side-car files and a metadata summary per video, in a JSON file
+
+    Keyed like the download archive, videos whose side-cars are on disk are
+    left out of new side-car jobs and catalogues need no yt-dlp run.
+    """
+
+    def __init__(self, path=SIDECAR_FILE):
+        self.path = path
+        self.lock = threading.Lock()
+        self.changed = False
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+        if not isinstance(self.entries, dict):
+            self.entries = {}
+
+    def has(self, key, kinds):
+        """whether all kinds of side-cars of key were fetched and still exist"""
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is None or not set(kinds) <= set(entry.get("kinds", [])):
+            return False
+        return all(os.path.exists(path) for path in entry.get("files", []))
+
+    def record(self, key, kinds, info, files):
+        with self.lock:
+            entry = self.entries.setdefault(key, {"kinds": [], "files": []})
+            entry["kinds"] = sorted(set(entry["kinds"]) | set(kinds))
+            entry["files"] = list(dict.fromkeys(entry["files"] + files))
+            entry["info"] = info
+            entry["fetched"] = time.time()
+            self.changed = True
+
+    def save(self):
+        with self.lock:
+            if not self.changed:
+                return
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f)
+            os.replace(tmp_path, self.path)
+            self.changed = False
+
+    def catalogue(self, keys=None):
+        """one CATALOGUE_FIELDS row per cached video of keys, or of all"""
+        with self.lock:
+            if keys is None:
+                keys = list(self.entries)
+            entries = [(key, self.entries.get(key)) for key in keys]
+        rows = []
+        for key, entry in entries:
+            if entry is None:
+                continue
+            info = entry.get("info") or {}
+            row = {field: info.get(field) for field in CATALOGUE_FIELDS}
+            row["key"] = key
+            row["files"] = ";".join(entry.get("files", []))
+            rows.append(row)
+        return rows
+
+
+def write_catalogue(path, rows):
+    """write catalogue rows (see SidecarCache.catalogue) as CSV"""
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, CATALOGUE_FIELDS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+class JobHistory:
+    """SQLite store of finished jobs, shared by all worker threads"""
+
+    COLUMNS = [
+        "id",
+        "url",
+        "extractor",
+        "video_id",
+        "quality",
+        "output_format",
+        "output_path",
+        "status",
+        "bytes",
+        "wall_time",
+        "average_speed",
+        "peak_speed",
+        "extract_time",
+        "transfer_time",
+        "postprocess_time",
+        "exit_code",
+        "failure_class",
+        "failure_reason",
+        "started_at",
+        "finished_at",
+        "backend",
+        "downloader",
+        "concurrent_fragments",
+        "http_chunk_size",
+        "connections",
+    ]
+    # columns added after the first release, with their type
+    ADDED_COLUMNS = {
+        "failure_class": "TEXT",
+        "backend": "TEXT",
+        "downloader": "TEXT",
+        "concurrent_fragments": "INTEGER",
+        "http_chunk_size": "TEXT",
+        "connections": "INTEGER",
+    }
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        with self.lock, self.db:
+            self.db.execute(
+                """CREATE TABLE IF NOT EXISTS jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    url TEXT NOT NULL,
+                    extractor TEXT,
+                    video_id TEXT,
+                    quality TEXT,
+                    output_format TEXT,
+                    output_path TEXT,
+                    status TEXT NOT NULL,
+                    bytes INTEGER,
+                    wall_time REAL,
+                    average_speed REAL,
+                    peak_speed REAL,
+                    extract_time REAL,
+                    transfer_time REAL,
+                    postprocess_time REAL,
+                    exit_code INTEGER,
+                    failure_class TEXT,
+                    failure_reason TEXT,
+                    started_at REAL,
+                    finished_at REAL NOT NULL,
+                    backend TEXT,
+                    downloader TEXT,
+                    concurrent_fragments INTEGER,
+                    http_chunk_size TEXT,
+                    connections INTEGER
+                )"""
+            )
+            # databases written by older versions
+            columns = [row[1] for row in self.db.execute("PRAGMA table_info(jobs)")]
+            for name, kind in self.ADDED_COLUMNS.items():
+                if name not in columns:
+                    self.db.execute(f"ALTER TABLE jobs ADD COLUMN {name} {kind}")
+            self.db.execute(
+                "CREATE INDEX IF NOT EXISTS jobs_extractor ON jobs (extractor)"
+            )
+            self.db.execute(
+                "CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished_at)"
+            )
+
+    def record(self, job):
+        size = job.downloaded_bytes
+        if job.output_path and os.path.exists(job.output_path):
+            size = os.path.getsize(job.output_path)
+        now = time.time()
+        engine = job.engine or {}
+        row = {
+            "url": job.url,
+            "extractor": job.extractor,
+            "video_id": job.video_id,
+            "quality": job.quality,
+            "output_format": job.output_format,
+            "output_path": job.output_path,
+            "status": job.status,
+            "bytes": size,
+            "wall_time": job.first_started and now - job.first_started,
+            "average_speed": job.average_speed,
+            "peak_speed": job.peak_speed,
+            "extract_time": job.extract_time,
+            "transfer_time": job.transfer_time,
+            "postprocess_time": job.postprocess_time,
+            "exit_code": job.return_code,
+            "failure_class": None if job.status == "done" else job.failure_category,
+            "failure_reason": job.failure_reason(),
+            "started_at": job.first_started,
+            "finished_at": now,
+            "backend": engine.get("backend"),
+            "downloader": engine.get("downloader"),
+            "concurrent_fragments": engine.get("concurrent_fragments"),
+            "http_chunk_size": engine.get("http_chunk_size"),
+            # only aria2c opens several connections
+            "connections": (
+                engine.get("connections")
+                if engine.get("downloader") == "aria2c"
+                else None
+            ),
+        }
+        names = ", ".join(row)
+        marks = ", ".join("?" for _ in row)
+        with self.lock, self.db:
+            self.db.execute(
+                f"INSERT INTO jobs ({names}) VALUES ({marks})", list(row.values())
+            )
+
+    def query(self, text="", status="", order_by="finished_at", descending=True):
+        """rows matching a substring of url/extractor/path/failure and a status"""
+        if order_by not in self.COLUMNS:
+            raise ValueError(f"unknown history column: {order_by}")
+        sql = "SELECT * FROM jobs WHERE 1"
+        params = []
+        if text:
+            sql += (
+                " AND (url LIKE ? OR extractor LIKE ? OR video_id LIKE ?"
+                " OR output_path LIKE ? OR failure_class LIKE ?"
+                " OR failure_reason LIKE ?)"
+            )
+            params.extend([f"%{text}%"] * 6)
+        if status:
+            sql += " AND status = ?"
+            params.append(status)
+        sql += f" ORDER BY {order_by} {'DESC' if descending else 'ASC'} LIMIT 5000"
+        with self.lock:
+            return [dict(row) for row in self.db.execute(sql, params)]
+
+    def downloaded(self):
+        """archive keys and canonical URLs of successfully finished jobs"""
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT url, extractor, video_id FROM jobs WHERE status = 'done'"
+            ).fetchall()
+        known = set()
+        for url, extractor, video_id in rows:
+            known.add(archive_key(extractor, video_id) or normalize_url(url)[0])
+        return known
+
+    def extractor_summary(self):
+        """per extractor: jobs, failures and average speed/timings"""
+        sql = """SELECT extractor,
+                COUNT(*) AS jobs,
+                SUM(status = 'failed') AS failed,
+                SUM(failure_class = 'transient') AS transient,
+                AVG(CASE WHEN status = 'done' THEN average_speed END)
+                    AS average_speed,
+                AVG(extract_time) AS extract_time,
+                AVG(transfer_time) AS transfer_time,
+                AVG(postprocess_time) AS postprocess_time,
+                AVG(wall_time) AS wall_time
+            FROM jobs GROUP BY extractor ORDER BY jobs DESC"""
+        with self.lock:
+            return [dict(row) for row in self.db.execute(sql)]
+
+    def engine_summary(self):
+        """per engine setting: jobs, failures and average speed/timings"""
+        sql = """SELECT backend, downloader, concurrent_fragments,
+                http_chunk_size, connections,
+                COUNT(*) AS jobs,
+                SUM(status = 'failed') AS failed,
+                AVG(CASE WHEN status = 'done' THEN average_speed END)
+                    AS average_speed,
+                AVG(extract_time) AS extract_time,
+                AVG(transfer_time) AS transfer_time,
+                AVG(wall_time) AS wall_time
+            FROM jobs WHERE downloader IS NOT NULL
+            GROUP BY backend, downloader, concurrent_fragments,
+                http_chunk_size, connections
+            ORDER BY average_speed DESC"""
+        with self.lock:
+            return [dict(row) for row in self.db.execute(sql)]
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+class DownloadJob:
+    """a single entry of the download queue"""
+
+    def __init__(
+        self,
+        job_id,
+        url,
+        cmd,
+        save_dir,
+        quality="",
+        output_format="",
+        batch="",
+        log_dir=LOG_DIR,
+    ):
+        self.id = job_id
+        self.url = url
+        self.cmd = cmd
+        self.save_dir = save_dir
+        # unfinished files are written here and moved to save_dir, or None
+        self.scratch_dir = None
+        self.expected_bytes = None  # size from the metadata, for disk checks
+        self.quality = quality
+        self.output_format = output_format
+        self.batch = batch  # playlist title for jobs fanned out from a playlist
+        # "media", or "sidecar" for a --skip-download batch of urls
+        self.kind = "media"
+        self.urls = [url]
+        self.sidecar_kinds = []
+        self.done_urls = []  # urls whose side-cars were written
+        self.sidecar_keys = {}  # url -> archive key of the side-cars written
+        self.archive_key = None  # "<extractor> <id>" if known before download
+        self.force = False  # download even if the archive has it
+        self.engine = None  # resolved download engine settings
+        self.average_speed = None  # bytes/s of the last successful run
+        # ffmpeg work left to the post-processing pool, see postprocess_plan
+        self.postprocess = None
+        self.stage = "download"  # download / postprocess
+        self.streams = []  # raw files reported by yt-dlp for post-processing
+        # metrics for the job history, accumulated over resumed runs
+        self.extractor = None
+        self.video_id = None
+        self.first_started = None  # time.time() of the first run
+        self.extracted_at = None  # monotonic time extraction of this run ended
+        self.peak_speed = None
+        self.extract_time = 0.0
+        self.transfer_time = 0.0
+        self.postprocess_time = 0.0
+        self.error = None  # last ERROR: line of yt-dlp
+        self.failure_category = None  # see classify_failure
+        self.attempts = 0  # automatic retries so far
+        self.retry_at = None  # monotonic time a backed off job may start
+        # pending / running / processing / paused / done / failed / stopped /
+        # skipped, "processing" jobs wait for or run in the post-processing pool
+        self.status = "pending"
+        self.progress = 0.0
+        self.status_text = "Waiting..."
+        # recent lines only, log_count is the number of lines ever logged
+        self.log_lines = collections.deque(maxlen=LOG_BUFFER_LINES)
+        self.log_count = 0
+        self.log_lock = threading.Lock()
+        # no log file if log_dir is None
+        self.log_path = log_dir and os.path.join(log_dir, f"job-{job_id}.log")
+        self.log_file = None
+        self.log_size = 0
+        # only touched on the manager's event loop: the child process and
+        # task of the current run, and "stop", "pause" or "restart" once the
+        # run was asked to end early
+        self.process = None
+        self.task = None
+        self.cancel_reason = None
+        self.rate_limit = None  # --limit-rate of the current run
+        self.started_at = None
+        # bytes already on disk when a paused job is resumed
+        self.resumed_bytes = None
+        # final path reported by yt-dlp after all post-processing
+        self.output_path = None
+        self.return_code = None
+        # transfer statistics from the structured progress stream
+        self.downloaded_bytes = None
+        self.total_bytes = None
+        self.speed = None
+        self.eta = None
+
+    def add_log_line(self, message):
+        with self.log_lock:
+            self.log_lines.append(message)
+            self.log_count += 1
+            if self.log_path is None:
+                return
+            try:
+                self._write_log_file(message + "\n")
+            except OSError:
+                pass
+
+    def _write_log_file(self, text):
+        if self.log_file is None:
+            os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+            self.log_file = open(self.log_path, "a", encoding="utf-8")
+            self.log_size = self.log_file.tell()
+        if self.log_size + len(text) > LOG_FILE_MAX_BYTES:
+            self.log_file.close()
+            rotate_file(self.log_path, LOG_FILE_BACKUPS)
+            self.log_file = open(self.log_path, "w", encoding="utf-8")
+            self.log_size = 0
+        self.log_file.write(text)
+        self.log_size += len(text)
+
+    def new_log_lines(self, shown):
+        """lines logged after the first `shown` ones, plus the new count
+
+        Lines that already fell out of the in-memory buffer are skipped.
+        """
+        with self.log_lock:
+            missing = self.log_count - shown
+            if missing <= 0:
+                return [], self.log_count
+            lines = list(self.log_lines)
+            return lines[-missing:], self.log_count
+
+    def load_log_tail(self):
+        """fill the empty buffer of a restored job from its log file"""
+        with self.log_lock:
+            if self.log_count or not self.log_path:
+                return
+            if not os.path.exists(self.log_path):
+                return
+            try:
+                with open(self.log_path, "r", encoding="utf-8", errors="replace") as f:
+                    for line in f:
+                        self.log_lines.append(line.rstrip("\n"))
+            except OSError:
+                return
+            self.log_count = len(self.log_lines)
+
+    def flush_log(self):
+        with self.log_lock:
+            if self.log_file is not None:
+                self.log_file.flush()
+
+    def close_log(self):
+        with self.log_lock:
+            if self.log_file is not None:
+                self.log_file.close()
+                self.log_file = None
+
+    def log_files(self):
+        """all existing log files of the job, oldest first"""
+        if not self.log_path:
+            return []
+        paths = [f"{self.log_path}.{i}" for i in range(LOG_FILE_BACKUPS, 0, -1)]
+        paths.append(self.log_path)
+        return [path for path in paths if os.path.exists(path)]
+
+    def failure_reason(self):
+        if self.status == "done":
+            return None
+        return self.error or self.status_text
+
+    def reset_metrics(self):
+        self.first_started = None
+        self.peak_speed = None
+        self.extract_time = 0.0
+        self.transfer_time = 0.0
+        self.postprocess_time = 0.0
+        self.error = None
+        self.failure_category = None
+        self.attempts = 0
+        self.retry_at = None
+
+    def remaining_bytes(self):
+        if self.total_bytes is None:
+            return None
+        if self.downloaded_bytes is not None:
+            return max(0, self.total_bytes - self.downloaded_bytes)
+        return self.total_bytes * (1 - self.progress / 100)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "url": self.url,
+            "cmd": self.cmd,
+            "save_dir": self.save_dir,
+            "scratch_dir": self.scratch_dir,
+            "expected_bytes": self.expected_bytes,
+            "quality": self.quality,
+            "output_format": self.output_format,
+            "batch": self.batch,
+            "kind": self.kind,
+            "urls": self.urls,
+            "sidecar_kinds": self.sidecar_kinds,
+            "done_urls": self.done_urls,
+            "sidecar_keys": self.sidecar_keys,
+            "status": self.status,
+            "progress": self.progress,
+            "status_text": self.status_text,
+            "output_path": self.output_path,
+            "return_code": self.return_code,
+            "downloaded_bytes": self.downloaded_bytes,
+            "total_bytes": self.total_bytes,
+            "archive_key": self.archive_key,
+            "force": self.force,
+            "engine": self.engine,
+            "average_speed": self.average_speed,
+            "postprocess": self.postprocess,
+            "stage": self.stage,
+            "streams": self.streams,
+            "extractor": self.extractor,
+            "video_id": self.video_id,
+            "first_started": self.first_started,
+            "peak_speed": self.peak_speed,
+            "extract_time": self.extract_time,
+            "transfer_time": self.transfer_time,
+            "postprocess_time": self.postprocess_time,
+            "error": self.error,
+            "failure_category": self.failure_category,
+            "attempts": self.attempts,
+        }
+
+    @classmethod
+    def from_dict(cls, data, log_dir=LOG_DIR):
+        job = cls(
+            data["id"],
+            data["url"],
+            data["cmd"],
+            data["save_dir"],
+            data.get("quality", ""),
+            data.get("output_format", ""),
+            data.get("batch", ""),
+            log_dir,
+        )
+        job.status = data.get("status", "pending")
+        job.kind = data.get("kind", "media")
+        job.urls = data.get("urls") or [job.url]
+        job.sidecar_kinds = data.get("sidecar_kinds", [])
+        job.done_urls = data.get("done_urls", [])
+        job.sidecar_keys = data.get("sidecar_keys", {})
+        job.scratch_dir = data.get("scratch_dir")
+        job.expected_bytes = data.get("expected_bytes")
+        job.progress = data.get("progress", 0.0)
+        job.status_text = data.get("status_text", "")
+        job.output_path = data.get("output_path")
+        job.return_code = data.get("return_code")
+        job.archive_key = data.get("archive_key")
+        job.force = data.get("force", False)
+        job.engine = data.get("engine")
+        job.average_speed = data.get("average_speed")
+        job.postprocess = data.get("postprocess")
+        job.stage = data.get("stage", "download")
+        job.streams = data.get("streams", [])
+        job.extractor = data.get("extractor")
+        job.video_id = data.get("video_id")
+        job.first_started = data.get("first_started")
+        job.peak_speed = data.get("peak_speed")
+        job.extract_time = data.get("extract_time", 0.0)
+        job.transfer_time = data.get("transfer_time", 0.0)
+        job.postprocess_time = data.get("postprocess_time", 0.0)
+        job.error = data.get("error")
+        job.failure_category = data.get("failure_category")
+        job.attempts = data.get("attempts", 0)
+        job.downloaded_bytes = data.get("downloaded_bytes")
+        job.total_bytes = data.get("total_bytes")
+        # jobs interrupted by closing the app wait for the user to resume them
+        if job.status in ("pending", "running", "processing"):
+            job.status = "paused"
+            job.status_text = "Interrupted, resume to continue"
+        return job
+
+
+def queued_video_ids(path):
+    """video ids of the unfinished jobs in a saved queue"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            jobs = json.load(f).get("jobs", [])
+    except (OSError, ValueError, AttributeError):
+        return set()
+    return {
+        job.get("video_id")
+        for job in jobs
+        if isinstance(job, dict)
+        and job.get("video_id")
+        and job.get("status") not in ("done", "stopped", "skipped")
+    }
+
+
+class DownloadManager:
+    """run queued jobs with a bounded number of yt-dlp processes
+
+    All processes are driven by one asyncio event loop in a background
+    thread. on_event(kind, job, payload) is called from that thread with
+    kind being one of "log", "progress" or "status". Finished downloads
+    with ffmpeg work go on to a second pool of post_workers slots, so the
+    download slots stay busy while conversions drain.
+    """
+
+    def __init__(
+        self,
+        on_event,
+        max_workers=3,
+        archive=None,
+        log_dir=LOG_DIR,
+        post_workers=POST_WORKERS,
+        history=None,
+        sidecars=None,
+    ):
+        self.on_event = on_event
+        self.history = history  # JobHistory, or None to keep no history
+        self.sidecars = sidecars  # SidecarCache, or None to cache nothing
+        self.sidecar_workers = SIDECAR_WORKERS
+        self.max_workers = max(1, max_workers)
+        self.post_workers = max(1, post_workers)
+        self.post_active = set()  # ids of jobs running in the post pool
+        self.probing = set()  # ids of jobs whose size is being probed
+        self.archive = archive
+        self.log_dir = log_dir
+        self.bandwidth = BandwidthPolicy()
+        self.retry = RetryPolicy()
+        self.disk = DiskPolicy()
+        self.disk_recheck = False  # a schedule() for jobs waiting for space
+        self.sweeping = False  # the sweeper task was started
+        self.swept = (0, 0)  # partial files and bytes removed so far
+        self.jobs = {}
+        self.next_id = 1
+        self.lock = threading.Lock()
+        self.loop = EventLoopThread()
+        self.runs = set()  # futures of the runs on the event loop
+        self.workers = WorkerPool()
+
+    def add_job(
+        self,
+        url,
+        cmd,
+        save_dir,
+        quality="",
+        output_format="",
+        batch="",
+        header=(),
+        key=None,
+        force=False,
+        engine=None,
+        postprocess=None,
+        start=True,
+        expected_bytes=None,
+        scratch_dir=None,
+    ):
+        """queue a download, start=False leaves scheduling to the caller
+
+        scratch_dir must be the one cmd writes to, see build_command.
+        """
+        with self.lock:
+            job = DownloadJob(
+                self.next_id,
+                url,
+                cmd,
+                save_dir,
+                quality,
+                output_format,
+                batch,
+                self.log_dir,
+            )
+            job.archive_key = key
+            if key:
+                job.extractor, job.video_id = key.split(" ", 1)
+            job.force = force
+            job.engine = engine
+            job.postprocess = postprocess
+            job.expected_bytes = expected_bytes
+            job.scratch_dir = scratch_dir or None
+            self.jobs[job.id] = job
+            self.next_id += 1
+        # a leftover log of an earlier job with the same id
+        for path in job.log_files():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        for line in header:
+            self.log(job, line)
+        if start:
+            self.schedule()
+        return job
+
+    def add_sidecars(
+        self,
+        ytdlp,
+        urls,
+        save_dir,
+        kinds,
+        sub_langs=SUB_LANGS,
+        batch="",
+        start=True,
+        keys=None,
+    ):
+        """queue side-car jobs of SIDECAR_BATCH urls each, return the jobs
+
+        Videos whose side-cars are in the cache are left out. keys maps urls
+        to archive keys known before the fetch, e.g. from a playlist or the
+        prefetched metadata, other sites have none in the url itself.
+        """
+        keys = keys or {}
+        if self.sidecars is not None:
+            urls = [
+                url
+                for url in urls
+                if not self.sidecars.has(
+                    keys.get(url) or archive_key_from_url(url), kinds
+                )
+            ]
+        jobs = []
+        for i in range(0, len(urls), SIDECAR_BATCH):
+            chunk = urls[i : i + SIDECAR_BATCH]
+            cmd = sidecar_command(ytdlp, chunk, save_dir, kinds, sub_langs)
+            jobs.append(self.new_sidecar_job(chunk, cmd, save_dir, kinds, batch))
+        if jobs and start:
+            self.schedule()
+        return jobs
+
+    def new_sidecar_job(self, urls, cmd, save_dir, kinds, batch="", status="pending"):
+        """add a side-car job for urls, the last arguments of cmd"""
+        with self.lock:
+            job = DownloadJob(
+                self.next_id,
+                urls[0],
+                cmd,
+                save_dir,
+                batch=batch,
+                log_dir=self.log_dir,
+            )
+            job.kind = "sidecar"
+            job.urls = list(urls)
+            job.sidecar_kinds = list(kinds)
+            job.status = status
+            self.jobs[job.id] = job
+            self.next_id += 1
+        for path in job.log_files():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        return job
+
+    def queued(self):
+        """archive keys and canonical URLs of jobs that are not given up on"""
+        known = set()
+        for job in list(self.jobs.values()):
+            if job.status not in ("failed", "stopped") and job.kind == "media":
+                known.add(job.archive_key or normalize_url(job.url)[0])
+        return known
+
+    def is_idle(self):
+        return not any(
+            job.status in ("pending", "running", "processing")
+            for job in self.jobs.values()
+        )
+
+    def running_jobs(self):
+        return [job for job in self.jobs.values() if job.status == "running"]
+
+    def aggregate_stats(self):
+        """return (running, pending, total speed, ETA of the whole queue)"""
+        running = self.running_jobs()
+        pending = [job for job in self.jobs.values() if job.status == "pending"]
+        speed = sum(job.speed or 0 for job in running)
+        sizes = [job.total_bytes for job in self.jobs.values() if job.total_bytes]
+        eta = None
+        if speed > 0:
+            remaining = sum(job.remaining_bytes() or 0 for job in running)
+            if pending and sizes:
+                remaining += len(pending) * sum(sizes) / len(sizes)
+            eta = remaining / speed
+        return len(running), len(pending), speed, eta
+
+    def postprocess_stats(self):
+        """return (converting, waiting) jobs of the post-processing pool"""
+        processing = [job for job in self.jobs.values() if job.status == "processing"]
+        active = len(self.post_active)
+        return active, len(processing) - active
+
+    def set_max_workers(self, count):
+        self.max_workers = max(1, count)
+        self.schedule()
+
+    def set_post_workers(self, count):
+        self.post_workers = max(1, count)
+        self.schedule()
+
+    def schedule(self):
+        """start pending jobs until all worker slots are busy"""
+        started = []
+        skipped = []
+        waiting = []  # jobs whose status text changed to wait for disk space
+        now = time.monotonic()
+        with self.lock:
+            running = self.running_jobs()
+            media = [job for job in running if job.kind == "media"]
+            free_slots = self.max_workers - len(media)
+            free_sidecar_slots = self.sidecar_workers - (len(running) - len(media))
+            per_host = collections.Counter(host_key(job.url) for job in media)
+            budget = {}  # free bytes per disk, see DiskPolicy.claim
+            for job in running:
+                self.disk.claim(job, budget, force=True)
+            blocked = False
+            probes = []
+            for job in self.jobs.values():
+                if free_slots <= 0 and free_sidecar_slots <= 0:
+                    break
+                if job.status != "pending":
+                    continue
+                # backing off after a transient failure
+                if job.retry_at and job.retry_at > now:
+                    continue
+                # small side-car fetches do not wait for the media slots
+                if job.kind == "sidecar":
+                    if free_sidecar_slots > 0:
+                        job.status = "running"
+                        job.status_text = "Fetching side-cars..."
+                        job.retry_at = None
+                        started.append(job)
+                        free_sidecar_slots -= 1
+                    continue
+                if free_slots <= 0:
+                    continue
+                host = host_key(job.url)
+                if self.retry.host_limit and per_host[host] >= self.retry.host_limit:
+                    continue
+                # a duplicate may have finished while this job was waiting
+                if not job.force and self.archive and job.archive_key in self.archive:
+                    job.status = "skipped"
+                    job.status_text = "Already in download archive"
+                    skipped.append(job)
+                    continue
+                if self.disk.must_probe(job, budget):
+                    if job.id not in self.probing and len(self.probing) < PROBE_WORKERS:
+                        self.probing.add(job.id)
+                        job.status_text = "Estimating size..."
+                        probes.append(job)
+                    continue
+                if not self.disk.claim(job, budget):
+                    blocked = True
+                    text = "Waiting for disk space"
+                    if job.expected_bytes:
+                        text += f" ({format_size(job.expected_bytes)} needed)"
+                    if job.status_text != text:
+                        job.status_text = text
+                        waiting.append(job)
+                    continue
+                job.status = "running"
+                job.status_text = "Connecting..."
+                job.retry_at = None
+                started.append(job)
+                per_host[host] += 1
+                free_slots -= 1
+            converting = []
+            for job in self.jobs.values():
+                if len(self.post_active) >= self.post_workers:
+                    break
+                if job.status == "processing" and job.id not in self.post_active:
+                    self.post_active.add(job.id)
+                    converting.append(job)
+            recheck = blocked and not self.disk_recheck
+            self.disk_recheck = self.disk_recheck or blocked
+            sweep = not self.sweeping
+            self.sweeping = True
+        if recheck:
+            self.loop.call_later(DISK_RECHECK_SECONDS, self._recheck_disk)
+        if sweep:
+            self.loop.submit(self.sweeper())
+        for job in waiting:
+            reserve = format_size(self.disk.min_free)
+            self.log(job, f"{job.status_text}, keeping {reserve} free")
+            self.on_event("status", job, None)
+        for job in skipped:
+            self.log(job, f"Skipped, {job.archive_key} is in the download archive")
+            self.on_event("status", job, None)
+        for job in probes:
+            self.on_event("status", job, None)
+            self.loop.submit(self.probe_size(job))
+        for job in started:
+            self.on_event("status", job, None)
+            self.start_run(self.run_download(job))
+        for job in converting:
+            self.start_run(self.run_postprocess(job))
+        self.rebalance()
+
+    async def probe_size(self, job):
+        """expected_bytes of a job waiting for admission, 0 if unknown"""
+        loop = asyncio.get_running_loop()
+        try:
+            size = await loop.run_in_executor(None, fetch_expected_size, job.cmd)
+        finally:
+            with self.lock:
+                self.probing.discard(job.id)
+        job.expected_bytes = size or 0
+        if size:
+            self.log(job, f"Expected size: {format_size(size)}")
+        if job.status == "pending" and job.status_text == "Estimating size...":
+            job.status_text = "Waiting..."
+            self.on_event("status", job, None)
+        self.schedule()
+
+    def _recheck_disk(self):
+        with self.lock:
+            self.disk_recheck = False
+        self.schedule()
+
+    def set_disk_policy(self, policy):
+        self.disk = policy
+        self.schedule()
+
+    def sweep(self):
+        """remove partial files no job will resume, return (files, bytes)"""
+        with self.lock:
+            jobs = list(self.jobs.values())
+        # failed jobs may still be retried, finished ones keep nothing
+        active = ("pending", "running", "processing", "paused", "failed")
+        owned = {
+            f"[{job.video_id}]"
+            for job in jobs
+            if job.video_id and job.status in active
+        }
+        # jobs of the GUI queue while the headless mode sweeps
+        owned |= {f"[{video_id}]" for video_id in queued_video_ids(QUEUE_FILE)}
+        scratch_dirs = {job.scratch_dir for job in jobs if job.scratch_dir}
+        if self.disk.scratch_dir:
+            scratch_dirs.add(self.disk.scratch_dir)
+        save_dirs = {job.save_dir for job in jobs}
+        # raw streams of jobs given up on, never their finished file
+        streams = {
+            stream["filepath"]
+            for job in jobs
+            if job.status not in active
+            for stream in job.streams
+            if stream.get("filepath") and stream["filepath"] != job.output_path
+        }
+        files, size = self.disk.sweep(scratch_dirs, save_dirs, owned, streams)
+        self.swept = (self.swept[0] + files, self.swept[1] + size)
+        return files, size
+
+    async def sweeper(self):
+        """sweep at start and every SWEEP_INTERVAL seconds, runs forever"""
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                await loop.run_in_executor(None, self.sweep)
+            except Exception:
+                pass
+            await asyncio.sleep(SWEEP_INTERVAL)
+
+    def remove_partials(self, job):
+        """delete the unfinished files and raw streams of a stopped job"""
+        removed = 0
+        # finished streams of a separate-streams download are no partial files
+        for stream in job.streams:
+            path = stream.get("filepath")
+            if path and path != job.output_path:
+                try:
+                    os.remove(path)
+                    removed += 1
+                except OSError:
+                    pass
+        job.streams = []
+        tag = f"[{job.video_id}]"
+        directories = {job.scratch_dir or job.save_dir, job.save_dir}
+        for directory in directories if job.video_id else ():
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                if tag in entry.name and PARTIAL_FILE_RE.search(entry.name):
+                    try:
+                        os.remove(entry.path)
+                        removed += 1
+                    except OSError:
+                        pass
+        # jobs that left the queue have no log to write to
+        if removed and job.id in self.jobs:
+            self.log(job, f"Removed {removed} partial file(s)")
+
+    async def to_library(self, job, path):
+        """move a finished file of a scratch_dir job to its save_dir"""
+        if not job.scratch_dir or not path:
+            return path
+        loop = asyncio.get_running_loop()
+        target = await loop.run_in_executor(None, move_to_library, path, job.save_dir)
+        self.log(job, f"Moved to library: {target}")
+        return target
+
+    def start_run(self, coro):
+        future = self.loop.submit(coro)
+        with self.lock:
+            self.runs.add(future)
+        future.add_done_callback(self._run_finished)
+
+    def _run_finished(self, future):
+        with self.lock:
+            self.runs.discard(future)
+
+    def join(self, timeout=None):
+        """wait until all runs ended, e.g. after pause_all before exiting
+
+        Returns False if some are still running after timeout seconds.
+        """
+        if self.loop.loop is None:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        # stop/pause requests posted before this call are handled first
+        self.loop.submit(asyncio.sleep(0)).result(timeout)
+        while True:
+            with self.lock:
+                runs = list(self.runs)
+            if not runs:
+                return True
+            left = None if deadline is None else deadline - time.monotonic()
+            if left is not None and left <= 0:
+                return False
+            concurrent.futures.wait(runs, left)
+
+    def set_retry_policy(self, policy):
+        self.retry = policy
+        self.schedule()
+
+    def set_bandwidth(self, policy):
+        self.bandwidth = policy
+        self.rebalance(force=True)
+
+    def rebalance(self, force=False):
+        """restart running jobs whose rate limit is far from their fair share
+
+        yt-dlp cannot change --limit-rate of a running process, so the job is
+        stopped and relaunched with --continue on the partial file.
+        """
+        if self.running_jobs():
+            self.loop.call_soon(self._rebalance, force)
+
+    def _rebalance(self, force):
+        running = self.running_jobs()
+        share = self.bandwidth.share(len(running))
+        now = time.monotonic()
+        for job in running:
+            if job.process is None or job.cancel_reason is not None:
+                continue
+            if not force and now - job.started_at < REBALANCE_MIN_SECONDS:
+                continue
+            if not rates_differ(job.rate_limit, share):
+                continue
+            self.log(
+                job,
+                f"Bandwidth share changed to {format_rate(share)}, "
+                "restarting download with --continue",
+            )
+            self.cancel_run(job, "restart")
+
+    def cancel_run(self, job, reason):
+        """end the current run of a job early, on the event loop only
+
+        reason is "stop", "pause" or "restart". The first request cancels
+        the task of the run, a later stop still wins over a pause.
+        """
+        if job.status not in ("running", "processing"):
+            return
+        if job.status == "processing" and job.id not in self.post_active:
+            return
+        first = job.cancel_reason is None
+        if first or reason == "stop":
+            job.cancel_reason = reason
+        # a run that has no process yet checks cancel_reason before starting one
+        if first and job.task is not None and job.process is not None:
+            job.task.cancel()
+
+    def retry_job(self, job_id):
+        self.loop.call_soon(self._retry_job, job_id)
+
+    def _retry_job(self, job_id):
+        """queue a finished job again, runs on the event loop"""
+        job = self.jobs.get(job_id)
+        if job is None or job.status in ("pending", "running", "processing"):
+            return
+        # the download itself succeeded, only redo the conversion
+        if job.stage == "postprocess" and all(
+            os.path.exists(stream["filepath"]) for stream in job.streams
+        ):
+            with self.lock:
+                job.progress = 0.0
+                job.return_code = None
+                job.status = "processing"
+                job.status_text = "Waiting for post-processing..."
+            self.on_event("status", job, None)
+            self.schedule()
+            return
+        with self.lock:
+            if job.status == "skipped":
+                job.force = True
+            job.progress = 0.0
+            job.stage = "download"
+            job.streams = []
+            job.reset_metrics()
+            job.status = "pending"
+            job.status_text = "Waiting..."
+            job.return_code = None
+            job.output_path = None
+            job.resumed_bytes = None
+            job.downloaded_bytes = None
+            job.total_bytes = None
+            job.speed = None
+            job.eta = None
+        self.on_event("status", job, None)
+        self.schedule()
+
+    def stop_job(self, job_id):
+        self.loop.call_soon(self._end_job, job_id, "stop")
+
+    def stop_all(self):
+        for job in list(self.jobs.values()):
+            self.stop_job(job.id)
+
+    def pause_job(self, job_id):
+        """stop the process but keep .part/fragment files for resume_job"""
+        self.loop.call_soon(self._end_job, job_id, "pause")
+
+    def _end_job(self, job_id, reason):
+        """stop or pause a job, runs on the event loop"""
+        job = self.jobs.get(job_id)
+        if job is None:
+            return
+        with self.lock:
+            queued = job.status == "pending" or (
+                job.status == "processing" and job.id not in self.post_active
+            )
+            if queued:
+                job.status = "stopped" if reason == "stop" else "paused"
+        if queued:
+            text = "Removed from queue" if reason == "stop" else "Paused"
+            self.set_status(job, job.status, text)
+        elif job.status in ("running", "processing"):
+            self.log(job, "=" * 60)
+            if reason == "stop":
+                self.log(job, "User requested to stop download, terminating process...")
+            else:
+                self.log(job, "Pausing download, partial data is kept...")
+            self.cancel_run(job, reason)
+
+    def pause_all(self):
+        for job in list(self.jobs.values()):
+            self.pause_job(job.id)
+
+    def resume_job(self, job_id):
+        self.loop.call_soon(self._resume_job, job_id)
+
+    def _resume_job(self, job_id):
+        """queue a paused job again, runs on the event loop"""
+        job = self.jobs.get(job_id)
+        if job is None or job.status != "paused":
+            return
+        with self.lock:
+            if job.stage == "postprocess":
+                job.status = "processing"
+                job.status_text = "Waiting for post-processing..."
+            else:
+                job.resumed_bytes = job.downloaded_bytes
+                job.retry_at = None
+                job.status = "pending"
+                job.status_text = "Waiting to resume..."
+        self.on_event("status", job, None)
+        self.schedule()
+
+    def command_for(self, job):
+        """argument list of the next run, resuming any partial download"""
+        cmd = list(job.cmd)
+        if job.kind == "sidecar":
+            # urls are last, a retry only fetches the ones not done yet
+            cmd = cmd[: len(cmd) - len(job.urls)]
+            cmd.extend(url for url in job.urls if url not in job.done_urls)
+        if (job.force or job.postprocess) and "--download-archive" in cmd:
+            # yt-dlp would skip the video again, it is remembered when done;
+            # split streams are only archived once they are merged
+            index = cmd.index("--download-archive")
+            del cmd[index : index + 2]
+        if job.resumed_bytes and "--continue" not in cmd:
+            cmd.insert(len(cmd) - 1, "--continue")
+        job.rate_limit = self.bandwidth.share(len(self.running_jobs()))
+        if job.rate_limit:
+            cmd[-1:-1] = ["--limit-rate", str(job.rate_limit)]
+        return cmd
+
+    def remove_finished(self):
+        """drop done/failed/stopped jobs from the queue, return their ids"""
+        with self.lock:
+            removed = [
+                job_id
+                for job_id, job in self.jobs.items()
+                if job.status in ("done", "failed", "stopped", "skipped")
+            ]
+            jobs = [self.jobs.pop(job_id) for job_id in removed]
+        for job in jobs:
+            # nothing can resume a failed job once it left the queue
+            if job.status == "failed" and job.kind == "media":
+                self.remove_partials(job)
+            job.close_log()
+            for path in job.log_files():
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        return removed
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = {
+            "next_id": self.next_id,
+            "jobs": [job.to_dict() for job in self.jobs.values()],
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+
+    def load(self, path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        for item in data.get("jobs", []):
+            try:
+                job = DownloadJob.from_dict(item, self.log_dir)
+            except (KeyError, TypeError):
+                continue
+            self.jobs[job.id] = job
+        self.next_id = max([data.get("next_id", 1)] + [i + 1 for i in self.jobs])
+
+    def log(self, job, message):
+        job.add_log_line(message)
+        self.on_event("log", job, message)
+
+    def update_progress(self, job, percent, status_text=""):
+        job.progress = percent
+        if status_text:
+            job.status_text = status_text
+        self.on_event("progress", job, None)
+
+    def set_status(self, job, status, status_text=""):
+        job.status = status
+        if status_text:
+            job.status_text = status_text
+        self.on_event("status", job, None)
+
+    def record_history(self, job):
+        if self.history is None or job.status not in ("done", "failed", "stopped"):
+            return
+        if job.kind == "sidecar":
+            return
+        try:
+            self.history.record(job)
+        except sqlite3.Error as e:
+            self.log(job, f"Error writing job history: {e}")
+
+    def handle_output(self, job, line):
+        """decode one line of yt-dlp output, only plain lines are logged"""
+        if line.startswith(PROGRESS_PREFIX):
+            try:
+                data = json.loads(line[len(PROGRESS_PREFIX) :])
+            except ValueError:
+                return
+            self.apply_progress(job, data)
+        elif line.startswith(STREAM_PREFIX):
+            try:
+                stream = json.loads(line[len(STREAM_PREFIX) :])
+            except ValueError:
+                return
+            # a resumed run reports the streams it already has again
+            paths = [s["filepath"] for s in job.streams]
+            if stream.get("filepath") and stream["filepath"] not in paths:
+                job.streams.append(stream)
+                self.log(job, f"Downloaded stream: {stream['filepath']}")
+        elif line.startswith(INFO_PREFIX):
+            try:
+                info = json.loads(line[len(INFO_PREFIX) :])
+            except ValueError:
+                return
+            job.extracted_at = job.extracted_at or time.monotonic()
+            if info.get("extractor_key"):
+                job.extractor = info["extractor_key"].lower()
+            job.video_id = info.get("id") or job.video_id
+        elif line.startswith(SIDECAR_PREFIX):
+            self.record_sidecar(job, line[len(SIDECAR_PREFIX) :])
+        elif line.startswith(FILEPATH_PREFIX):
+            job.output_path = line[len(FILEPATH_PREFIX) :]
+            self.log(job, f"Output file: {job.output_path}")
+        else:
+            if line.startswith("ERROR:"):
+                job.error = line
+            self.log(job, line)
+
+    def record_sidecar(self, job, text):
+        """one video of a side-car job is done, see SIDECAR_TEMPLATE"""
+        try:
+            info, *file_lists = [json.loads(part) for part in text.split("\t")]
+        except ValueError:
+            return
+        if not isinstance(info, dict):
+            return
+        files = [path for paths in file_lists for path in (paths or []) if path]
+        url = info.get("original_url")
+        if url in job.urls and url not in job.done_urls:
+            job.done_urls.append(url)
+        key = archive_key(info.get("extractor_key"), info.get("id"))
+        if url in job.urls and key:
+            job.sidecar_keys[url] = key
+        if self.sidecars is not None and key:
+            self.sidecars.record(key, job.sidecar_kinds, info, files)
+        self.log(job, f"Side-cars of {info.get('title') or key}: {len(files)} file(s)")
+        done = len(job.done_urls)
+        self.update_progress(
+            job,
+            min(100.0, done * 100.0 / len(job.urls)),
+            f"Side-cars: {done}/{len(job.urls)} video(s)",
+        )
+
+    def apply_progress(self, job, data):
+        downloaded = to_number(data.get("downloaded_bytes"))
+        total = to_number(data.get("total_bytes")) or to_number(
+            data.get("total_bytes_estimate")
+        )
+        fragment = to_number(data.get("fragment_index"))
+        fragments = to_number(data.get("fragment_count"))
+
+        job.downloaded_bytes = downloaded
+        job.total_bytes = total
+        job.speed = to_number(data.get("speed"))
+        job.eta = to_number(data.get("eta"))
+        if job.speed and job.speed > (job.peak_speed or 0):
+            job.peak_speed = job.speed
+
+        if data.get("status") == "finished":
+            percent = 100.0
+            job.speed = None
+            job.eta = None
+        elif downloaded is not None and total:
+            percent = min(100.0, downloaded * 100.0 / total)
+        elif fragment is not None and fragments:
+            percent = min(100.0, fragment * 100.0 / fragments)
+        else:
+            percent = job.progress
+
+        status_text = f"Download progress: {percent:.1f}%"
+        if downloaded is not None:
+            status_text += f" ({format_size(downloaded)}"
+            if total:
+                status_text += f" / {format_size(total)}"
+            status_text += ")"
+        if job.speed:
+            status_text += f" at {format_size(job.speed)}/s"
+        if job.eta is not None:
+            status_text += f", ETA {format_eta(job.eta)}"
+        if fragment is not None and fragments:
+            status_text += f" [fragment {int(fragment)}/{int(fragments)}]"
+        self.update_progress(job, percent, status_text)
+
+    async def run_download(self, job):
+        # the final status is only published once the job is cleaned up, so
+        # a resume/retry can never race with this run
+        job.task = asyncio.current_task()
+        final = ("failed", "Download failed")
+        worker = None  # WarmWorker of the "python" backend
+
+        def on_line(line):
+            line = line.strip()
+            if line:
+                self.handle_output(job, line)
+
+        try:
+            job.started_at = time.monotonic()
+            job.extracted_at = None
+            job.error = None
+            job.first_started = job.first_started or time.time()
+            cmd = self.command_for(job)
+            if job.rate_limit:
+                self.log(job, f"Rate limit: {format_rate(job.rate_limit)}")
+            if job.resumed_bytes:
+                self.log(job, "=" * 60)
+                self.log(
+                    job,
+                    f"Resuming download, {format_size(job.resumed_bytes)} "
+                    "already transferred",
+                )
+            try:
+                if job.cancel_reason is None:
+                    if job.engine and job.engine.get("backend") == "python":
+                        worker = await self.acquire_worker(job)
+                    if worker is not None:
+                        job.process = worker.process
+                    else:
+                        job.process = await open_process(cmd)
+                if job.cancel_reason is not None:
+                    raise asyncio.CancelledError
+                if worker is not None:
+                    return_code = await self.workers.run(worker, cmd[1:], on_line)
+                    if return_code is None:
+                        self.log(job, "The yt_dlp worker exited unexpectedly")
+                        return_code = 1
+                else:
+                    async for line in read_lines(job.process.stdout):
+                        on_line(line)
+                    return_code = await job.process.wait()
+            except asyncio.CancelledError:
+                if worker is None or not await self.workers.cancel(worker, on_line):
+                    await self.terminate(job)
+                reason = job.cancel_reason or "stop"
+                if reason == "restart":
+                    job.resumed_bytes = job.downloaded_bytes
+                    final = ("pending", "Restarting with new rate limit...")
+                elif reason == "pause":
+                    status_text = f"Paused at {job.progress:.1f}%"
+                    if job.downloaded_bytes:
+                        transferred = format_size(job.downloaded_bytes)
+                        status_text += f" ({transferred} transferred)"
+                    self.log(job, f"⏸ {status_text}")
+                    final = ("paused", status_text)
+                else:
+                    job.progress = 0
+                    self.log(job, "=" * 60)
+                    self.log(job, "✗ Download forcibly stopped by user")
+                    self.remove_partials(job)
+                    final = ("stopped", "Download forcibly stopped")
+                return
+            job.return_code = return_code
+            # the process is gone, a pause or stop from now on waits for the
+            # move to the library instead of cancelling it
+            job.process = None
+
+            self.log(job, "=" * 60)
+            if job.kind == "sidecar" and (
+                return_code == 0 or set(job.urls) <= set(job.done_urls)
+            ):
+                # --ignore-errors exits with 1 for a video without subtitles
+                job.progress = 100
+                self.log(job, f"✓ Side-cars of {len(job.done_urls)} video(s) saved")
+                final = ("done", f"Side-cars of {len(job.done_urls)} video(s) saved")
+            elif return_code == 0:
+                job.progress = 100
+                if self.archive is not None and not job.postprocess:
+                    self.archive.remember(job.archive_key)
+                self.log(job, f"✓ Download completed successfully!")
+                elapsed = time.monotonic() - job.started_at
+                transferred = (job.downloaded_bytes or 0) - (job.resumed_bytes or 0)
+                if transferred > 0 and elapsed > 0:
+                    job.average_speed = transferred / elapsed
+                    text = f"Average speed: {format_rate(job.average_speed)}"
+                    if job.engine:
+                        text += f" ({describe_engine(job.engine)})"
+                    self.log(job, text)
+                if job.postprocess and job.streams:
+                    job.stage = "postprocess"
+                    job.progress = 0
+                    self.log(
+                        job,
+                        f"{len(job.streams)} stream(s) queued for post-processing",
+                    )
+                    final = ("processing", "Waiting for post-processing...")
+                else:
+                    job.output_path = await self.to_library(job, job.output_path)
+                    if job.output_path:
+                        self.log(job, f"File saved at: {job.output_path}")
+                    else:
+                        # nothing was written, e.g. skipped by the download archive
+                        self.log(job, f"No new file written to: {job.save_dir}")
+                    final = ("done", "Download completed!")
+            else:
+                final = self.handle_failure(job, return_code)
+                if final[0] == "failed" and job.kind == "sidecar" and job.done_urls:
+                    final = self.split_sidecars(job, final[1])
+
+        except Exception as e:
+            job.progress = 0
+            self.log(job, f"Error: {str(e)}")
+            final = ("failed", f"Error: {str(e)}")
+        finally:
+            if worker is not None:
+                self.workers.release(worker)
+            job.process = None
+            job.task = None
+            job.cancel_reason = None
+            job.rate_limit = None
+            job.speed = None
+            job.eta = None
+            # time to the first --print after extraction, then transfer
+            now = time.monotonic()
+            extracted_at = job.extracted_at or now
+            job.extract_time += extracted_at - job.started_at
+            job.transfer_time += now - extracted_at
+            job.close_log()
+            if job.kind == "sidecar" and self.sidecars is not None:
+                try:
+                    self.sidecars.save()
+                except OSError as e:
+                    self.log(job, f"Error saving side-car cache: {e}")
+            self.set_status(job, *final)
+            self.record_history(job)
+            self.schedule()
+
+    async def acquire_worker(self, job):
+        """a warm yt_dlp worker, None to fall back to the executable"""
+        try:
+            return await self.workers.acquire()
+        except (OSError, RuntimeError) as e:
+            self.log(job, f"{e}, starting yt-dlp instead")
+            return None
+
+    def handle_failure(self, job, return_code):
+        """classify a failed run, return the final status of the job
+
+        Transient failures are put back in the queue after a backoff delay,
+        the others fail with a reason instead of a bare error code.
+        """
+        category = classify_failure(job.error)
+        job.failure_category = category
+        label = FAILURE_LABELS[category]
+        reason = job.error or f"error code {return_code}"
+        delay = self.retry.delay(category, job.attempts)
+        if delay is not None:
+            job.attempts += 1
+            job.resumed_bytes = job.downloaded_bytes
+            job.retry_at = time.monotonic() + delay
+            self.log(job, f"✗ {label}: {reason}")
+            self.log(
+                job,
+                f"Retry {job.attempts}/{self.retry.max_retries} "
+                f"in {delay:.0f}s, partial data is kept",
+            )
+            self.loop.call_later(delay, self.schedule)
+            return (
+                "pending",
+                f"{label}, retry {job.attempts}/{self.retry.max_retries} "
+                f"in {delay:.0f}s",
+            )
+        job.progress = 0
+        self.log(job, f"✗ {label} ({category}), error code: {return_code}")
+        if job.attempts:
+            self.log(job, f"Gave up after {job.attempts} automatic retries")
+        return ("failed", f"{label}: {reason}")
+
+    def archive_merged(self, job):
+        """add a post-processed download to the archive yt-dlp was run without"""
+        if self.archive is None or "--download-archive" not in job.cmd:
+            return
+        key = job.archive_key or archive_key(job.extractor, job.video_id)
+        try:
+            self.archive.record(key)
+        except OSError as e:
+            self.log(job, f"Error writing download archive: {e}")
+
+    def split_sidecars(self, job, reason):
+        """keep the side-cars a job saved, fail only the urls it missed
+
+        The missed urls move to a new failed job that can be retried alone.
+        """
+        missing = [url for url in job.urls if url not in job.done_urls]
+        cmd = job.cmd[: len(job.cmd) - len(job.urls)]
+        failed = self.new_sidecar_job(
+            missing,
+            cmd + missing,
+            job.save_dir,
+            job.sidecar_kinds,
+            job.batch,
+            status="failed",
+        )
+        failed.status_text = reason
+        failed.error = job.error
+        failed.failure_category = job.failure_category
+        failed.attempts = job.attempts
+        self.log(failed, f"Missed by side-car job {job.id}: {reason}")
+        for url in missing:
+            self.log(failed, f"✗ {url}")
+        failed.close_log()
+        self.on_event("status", failed, None)
+        with self.lock:
+            job.urls = list(job.done_urls)
+            job.cmd = cmd + job.urls
+            job.failure_category = None
+        job.progress = 100
+        done = len(job.done_urls)
+        self.log(job, f"✓ Side-cars of {done} video(s) saved")
+        self.log(job, f"{len(missing)} video(s) failed, moved to job {failed.id}")
+        return ("done", f"Side-cars of {done} video(s) saved, {len(missing)} failed")
+
+    async def run_postprocess(self, job):
+        """merge/convert the streams of a finished download with ffmpeg"""
+        job.task = asyncio.current_task()
+        final = ("failed", "Post-processing failed")
+        started = time.monotonic()
+        try:
+            self.update_progress(job, 0, "Post-processing...")
+            sources = [stream["filepath"] for stream in job.streams]
+            for path in sources:
+                if not os.path.exists(path):
+                    raise RuntimeError(f"downloaded stream is missing: {path}")
+            target, attempts = postprocess_commands(job.postprocess, job.streams)
+            durations = [to_number(s.get("duration")) or 0 for s in job.streams]
+            self.log(job, "=" * 60)
+
+            return_code = 0
+            try:
+                for cmd in attempts:
+                    self.log(job, f"Post-processing: {' '.join(cmd)}")
+                    return_code = await self.run_ffmpeg(job, cmd, max(durations))
+                    if return_code == 0:
+                        break
+                    self.log(job, f"ffmpeg failed, error code: {return_code}")
+            except asyncio.CancelledError:
+                await self.terminate(job)
+                if job.cancel_reason == "pause":
+                    self.log(
+                        job, "⏸ Post-processing paused, downloaded streams are kept"
+                    )
+                    final = ("paused", "Paused before post-processing finished")
+                else:
+                    job.progress = 0
+                    self.log(job, "✗ Post-processing forcibly stopped by user")
+                    self.remove_partials(job)
+                    final = ("stopped", "Post-processing forcibly stopped")
+                return
+
+            job.process = None
+            if return_code != 0:
+                job.progress = 0
+                job.return_code = return_code
+                self.log(job, f"✗ Post-processing failed, error code: {return_code}")
+                final = (
+                    "failed",
+                    f"Post-processing failed (Error code: {return_code})",
+                )
+                return
+
+            if attempts:
+                for path in sources:
+                    if path != target:
+                        os.remove(path)
+            else:
+                os.replace(sources[0], target)
+            target = await self.to_library(job, target)
+            job.output_path = target
+            job.progress = 100
+            self.log(job, f"✓ Post-processing completed, file saved at: {target}")
+            self.archive_merged(job)
+            final = ("done", "Download completed!")
+
+        except Exception as e:
+            job.progress = 0
+            self.log(job, f"Error: {str(e)}")
+            final = ("failed", f"Error: {str(e)}")
+        finally:
+            job.process = None
+            job.task = None
+            job.cancel_reason = None
+            job.postprocess_time += time.monotonic() - started
+            job.close_log()
+            with self.lock:
+                self.post_active.discard(job.id)
+            self.set_status(job, *final)
+            self.record_history(job)
+            self.schedule()
+
+    async def run_ffmpeg(self, job, cmd, duration):
+        """run one ffmpeg command, reporting `-progress` output as job progress
+
+        Raises CancelledError if the job is stopped or paused meanwhile.
+        """
+        if job.cancel_reason is not None:
+            raise asyncio.CancelledError
+        job.process = await open_process(cmd)
+        if job.cancel_reason is not None:
+            raise asyncio.CancelledError
+        async for line in read_lines(job.process.stdout):
+            line = line.strip()
+            if not line:
+                continue
+            if not FFMPEG_PROGRESS_RE.match(line):
+                self.log(job, line)
+                continue
+            key, value = line.split("=", 1)
+            if key in ("out_time_us", "out_time_ms") and duration:
+                try:
+                    seconds = int(value) / 1e6
+                except ValueError:
+                    continue
+                percent = max(0.0, min(100.0, seconds * 100.0 / duration))
+                self.update_progress(job, percent, f"Post-processing: {percent:.1f}%")
+        return await job.process.wait()
+
+    async def terminate(self, job):
+        """end the process group of a job, killing it if SIGTERM is ignored"""
+        process = job.process
+        if process is None:
+            return
+        try:
+            if sys.platform == "win32":
+                os.kill(process.pid, signal.CTRL_BREAK_EVENT)
+            else:
+                # started in a new session, so the group id is the pid and
+                # children like ffmpeg are reached even if yt-dlp is gone
+                os.killpg(process.pid, signal.SIGTERM)
+        except OSError:
+            pass
+        waiter = asyncio.ensure_future(process.wait())
+        done, _ = await asyncio.wait([waiter], timeout=TERMINATE_TIMEOUT)
+        if done:
+            return
+        try:
+            if sys.platform == "win32":
+                process.kill()
+            else:
+                os.killpg(process.pid, signal.SIGKILL)
+        except OSError as e:
+            self.log(job, f"Error stopping process: {e}")
+        await waiter
+
+
+def prometheus_label(value):
+    """a label value escaped for the Prometheus text format"""
+    text = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return text.replace("\n", "\\n")
+
+
+class Instrumentation:
+    """periodic samples of job speeds, queue depth and child processes
+
+    sample() is called every METRICS_INTERVAL seconds by the GUI or the CLI.
+    CPU, memory and disk IO of the yt-dlp and ffmpeg processes of each job,
+    and of the processes they start, come from /proc; elsewhere only the
+    job and queue metrics are filled in.
+    """
+
+    def __init__(self, manager, points=METRICS_POINTS):
+        self.manager = manager
+        self.points = points
+        self.speeds = {}  # job id -> recent bytes/s of the job
+        self.throughput = collections.deque(maxlen=points)
+        self.cpu_times = {}  # pid -> (CPU seconds, monotonic time) of last sample
+        self.snapshot = None
+        self.lock = threading.Lock()
+
+    def sample(self):
+        """take a sample, return it and keep it as self.snapshot"""
+        now = time.monotonic()
+        running, pending, speed, _ = self.manager.aggregate_stats()
+        converting, waiting = self.manager.postprocess_stats()
+        jobs = []
+        cpu_times = {}
+        for job in list(self.manager.jobs.values()):
+            if job.status not in ("running", "processing"):
+                continue
+            history = self.speeds.get(job.id)
+            if history is None:
+                history = self.speeds[job.id] = collections.deque(maxlen=self.points)
+            history.append(job.speed or 0)
+            processes = []
+            process = job.process
+            if process is not None and PROC_AVAILABLE:
+                for pid in [process.pid] + proc_descendants(process.pid):
+                    stats = proc_stats(pid)
+                    if stats is None:
+                        continue
+                    stats["pid"] = pid
+                    stats["cpu_percent"] = None
+                    previous = self.cpu_times.get(pid)
+                    if previous and now > previous[1]:
+                        used = stats["cpu_seconds"] - previous[0]
+                        stats["cpu_percent"] = used * 100.0 / (now - previous[1])
+                    cpu_times[pid] = (stats["cpu_seconds"], now)
+                    processes.append(stats)
+            # where the time of the job goes right now
+            if job.status == "processing":
+                converting_now = job.id in self.manager.post_active
+                phase = "postprocess" if converting_now else "waiting"
+            else:
+                phase = "extract" if job.extracted_at is None else "download"
+            jobs.append(
+                {
+                    "id": job.id,
+                    "status": job.status,
+                    "phase": phase,
+                    "speed": job.speed,
+                    "progress": job.progress,
+                    "processes": processes,
+                }
+            )
+        # drop the history of jobs that are no longer active
+        active = {job["id"] for job in jobs}
+        for job_id in list(self.speeds):
+            if job_id not in active:
+                del self.speeds[job_id]
+        self.cpu_times = cpu_times
+        self.throughput.append(speed)
+
+        snapshot = {
+            "time": time.time(),
+            "throughput": speed,
+            "running": running,
+            "pending": pending,
+            "processing": converting,
+            "postprocess_waiting": waiting,
+            "processes": sum(len(job["processes"]) for job in jobs),
+            "cpu_percent": sum(
+                p["cpu_percent"] or 0 for job in jobs for p in job["processes"]
+            ),
+            "rss_bytes": sum(p["rss_bytes"] for job in jobs for p in job["processes"]),
+            "jobs": jobs,
+        }
+        with self.lock:
+            self.snapshot = snapshot
+        return snapshot
+
+    def prometheus(self):
+        """the last sample in the Prometheus text exposition format"""
+        with self.lock:
+            snapshot = self.snapshot
+        if snapshot is None:
+            return ""
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP ytdlp_gui_{name} {help_text}")
+            lines.append(f"# TYPE ytdlp_gui_{name} {kind}")
+            for labels, value in samples:
+                if value is None:
+                    continue
+                label_text = ",".join(
+                    f'{k}="{prometheus_label(v)}"' for k, v in labels.items()
+                )
+                if label_text:
+                    label_text = "{" + label_text + "}"
+                lines.append(f"ytdlp_gui_{name}{label_text} {value}")
+
+        metric(
+            "throughput_bytes",
+            "gauge",
+            "Total download speed of running jobs in bytes/s.",
+            [({}, snapshot["throughput"])],
+        )
+        metric(
+            "queue_jobs",
+            "gauge",
+            "Jobs by scheduler state.",
+            [
+                ({"state": "running"}, snapshot["running"]),
+                ({"state": "pending"}, snapshot["pending"]),
+                ({"state": "processing"}, snapshot["processing"]),
+                ({"state": "postprocess_waiting"}, snapshot["postprocess_waiting"]),
+            ],
+        )
+        metric(
+            "processes",
+            "gauge",
+            "Running yt-dlp and ffmpeg processes.",
+            [({}, snapshot["processes"])],
+        )
+        jobs = snapshot["jobs"]
+        metric(
+            "job_speed_bytes",
+            "gauge",
+            "Download speed of a job in bytes/s.",
+            [({"job": j["id"], "phase": j["phase"]}, j["speed"]) for j in jobs],
+        )
+        metric(
+            "job_progress_percent",
+            "gauge",
+            "Progress of the current stage of a job.",
+            [({"job": j["id"], "phase": j["phase"]}, j["progress"]) for j in jobs],
+        )
+        processes = [
+            ({"job": j["id"], "pid": p["pid"], "name": p["name"]}, p)
+            for j in jobs
+            for p in j["processes"]
+        ]
+        for name, kind, help_text, key in (
+            ("process_cpu_percent", "gauge", "CPU use of a process.", "cpu_percent"),
+            ("process_rss_bytes", "gauge", "Resident memory.", "rss_bytes"),
+            ("process_read_bytes", "counter", "Bytes read from disk.", "read_bytes"),
+            ("process_write_bytes", "counter", "Bytes written to disk.", "write_bytes"),
+        ):
+            metric(name, kind, help_text, [(l, p[key]) for l, p in processes])
+        return "\n".join(lines) + "\n"
+
+
+class MetricsCsv:
+    """append samples to a CSV file, one row per process of each active job"""
+
+    COLUMNS = [
+        "time",
+        "throughput",
+        "running",
+        "pending",
+        "processing",
+        "processes",
+        "job",
+        "status",
+        "phase",
+        "speed",
+        "progress",
+        "pid",
+        "name",
+        "cpu_percent",
+        "rss_bytes",
+        "read_bytes",
+        "write_bytes",
+    ]
+
+    def __init__(self, path):
+        self.path = path
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, "a", newline="", encoding="utf-8")
+        self.writer = csv.DictWriter(self.file, self.COLUMNS, extrasaction="ignore")
+        if new:
+            self.writer.writeheader()
+
+    def write(self, snapshot):
+        common = {k: snapshot[k] for k in self.COLUMNS[:6]}
+        common["time"] = round(snapshot["time"], 3)
+        if not snapshot["jobs"]:
+            self.writer.writerow(common)
+        for job in snapshot["jobs"]:
+            row = dict(common, job=job["id"], status=job["status"])
+            row.update(phase=job["phase"], speed=job["speed"])
+            row["progress"] = round(job["progress"], 1)
+            for process in job["processes"] or [{}]:
+                cpu = process.get("cpu_percent")
+                if cpu is not None:
+                    process = dict(process, cpu_percent=round(cpu, 1))
+                self.writer.writerow(dict(row, **process))
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.server.instrumentation.prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MetricsServer(ThreadingHTTPServer):
+    """local /metrics endpoint with the last sample of an Instrumentation"""
+
+    daemon_threads = True
+
+    def __init__(self, instrumentation, port=METRICS_PORT):
+        # only reachable from this machine
+        super().__init__(("127.0.0.1", port), MetricsHandler)
+        self.instrumentation = instrumentation
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,169 @@
+"""long-lived yt-dlp worker of the "python" download backend
+
+Started by ytdlp_core.WorkerPool with the interpreter of the app. The
+yt_dlp package is imported once, then every
+{"run": [yt-dlp arguments], "id": n} line on stdin downloads like the
+executable would, printing the same --print lines and structured progress
+to stdout, followed by "[gui-exit] <exit code>". {"cancel": n} aborts run n
+at its next progress update, or before it starts.
+
+YoutubeDL instances are kept for jobs with the same options, so loaded
+extractors, cookies, open HTTP connections and cached player code carry
+over from one download to the next.
+"""
+
+import collections
+import json
+import os
+import queue
+import sys
+import threading
+
+import yt_dlp
+from yt_dlp.utils import DownloadCancelled
+
+from ytdlp_core import EXIT_PREFIX, PROGRESS_FIELDS, PROGRESS_PREFIX, READY_PREFIX
+
+# YoutubeDL instances kept per worker, least recently used ones are closed
+CACHED_INSTANCES = 4
+# options that may change between runs of the same job, applied to a cached
+# instance instead of being part of its key
+RUN_OPTIONS = ("ratelimit", "continuedl", "download_archive")
+
+
+def close(ydl):
+    # YoutubeDL.close() is missing in old yt-dlp versions
+    if hasattr(ydl, "close"):
+        ydl.close()
+
+
+def emit(line):
+    sys.stdout.write(line + "\n")
+    sys.stdout.flush()
+
+
+class Worker:
+    def __init__(self):
+        self.instances = collections.OrderedDict()
+        self.archives = {}  # instance key -> (path, mtime, size) of its archive
+        self.requests = queue.Queue()
+        self.cancelled = set()  # ids of runs to abort
+        self.current = None  # id of the running download
+
+    def read_requests(self):
+        """stdin reader thread, a cancel must not wait for the download"""
+        for line in sys.stdin:
+            try:
+                request = json.loads(line)
+            except ValueError:
+                continue
+            if "cancel" in request:
+                self.cancelled.add(request["cancel"])
+            elif "run" in request:
+                self.requests.put((request.get("id"), request["run"]))
+        # the app is gone
+        self.cancelled.add(self.current)
+        self.requests.put(None)
+
+    def progress_hook(self, data):
+        if self.current in self.cancelled:
+            raise DownloadCancelled()
+        progress = {key: data.get(key) for key in PROGRESS_FIELDS}
+        emit(PROGRESS_PREFIX + json.dumps(progress, default=str))
+
+    def instance(self, options):
+        """a YoutubeDL for these options, reused if one was made before"""
+        key = json.dumps(
+            {k: v for k, v in options.items() if k not in RUN_OPTIONS},
+            sort_keys=True,
+            default=repr,
+        )
+        ydl = self.instances.pop(key, None)
+        if ydl is None:
+            ydl = yt_dlp.YoutubeDL(dict(options, progress_hooks=[self.progress_hook]))
+        self.instances[key] = ydl
+        while len(self.instances) > CACHED_INSTANCES:
+            old_key, old = self.instances.popitem(last=False)
+            self.archives.pop(old_key, None)
+            close(old)
+        for name in RUN_OPTIONS:
+            ydl.params[name] = options.get(name)
+        self.load_archive(key, ydl)
+        return ydl
+
+    def load_archive(self, key, ydl):
+        """re-read --download-archive if it changed since the last run
+
+        YoutubeDL reads the file only when it is created, while the app and
+        other downloads append to it.
+        """
+        # old yt-dlp versions read the file on every check
+        if not hasattr(ydl, "archive"):
+            return
+        path = ydl.params.get("download_archive")
+        try:
+            stat = os.stat(path) if path else None
+        except OSError:
+            stat = None
+        stamp = (path, stat and stat.st_mtime_ns, stat and stat.st_size)
+        if self.archives.get(key) == stamp:
+            return
+        archive = set()
+        if stat is not None:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    archive.update(line.strip() for line in f if line.strip())
+            except OSError:
+                pass
+        ydl.archive = archive
+        self.archives[key] = stamp
+
+    def run(self, args):
+        try:
+            parsed = yt_dlp.parse_options(args)
+        except SystemExit as e:
+            return e.code if isinstance(e.code, int) else 2
+        options = dict(parsed.ydl_opts)
+        # progress is reported by progress_hook instead of the template
+        options.pop("progress_template", None)
+        options["noprogress"] = True
+        ydl = self.instance(options)
+        # sticky in YoutubeDL, every run starts without errors
+        ydl._download_retcode = 0
+        try:
+            return ydl.download(parsed.urls)
+        except DownloadCancelled:
+            return 1
+        except yt_dlp.utils.DownloadError:
+            return 1
+        except Exception as e:
+            emit(f"ERROR: {e}")
+            return 1
+
+    def serve(self):
+        # warm up: the extractor list is built before the first job arrives
+        list(yt_dlp.extractor.gen_extractor_classes())
+        emit(READY_PREFIX + yt_dlp.version.__version__)
+        thread = threading.Thread(target=self.read_requests)
+        thread.daemon = True
+        thread.start()
+        while True:
+            request = self.requests.get()
+            if request is None:
+                break
+            self.current, args = request
+            code = 1 if self.current in self.cancelled else self.run(args)
+            self.cancelled.discard(self.current)
+            sys.stderr.flush()
+            emit(f"{EXIT_PREFIX}{code}")
+        for ydl in self.instances.values():
+            close(ydl)
+
+
+def main():
+    sys.stdout.reconfigure(encoding="utf-8", errors="replace", line_buffering=True)
+    Worker().serve()
+
+
+if __name__ == "__main__":
+    main()